@@ -7,11 +7,12 @@ from .endpoints import cart
 from .endpoints import admin
 from .endpoints import address
 from .endpoints import user_auth
+from .endpoints import whatsapp
 
 
 v1_router = APIRouter()
 
-# v1_router.include_router(whatsapp.router, prefix="/whatsapp", tags=["whatsapp"])
+v1_router.include_router(whatsapp.router, prefix="/whatsapp", tags=["whatsapp"])
 v1_router.include_router(products.router, prefix="/products", tags=["products"])
 v1_router.include_router(category.router, prefix="/category", tags=["category"])
 v1_router.include_router(orders.router, prefix="/orders", tags=["orders"])
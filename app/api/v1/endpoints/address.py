@@ -32,12 +32,11 @@ async def update_address(
     db: AsyncSession = Depends(get_db)
 ):
     """Update an existing address."""
-    # First get the address to ensure ownership
-    address = await address_service.get(db, id=address_id, user_id=user_id)
+    # Ownership is enforced by the update itself
+    address = await address_service.update(db, id=address_id, obj_in=address_data, user_id=user_id)
     if not address:
         raise HTTPException(status_code=404, detail="Address not found")
-        
-    return await address_service.update(db, db_obj=address, obj_in=address_data)
+    return address
 
 @router.delete("/{address_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete address")
 async def delete_address(
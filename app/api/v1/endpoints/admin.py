@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import datetime
+import json
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy import desc, func, select
-from app.core.database import get_db
+from app.core.database import AnalyticsSessionLocal, get_analytics_db, get_db
 from app.core.dependencies import get_current_admin_user, get_current_user, security
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.order import Order
-from app.models.product import Product
 from app.services.admin import AdminService
 from app.schemas.admin import AdminLogin, Token
 
@@ -43,7 +47,7 @@ async def logout_admin(
 @router.get("/dashboard", summary="Get dashboard statistics")
 async def get_dashboard(
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get comprehensive dashboard statistics for admin interface."""
     stats = await AdminService.get_dashboard_stats(db)
@@ -53,7 +57,7 @@ async def get_dashboard(
 async def get_recent_activity(
     limit: int = 20,
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get recent system activity for admin dashboard."""
     activity = await AdminService.get_recent_activity(db, limit)
@@ -64,7 +68,7 @@ async def get_users_summary(
     skip: int = 0,
     limit: int = 50,
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get users summary with order statistics."""
     users = await AdminService.get_users_summary(db, skip, limit)
@@ -75,7 +79,7 @@ async def get_products_summary(
     skip: int = 0,
     limit: int = 50,
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get products summary with sales statistics."""
     products = await AdminService.get_products_summary(db, skip, limit)
@@ -86,12 +90,81 @@ async def get_orders_summary(
     skip: int = 0,
     limit: int = 50,
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get orders summary for admin interface."""
     orders = await AdminService.get_orders_summary(db, skip, limit)
     return orders
 
+EXPORT_COLUMNS = [
+    "order_id", "created_at", "updated_at", "user_id", "phone_number", "email",
+    "address_id", "total_amount", "order_status", "payment_status", "payment_method",
+]
+
+
+class _EchoBuffer:
+    """File-like object for csv.writer that hands back each line instead of storing it."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _export_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+@router.get("/orders/export", summary="Export orders as CSV or NDJSON")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Export format: csv or ndjson"),
+    start_date: Optional[datetime.datetime] = Query(None, description="Include orders created at or after this time"),
+    end_date: Optional[datetime.datetime] = Query(None, description="Include orders created before this time"),
+    order_status: Optional[str] = Query(None, description="Filter by order status"),
+    payment_status: Optional[str] = Query(None, description="Filter by payment status"),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Stream every matching order without materializing the result set.
+    The export opens its own session because request-scoped sessions are
+    closed before a streaming body is sent.
+    """
+    async def generate():
+        writer = csv.writer(_EchoBuffer())
+        if format == "csv":
+            yield writer.writerow(EXPORT_COLUMNS)
+
+        async with AnalyticsSessionLocal() as session:
+            batches = AdminService.stream_orders_export(
+                session,
+                start_date=start_date,
+                end_date=end_date,
+                order_status=order_status,
+                payment_status=payment_status,
+            )
+            async for rows in batches:
+                if format == "csv":
+                    chunk = "".join(
+                        writer.writerow([_export_value(row[col]) for col in EXPORT_COLUMNS])
+                        for row in rows
+                    )
+                else:
+                    chunk = "".join(
+                        json.dumps({col: _export_value(row[col]) for col in EXPORT_COLUMNS}) + "\n"
+                        for row in rows
+                    )
+                yield chunk
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"orders-{datetime.datetime.utcnow():%Y%m%d%H%M%S}.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/system/health", summary="Get system health")
 async def get_system_health(
     current_user: dict = Depends(get_current_admin_user),
@@ -105,66 +178,25 @@ async def get_system_health(
 async def get_revenue_analytics(
     days: int = 30,
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get revenue analytics for the specified period."""
-    from sqlalchemy import func, text
-    from datetime import datetime, timedelta
-    
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
-    
-    # Daily revenue for the period
-    revenue_query = select(
-        func.date(Order.created_at).label('date'),
-        func.sum(Order.total_amount).label('revenue')
-    ).where(
-        Order.payment_status == 'Paid',
-        Order.created_at >= start_date,
-        Order.created_at <= end_date
-    ).group_by(func.date(Order.created_at)).order_by('date')
-    
-    result = await db.execute(revenue_query)
-    
-    revenue_data = [
-        {"date": str(row.date), "revenue": float(row.revenue)}
-        for row in result.all()
-    ]
-    
-    return {
-        "period_days": days,
-        "start_date": start_date.isoformat(),
-        "end_date": end_date.isoformat(),
-        "daily_revenue": revenue_data,
-        "total_revenue": sum(item["revenue"] for item in revenue_data)
-    }
+    return await AdminService.get_revenue_analytics(db, days)
 
 @router.get("/analytics/top-products", summary="Get top selling products")
 async def get_top_products(
     limit: int = 10,
     current_user: dict = Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """Get top selling products."""
-    from models.order import OrderItem
-    
-    query = select(
-        Product.product_name,
-        Product.price,
-        func.sum(OrderItem.quantity).label('total_sold'),
-        func.sum(OrderItem.quantity * OrderItem.price_at_purchase).label('total_revenue')
-    ).join(OrderItem).group_by(
-        Product.product_id, Product.product_name, Product.price
-    ).order_by(desc('total_sold')).limit(limit)
-    
-    result = await db.execute(query)
-    
-    return [
-        {
-            "product_name": row.product_name,
-            "price": float(row.price),
-            "total_sold": row.total_sold,
-            "total_revenue": float(row.total_revenue)
-        }
-        for row in result.all()
-    ]
\ No newline at end of file
+    return await AdminService.get_top_products(db, limit)
+
+@router.get("/overview", summary="Get every dashboard panel at once")
+async def get_overview(current_user: dict = Depends(get_current_admin_user)):
+    """
+    Dashboard stats, recent activity, system health, 30-day revenue and top
+    products in one response. Panels are queried concurrently on separate
+    connections and cached for a few seconds.
+    """
+    return ORJSONResponse(await AdminService.get_overview())
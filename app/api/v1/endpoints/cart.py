@@ -6,7 +6,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.core.database import get_db
 from app.services.cart import cart_service
-from app.schemas.cart import CartItemAdd, CartItemUpdate, CartItemResponse, CartSummary
+from app.core.responses import json_response
+from app.schemas.cart import CartItemAdd, CartItemUpdate, CartItemResponse, CartSummary, cart_summary_adapter
 
 router = APIRouter(tags=["cart"])
 
@@ -58,30 +59,13 @@ async def get_cart(
     Get all items in user's or guest's cart with summary information.
     """
 
-    if not current_user.user_id and not guest_id:
+    user_id = current_user.user_id if current_user else None
+
+    if not user_id and not guest_id:
          return CartSummary(items=[], total_items=0, total_amount=Decimal('0.00'))
 
-    cart_items = await cart_service.get_user_cart(db, current_user.user_id, guest_id)
-    cart_summary = await cart_service.calculate_cart_summary(cart_items)
-    
-    response_items = []
-    for item in cart_items:
-        response_items.append(CartItemResponse(
-            cart_item_id=item.cart_item_id,
-            user_id=item.user_id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            added_at=item.added_at,
-            updated_at=item.updated_at,
-            product=item.product,
-            subtotal=item.quantity * item.product.price
-        ))
-    
-    return CartSummary(
-        items=response_items,
-        total_items=cart_summary["total_items"],
-        total_amount=cart_summary["total_amount"]
-    )
+    cart_summary = await cart_service.get_cart_summary_rows(db, user_id, guest_id)
+    return json_response(cart_summary_adapter, cart_summary)
 
 @router.put("/{cart_item_id}", response_model=CartItemResponse, summary="Update cart item quantity")
 async def update_cart_item(
@@ -94,10 +78,12 @@ async def update_cart_item(
     """
     Update cart item quantity.
     """
-    if not current_user.user_id and not guest_id:
+    user_id = current_user.user_id if current_user else None
+
+    if not user_id and not guest_id:
         raise HTTPException(status_code=400, detail="Either user (token) or guest_id (query) is required")
 
-    cart_item = await cart_service.update_cart_item(db, cart_item_id, cart_data, current_user.user_id, guest_id)
+    cart_item = await cart_service.update_cart_item(db, cart_item_id, cart_data, user_id, guest_id)
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
@@ -122,9 +108,11 @@ async def remove_cart_item(
     """
     Remove item from cart.
     """
-    if not current_user.user_id and not guest_id:
+    user_id = current_user.user_id if current_user else None
+
+    if not user_id and not guest_id:
         raise HTTPException(status_code=400, detail="Either user (token) or guest_id (query) is required")
 
-    success = await cart_service.remove_cart_item(db, cart_item_id, current_user.user_id, guest_id)
+    success = await cart_service.remove_cart_item(db, cart_item_id, user_id, guest_id)
     if not success:
         raise HTTPException(status_code=404, detail="Cart item not found")
\ No newline at end of file
@@ -1,40 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.services.category import CategoryService, SubcategoryService
+from app.services.category_tree import category_tree
 from app.schemas.category import (
     CategoryResponse, CategoryCreate, CategoryUpdate, ProductOut,
     SubcategoryResponse, SubcategoryCreate, SubcategoryUpdate,
-    CategoryDropdownResponse, SubcategoryDropdownResponse
+    CategoryDropdownResponse, SubcategoryDropdownResponse, CategoryTreeNode
 )
-from app.core.database import get_db  
+from app.core.database import get_db, get_read_db
+from app.core.http_cache import CATEGORIES, PRODUCTS, STOCK, cache_control, catalog_cache, etag_matches
 
 router = APIRouter(tags=["category"])
 
 # ------------------ Category Endpoints ------------------
 
-@router.get("/dropdown", response_model=List[CategoryDropdownResponse], summary="Get categories for dropdown")
-async def get_categories_dropdown(db: AsyncSession = Depends(get_db)):
+@router.get("/dropdown", response_model=List[CategoryDropdownResponse], summary="Get categories for dropdown", dependencies=[Depends(catalog_cache(CATEGORIES))])
+async def get_categories_dropdown(db: AsyncSession = Depends(get_read_db)):
     """
     Get all active categories with only ID and name.
     """
     return await CategoryService.get_categories_dropdown(db)
 
-@router.get("/", response_model=List[CategoryResponse], summary="Get all categories")
+@router.get("/tree", response_model=List[CategoryTreeNode], summary="Get the full category tree")
+async def get_category_tree(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Active categories, their subcategories and product counts in one
+    prebuilt, precompressed payload.
+    """
+    # Built from the primary: a lagging replica could otherwise be cached
+    # under the new catalog version.
+    snapshot = await category_tree.get(db)
+    encoding = snapshot.negotiate(request.headers.get("accept-encoding"))
+    headers = {"Cache-Control": cache_control(), "Vary": "Accept-Encoding"}
+    etag = snapshot.etag(encoding)
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=snapshot.bodies[encoding], headers=headers, media_type="application/json")
+
+@router.get("/", response_model=List[CategoryResponse], summary="Get all categories", dependencies=[Depends(catalog_cache(CATEGORIES, PRODUCTS, STOCK))])
 async def get_categories(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of records to return"),
     include_inactive: bool = Query(False, description="Include inactive categories"),
-    db: AsyncSession = Depends(get_db)   # ✅ Use AsyncSession
+    db: AsyncSession = Depends(get_read_db)   # ✅ Use AsyncSession
 ):
     categories = await CategoryService.get_all_categories(
         db, skip=skip, limit=limit, include_inactive=include_inactive
     )
     return categories
 
-@router.get("/{category_id}", response_model=CategoryResponse, summary="Get category by ID")
-async def get_category(category_id: str, db: AsyncSession = Depends(get_db)):
+@router.get("/{category_id}", response_model=CategoryResponse, summary="Get category by ID", dependencies=[Depends(catalog_cache(CATEGORIES, PRODUCTS, STOCK))])
+async def get_category(category_id: str, db: AsyncSession = Depends(get_read_db)):
     category = await CategoryService.get_category_by_id(db, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -58,12 +80,12 @@ async def delete_category(category_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Category not found")
     return
 
-@router.get("/{category_id}/products", summary="Get products in a category", response_model=List[ProductOut])
+@router.get("/{category_id}/products", summary="Get products in a category", response_model=List[ProductOut], dependencies=[Depends(catalog_cache(CATEGORIES, PRODUCTS))])
 async def get_category_products(
     category_id: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     products = await CategoryService.get_category_products(db, category_id, skip=skip, limit=limit)
     if products is None:
@@ -72,12 +94,12 @@ async def get_category_products(
 
 # ------------------ Subcategory Endpoints ------------------
 
-@router.get("/{category_id}/subcategories", response_model=List[SubcategoryResponse], summary="Get subcategories")
+@router.get("/{category_id}/subcategories", response_model=List[SubcategoryResponse], summary="Get subcategories", dependencies=[Depends(catalog_cache(CATEGORIES))])
 async def get_subcategories(
     category_id: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     if not await CategoryService.get_category_by_id(db, category_id):
         raise HTTPException(status_code=404, detail="Category not found")
@@ -95,27 +117,27 @@ async def create_subcategory(category_id: str, subcategory_data: SubcategoryCrea
         raise HTTPException(status_code=404, detail="Parent category not found")
     return subcategory
 
-@router.get("/subcategories/dropdown", response_model=List[SubcategoryDropdownResponse], summary="Get subcategories for dropdown")
+@router.get("/subcategories/dropdown", response_model=List[SubcategoryDropdownResponse], summary="Get subcategories for dropdown", dependencies=[Depends(catalog_cache(CATEGORIES))])
 async def get_subcategories_dropdown(
     category_id: str = Query(..., description="Category ID to filter subcategories"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get active subcategories for a specific category (ID and name only).
     """
     return await SubcategoryService.get_subcategories_dropdown(db, category_id)
 
-@router.get("/subcategories/all", response_model=List[SubcategoryResponse], summary="Get all subcategories")
+@router.get("/subcategories/all", response_model=List[SubcategoryResponse], summary="Get all subcategories", dependencies=[Depends(catalog_cache(CATEGORIES))])
 async def get_all_subcategories(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     subcategories = await SubcategoryService.get_all_subcategories(db, skip=skip, limit=limit)
     return subcategories
 
-@router.get("/subcategories/{subcategory_id}", response_model=SubcategoryResponse, summary="Get subcategory by ID")
-async def get_subcategory(subcategory_id: str, db: AsyncSession = Depends(get_db)):
+@router.get("/subcategories/{subcategory_id}", response_model=SubcategoryResponse, summary="Get subcategory by ID", dependencies=[Depends(catalog_cache(CATEGORIES))])
+async def get_subcategory(subcategory_id: str, db: AsyncSession = Depends(get_read_db)):
     subcategory = await SubcategoryService.get_subcategory_by_id(db, subcategory_id)
     if not subcategory:
         raise HTTPException(status_code=404, detail="Subcategory not found")
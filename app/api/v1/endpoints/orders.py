@@ -1,39 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Dict, List, Optional
+import orjson
 from app.core.dependencies import get_current_admin_user, get_current_active_user, get_current_user_optional
+from app.core.idempotency import Idempotency, idempotent
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core.responses import json_response
 from app.services.orders import order_service
+from app.services.order_events import order_events, status_event
+from app.services.order_tracking import STATUS_FIELDS, TrackingRateLimited, order_tracking
 from app.schemas.orders import (
-    OrderResponse, OrderCreate, OrderUpdate, OrderStatusUpdate, OrderSummary, OrderTrackingResponse
+    OrderResponse, OrderCreate, OrderUpdate, OrderStatusUpdate, OrderSummary, OrderTrackingResponse,
+    order_response_adapter, order_summary_list_adapter,
 )
-from app.core.database import get_db  # AsyncSession dependency
+from app.core.database import get_db, get_read_db  # AsyncSession dependency
 
 router = APIRouter(tags=["orders"])
 security = HTTPBearer()
 
+# Keep proxies from buffering or caching event streams
+EVENT_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+
+def parse_cursor(cursor: Optional[str] = Query(None, description="`X-Next-Cursor` of the previous page; overrides `skip`.")):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor_headers(orders, limit: int) -> Dict[str, str]:
+    """Cursor for the page after `orders`, when it was a full page."""
+    if len(orders) < limit:
+        return {}
+    last = orders[-1]
+    if isinstance(last, dict):
+        return {NEXT_CURSOR_HEADER: encode_cursor(last["created_at"], last["order_id"])}
+    return {NEXT_CURSOR_HEADER: encode_cursor(last.created_at, last.order_id)}
 
 
 @router.get("/", response_model=List[OrderResponse], summary="Get orders")
 async def get_orders(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor=Depends(parse_cursor),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get user's orders.
+    Get user's orders with their items, newest first.
+    Full pages carry an `X-Next-Cursor` header for keyset pagination.
     """
     orders = await order_service.get_multi_by_user(
         db, 
         user_id=current_user.user_id, 
         is_admin=False,
         skip=skip, 
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    response.headers.update(next_cursor_headers(orders, limit))
     return orders
 
 
+@router.get("/summary", response_model=List[OrderSummary], summary="Get order summaries")
+async def get_order_summaries(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor=Depends(parse_cursor),
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get user's orders without items, for list views.
+    Paginates like `GET /orders/`.
+    """
+    rows = await order_service.get_order_summaries(
+        db,
+        user_id=current_user.user_id,
+        is_admin=False,
+        skip=skip,
+        limit=limit,
+        cursor=cursor
+    )
+    return json_response(order_summary_list_adapter, rows, headers=next_cursor_headers(rows, limit))
+
+
 @router.get("/{order_id}", response_model=OrderResponse, summary="Get specific order")
 async def get_order(
     order_id: str,
@@ -55,16 +113,29 @@ async def get_order(
 async def create_order(
     order_data: OrderCreate,
     current_user: Optional[dict] = Depends(get_current_user_optional),
+    idempotency: Idempotency = Depends(idempotent("orders.create")),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    Create an order from the given items.
+    Send an `Idempotency-Key` header to make retries safe: a repeated key
+    gets the first response back instead of a second order. Guest checkouts
+    can't use one (400): without an account there is nothing to scope it to.
+    """
     user_id = current_user.user_id if current_user else None
-    order = await order_service.create_order(db, user_id, order_data)
-    if not order:
-        raise HTTPException(
-            status_code=400, 
-            detail="Failed to create order. Check if all products exist and are active."
+
+    async def create():
+        order = await order_service.create_order(db, user_id, order_data)
+        if not order:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to create order. Check if all products exist and are active."
+            )
+        return json_response(
+            order_response_adapter, OrderResponse.model_validate(order), status_code=status.HTTP_201_CREATED
         )
-    return order
+
+    return await idempotency.run(create, owner=user_id)
 
 
 
@@ -72,25 +143,31 @@ async def create_order(
 async def confirm_order(
     order_id: str,
     transaction_id: Optional[str] = None,
+    idempotency: Idempotency = Depends(idempotent("orders.confirm")),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Confirm order payment. 
     This triggers stock deduction and locks concurrency.
+    Payment webhooks should send an `Idempotency-Key` (e.g. the event id):
+    redeliveries then get the first response back without touching the order.
     """
-    result = await order_service.confirm_order(db, order_id, transaction_id)
-    
-    if result["status"] == "error":
-        # If it's a domain error like "Order already paid", 400 is fine. 
-        # If system error/rollback, maybe 500 but service returns error status.
-        raise HTTPException(status_code=400, detail=result["message"])
-    elif result["status"] == "refund":
-        # Return 200 with specific status or 409? 
-        # User paid but stock gone. Front end needs to know to show "Refunded".
-        # Let's return 200 but body indicates refund.
-        return {"status": "refund_initiated", "message": result["message"]}
-    
-    return {"status": "confirmed", "message": result["message"]}
+    async def confirm():
+        result = await order_service.confirm_order(db, order_id, transaction_id)
+
+        if result["status"] == "error":
+            # If it's a domain error like "Order already paid", 400 is fine. 
+            # If system error/rollback, maybe 500 but service returns error status.
+            raise HTTPException(status_code=400, detail=result["message"])
+        elif result["status"] == "refund":
+            # Return 200 with specific status or 409? 
+            # User paid but stock gone. Front end needs to know to show "Refunded".
+            # Let's return 200 but body indicates refund.
+            return ORJSONResponse({"status": "refund_initiated", "message": result["message"]})
+
+        return ORJSONResponse({"status": "confirmed", "message": result["message"]})
+
+    return await idempotency.run(confirm, owner=order_id)
 
 
 @router.put("/{order_id}", response_model=OrderResponse, summary="Update order")
@@ -100,25 +177,19 @@ async def update_order(
     current_user: dict = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # First fetch the order to ensure ownership
-    order = await order_service.get(
-        db, 
-        id=order_id, 
-        user_id=current_user.user_id, 
+    # Ownership and the "still pending" rule are checked by the service
+    updated_order = await order_service.update_order(
+        db,
+        order_id,
+        order_data,
+        user_id=current_user.user_id,
         is_admin=False
     )
-    if not order:
+    if not updated_order:
         raise HTTPException(
             status_code=404, 
             detail="Order not found or cannot be updated"
         )
-    
-    # Use generic update
-    updated_order = await order_service.update(
-        db,
-        db_obj=order,
-        obj_in=order_data
-    )
     return updated_order
 
 
@@ -157,49 +228,112 @@ async def get_order_status(
     return status_info
 
 
+@router.get("/{order_id}/events", summary="Stream order status changes")
+async def stream_order_events(
+    order_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Server-Sent Events: the order's current status, then one `status` event
+    per change. Admins may follow any order.
+    """
+    if not order_events.has_capacity():
+        raise HTTPException(status_code=503, detail="Too many open streams")
+
+    order = await order_service.get(
+        db,
+        order_id,
+        user_id=current_user.user_id,
+        is_admin=current_user.role == "admin"
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    # The stream may stay open for hours; don't hold a pooled connection.
+    await db.release()
+
+    return StreamingResponse(
+        order_events.stream(status_event(order), order.tracking_token),
+        media_type="text/event-stream",
+        headers=EVENT_STREAM_HEADERS,
+    )
+
+
+@router.get("/track/{tracking_token}/events", summary="Stream tracked order status (Public)")
+async def stream_tracking_events(
+    tracking_token: str,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Server-Sent Events for a tracking token, so trackers don't have to poll.
+    Opening a stream counts as a tracking request.
+    """
+    if not order_events.has_capacity():
+        raise HTTPException(status_code=503, detail="Too many open streams")
+
+    try:
+        body = await order_tracking.get(db, tracking_token)
+    except TrackingRateLimited as exc:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many tracking requests",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    if body is None:
+        raise HTTPException(status_code=404, detail="Order not found or invalid token")
+    await db.release()
+
+    tracked = orjson.loads(body)
+    current = {"order_id": tracked["order_id"], **{field: tracked[field] for field in STATUS_FIELDS}}
+    return StreamingResponse(
+        order_events.stream(current, tracking_token),
+        media_type="text/event-stream",
+        headers=EVENT_STREAM_HEADERS,
+    )
+
+
 @router.get("/track/{tracking_token}", response_model=OrderTrackingResponse, summary="Track order (Public)")
 async def track_order(
     tracking_token: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Track order using a public tracking token.
     Returns order details including status and address.
+    Served from the tracking cache; each token may be polled
+    TRACKING_RATE_LIMIT times per TRACKING_RATE_WINDOW_SECONDS.
     """
-    order = await order_service.get_by_tracking_token(db, tracking_token)
-    
-    if not order:
+    try:
+        body = await order_tracking.get(db, tracking_token)
+    except TrackingRateLimited as exc:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many tracking requests",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+    if body is None:
          raise HTTPException(status_code=404, detail="Order not found or invalid token")
-    
-    # Mock Delivery Steps based on status
-    steps = [
-        {"status": "Placed", "completed": True, "date": order.created_at},
-        {"status": "Processing", "completed": order.order_status in ["Processing", "Shipped", "Delivered"], "date": None},
-        {"status": "Shipped", "completed": order.order_status in ["Shipped", "Delivered"], "date": None},
-        {"status": "Delivered", "completed": order.order_status == "Delivered", "date": None},
-    ]
-    
-    # Pydantic will convert the SQLAlchemy object to the response model, 
-    # but we need to inject the mock steps.
-    response = OrderTrackingResponse.from_orm(order)
-    response.delivery_steps = steps
-    
-    return response
+
+    return Response(content=body, media_type="application/json")
 
 
 # Admin Endpoints
 
 @router.get("/admin/all", response_model=List[OrderResponse], summary="Get all orders (Admin)")
 async def get_all_orders_admin(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor=Depends(parse_cursor),
     current_user: dict = Depends(get_current_admin_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get all orders in the system."""
     orders = await order_service.get_multi_by_user(
-        db, is_admin=True, skip=skip, limit=limit
+        db, is_admin=True, skip=skip, limit=limit, cursor=cursor
     )
+    response.headers.update(next_cursor_headers(orders, limit))
     return orders
 
 @router.patch("/{order_id}/status", response_model=OrderResponse, summary="Update order status (Admin)")
@@ -221,20 +355,11 @@ async def get_user_orders(
     user_id: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor=Depends(parse_cursor),
     current_user: dict = Depends(get_current_admin_user),
     db: AsyncSession = Depends(get_db)
 ):
-    orders = await OrderService.get_orders(db, user_id=user_id, is_admin=True, skip=skip, limit=limit)
-    
-    order_summaries = [
-        OrderSummary(
-            order_id=o.order_id,
-            total_amount=o.total_amount,
-            order_status=o.order_status,
-            payment_status=o.payment_status,
-            created_at=o.created_at,
-            items_count=len(o.items)
-        ) for o in orders
-    ]
-    
-    return order_summaries
+    rows = await order_service.get_order_summaries(
+        db, user_id=user_id, is_admin=True, skip=skip, limit=limit, cursor=cursor
+    )
+    return json_response(order_summary_list_adapter, rows, headers=next_cursor_headers(rows, limit))
@@ -6,10 +6,12 @@ from typing import Dict, List, Optional, Union
 from fastapi import Depends, Query
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.dependencies import get_current_admin_user
 from app.models.product import Category, Product, Subcategory
-from app.schemas.products import CategoryResponse, ProductBase, ProductCreate, ProductResponse, ProductUpdate, SubcategoryResponse
+from app.core.http_cache import CATEGORIES, PRODUCTS, bump_catalog_version, catalog_cache
+from app.core.responses import json_response
+from app.schemas.products import CategoryResponse, ProductBase, ProductCreate, ProductResponse, ProductUpdate, SubcategoryResponse, product_list_adapter
 from app.services.products import ProductService
 from app.seeder.product import seed_product_data
 
@@ -22,13 +24,17 @@ async def seed_database(db: Session = Depends(get_db)):
     """
     Endpoint to populate the database with some sample data for demonstration.
     """
-    return await seed_product_data(db)
+    result = await seed_product_data(db)
+    await bump_catalog_version(PRODUCTS, CATEGORIES)
+    return result
 
 
 
 @router.get("/", response_model=List[ProductBase], summary="Get a list of products with filtering and pagination")
 async def get_products(
-    db: Session = Depends(get_db),
+    # Before the session: the versions in the ETag must be read before its engine is picked
+    cache_headers: Dict[str, str] = Depends(catalog_cache(PRODUCTS, CATEGORIES)),
+    db: Session = Depends(get_read_db),
     category_id: Optional[str] = Query(None, description="Filter by category ID."),
     subcategory_id: Optional[str] = Query(None, description="Filter by subcategory ID."),
     search: Optional[str] = Query(None, description="Search products by name or description."),
@@ -40,7 +46,7 @@ async def get_products(
     """
     Endpoint to retrieve and filter products with extensive query parameters.
     """
-    products = await ProductService.get_all_products(
+    rows = await ProductService.get_product_rows(
         db=db,
         category=category_id,
         subcategory=subcategory_id,
@@ -50,41 +56,22 @@ async def get_products(
         page=page,
         page_size=page_size
     )
-    
-    return [
-        ProductBase(
-            product_id=p.product_id,
-            product_name=p.product_name,
-            price=float(p.price),
-            description=p.description,
-            image_url=p.image_url,
-            category_id=p.category_id,
-            category_name=p.category.category_name if p.category else None,
-            subcategory_id=p.subcategory_id,
-            subcategory_name=p.subcategory.subcategory_name if p.subcategory else None
-        ) for p in products
-    ]
-
-@router.get("/{product_id}", response_model=ProductBase, summary="Get a single product by ID")
-async def get_product(product_id: str, db: Session = Depends(get_db)):
+    return json_response(product_list_adapter, rows, headers=cache_headers)
+
+@router.get(
+    "/{product_id}",
+    response_model=ProductBase,
+    summary="Get a single product by ID",
+    dependencies=[Depends(catalog_cache(PRODUCTS, CATEGORIES))],
+)
+async def get_product(product_id: str, db: Session = Depends(get_read_db)):
     """
     Endpoint to retrieve a single product by its unique ID.
     """
-    product = await ProductService.get_product_by_id(db, product_id)
+    product = await ProductService.get_product_row(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    return ProductBase(
-        product_id=product.product_id,
-        product_name=product.product_name,
-        price=float(product.price),
-        description=product.description,
-        image_url=product.image_url,
-        category_id=product.category_id,
-        category_name=product.category.category_name if product.category else None,
-        subcategory_id=product.subcategory_id,
-        subcategory_name=product.subcategory.subcategory_name if product.subcategory else None
-    )
+    return product
 
 
 
@@ -142,30 +129,36 @@ async def update_product(
     Supports optional image update via file upload.
     Only accessible to admins.
     """
-    # Check if product exists first
-    existing_product = await ProductService.get_product_by_id(db, product_id)
-    if not existing_product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    update_data = {
+        key: value
+        for key, value in {
+            "product_name": product_name,
+            "description": description,
+            "price": price,
+            "stock_quantity": stock_quantity,
+            "category_id": category_id,
+            "subcategory_id": subcategory_id,
+            "is_active": is_active,
+        }.items()
+        if value is not None
+    }
 
-    image_url = existing_product.image_url
     if image:
+        # Check the product exists before uploading, so a 404 leaves no orphaned image
+        if not await ProductService.get_product_by_id(db, product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
+        # Don't hold a pooled connection during the upload
+        await db.release()
         # Upload new image to S3 if provided
         s3_service = S3Service()
-        image_url = await s3_service.upload_file(image)
+        update_data["image_url"] = await s3_service.upload_file(image)
 
     # Create update data object
-    product_data = ProductUpdate(
-        product_name=product_name,
-        description=description,
-        price=price,
-        stock_quantity=stock_quantity,
-        category_id=category_id,
-        subcategory_id=subcategory_id,
-        is_active=is_active,
-        image_url=image_url
-    )
+    product_data = ProductUpdate(**update_data)
 
     updated_product = await ProductService.update_product(db, product_id, product_data)
+    if not updated_product:
+        raise HTTPException(status_code=404, detail="Product not found")
     return updated_product
 
 @router.delete("/{product_id}", status_code=200, summary="Delete a product")
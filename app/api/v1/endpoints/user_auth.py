@@ -70,7 +70,6 @@ async def login_with_otp(
         )
         db.add(user)
         await db.commit()
-        await db.refresh(user)
     
     # Create Token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
@@ -0,0 +1,40 @@
+from urllib.parse import parse_qsl
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from redis.exceptions import RedisError
+from twilio.request_validator import RequestValidator
+
+from app.config import settings
+from app.services.whatsapp_chat import push_inbound
+
+router = APIRouter(tags=["whatsapp"])
+
+EMPTY_TWIML = b'<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+
+@router.post("/webhook", summary="Inbound WhatsApp message (Twilio webhook)")
+async def inbound_message(request: Request):
+    """
+    Queue an inbound WhatsApp message for the chat worker and acknowledge
+    it at once with empty TwiML; the reply is sent separately.
+
+    Requests must carry a valid X-Twilio-Signature header; without
+    TWILIO_AUTH_TOKEN to check it against the webhook is unavailable,
+    unless WHATSAPP_WEBHOOK_VERIFY=false turns the check off.
+    """
+    params = dict(parse_qsl((await request.body()).decode(), keep_blank_values=True))
+    if settings.whatsapp_webhook_verify:
+        if not settings.twilio_auth_token:
+            raise HTTPException(status_code=503, detail="Webhook signature verification is not configured")
+        url = settings.whatsapp_webhook_url or str(request.url)
+        signature = request.headers.get("X-Twilio-Signature", "")
+        if not RequestValidator(settings.twilio_auth_token).validate(url, params, signature):
+            raise HTTPException(status_code=403, detail="Invalid Twilio signature")
+    if not params.get("MessageSid") or not params.get("From"):
+        raise HTTPException(status_code=400, detail="MessageSid and From are required")
+
+    try:
+        await push_inbound(params["MessageSid"], params["From"], params.get("Body", ""), params.get("ProfileName", ""))
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Message queue unavailable")
+    return Response(content=EMPTY_TWIML, media_type="application/xml")
@@ -30,15 +30,126 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 10.0
+    database_pool_recycle: int = 1800
+    # Off by default: pool_pre_ping costs a round trip on every checkout
+    database_pool_pre_ping: bool = False
+    # Read replicas for read-only endpoints, used round-robin
+    database_replica_urls: List[str] = []
+    database_replica_pool_size: int = 10
+    database_replica_max_overflow: int = 10
+    # After a write, reads go to the primary for this many seconds. Workers share
+    # the window through Redis; if Redis is unreachable only the worker that
+    # committed the write honours it, and a read served elsewhere may be stale.
+    database_replica_max_staleness_seconds: float = 2.0
+    # Separate pool for admin analytics (defaults to the first replica, else the primary)
+    database_analytics_url: Optional[str] = None
+    database_analytics_pool_size: int = 3
+    database_analytics_max_overflow: int = 2
+    # GET /admin/overview: panels loaded at once (one analytics connection each) and cached for this long
+    admin_overview_concurrency: int = 3
+    admin_overview_cache_seconds: int = 5
 
     # WhatsApp API (Twilio)
     twilio_account_sid: Optional[str] = None
     twilio_auth_token: Optional[str] = None
     twilio_whatsapp_number: Optional[str] = None
+    twilio_api_base_url: str = "https://api.twilio.com"
+
+    # WhatsApp notification worker (python -m app.workers.whatsapp); limits are per worker
+    whatsapp_max_concurrency: int = 10
+    # Keep the total across workers under the sender's Twilio throughput
+    whatsapp_messages_per_second: float = 20.0
+    # Minimum gap between two messages to the same recipient
+    whatsapp_per_number_interval_seconds: float = 6.0
+    whatsapp_batch_size: int = 50
+    whatsapp_max_attempts: int = 5
+    whatsapp_retry_base_seconds: float = 5.0
+    whatsapp_retry_max_seconds: float = 900.0
+    whatsapp_send_timeout_seconds: float = 10.0
+    # A worker silent this long is presumed dead; its unsent batch is requeued
+    whatsapp_worker_lease_seconds: float = 60.0
+    whatsapp_metrics_port: int = 9102
+
+    # WhatsApp chat ordering (python -m app.workers.whatsapp_chat)
+    # Public URL configured in Twilio; inbound request signatures are computed over it
+    whatsapp_webhook_url: Optional[str] = None
+    # Only for local development: accept unsigned webhook requests
+    whatsapp_webhook_verify: bool = True
+    whatsapp_inbound_partitions: int = 16
+    whatsapp_inbound_stream_maxlen: int = 100000
+    whatsapp_chat_batch_size: int = 50
+    whatsapp_chat_lease_seconds: float = 15.0
+    whatsapp_chat_state_ttl_seconds: int = 24 * 3600
+    whatsapp_chat_payment_method: str = "Cash on Delivery"
 
     # Redis
     redis_url: str = "redis://localhost:6379/0"
 
+    # HTTP caching of catalog responses (seconds)
+    http_cache_max_age: int = 30
+    http_cache_stale_while_revalidate: int = 300
+
+    # Response compression (gzip / brotli)
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    # Compressed bodies kept per worker, keyed by ETag
+    compression_cache_entries: int = 512
+
+    # Public order tracking: polls allowed per token per window
+    tracking_rate_limit: int = 30
+    tracking_rate_window_seconds: int = 60
+
+    # Idempotency-Key on POST /orders/ and POST /orders/{id}/confirm
+    idempotency_ttl_seconds: int = 24 * 3600
+    # A first request holding its key longer than this is presumed dead
+    idempotency_lock_seconds: float = 30.0
+    # How long a duplicate waits for the first request's response before a 409
+    idempotency_wait_seconds: float = 10.0
+    # The outbox worker deletes expired idempotency_keys rows this often
+    idempotency_purge_interval_seconds: float = 300.0
+
+    # Live order status streams (Server-Sent Events), per worker
+    sse_max_connections: int = 10000
+    sse_heartbeat_seconds: float = 15.0
+    # Undelivered events kept per stream; older ones are dropped first
+    sse_queue_size: int = 8
+
+    # Outbox worker (python -m app.workers.outbox)
+    outbox_batch_size: int = 100
+    outbox_poll_interval_seconds: float = 1.0
+    # A claimed event is retried after this long if its worker dies
+    outbox_lease_seconds: float = 60.0
+    outbox_max_attempts: int = 10
+    outbox_retry_base_seconds: float = 2.0
+    outbox_retry_max_seconds: float = 600.0
+    # /metrics port of the worker when PROMETHEUS_MULTIPROC_DIR isn't shared with the API
+    outbox_metrics_port: int = 9101
+
+    # Logging
+    log_sink: str = "stdout"  # stdout / file / none
+    log_level: str = "INFO"
+    log_dir: str = "/var/log/tap2cart"
+    log_retention_days: int = 10
+    log_queue_size: int = 10000
+
+    # Observability
+    slow_query_threshold_ms: float = 200.0
+    # Fraction of 2xx requests logged; slower requests are always logged
+    log_sample_rate_2xx: float = 1.0
+    log_slow_request_ms: float = 1000.0
+    # Shared directory for Prometheus metrics when running multiple workers
+    prometheus_multiproc_dir: Optional[str] = None
+
+    # Tracing
+    tracing_exporter: str = "none"  # none / otlp / file
+    tracing_sample_ratio: float = 0.05
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_file: str = "traces.jsonl"
+
     # AWS S3
     aws_access_key_id: Optional[str] = None
     aws_secret_access_key: Optional[str] = None
@@ -0,0 +1,229 @@
+"""
+Response compression.
+
+CompressionMiddleware gzip- or brotli-encodes responses above a size
+threshold, using the best coding the client's Accept-Encoding allows.
+Responses that already carry a Content-Encoding (e.g. the precompressed
+category tree) or aren't a compressible type pass through untouched.
+
+Compressed bodies of responses with a strong ETag are kept in an in-memory
+LRU keyed by a digest of the body and the coding. Catalog bodies only
+change when the catalog does, so those payloads are compressed once per
+change instead of on every request. The key is the body itself rather
+than the ETag, which names a catalog version, not the bytes sent.
+"""
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.metrics import COMPRESSION_BYTES, COMPRESSION_CPU_SECONDS, record_cache
+from app.core.responses import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Streaming responses that must reach the client chunk by chunk
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def compressible_type(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in UNCOMPRESSED_TYPES:
+        return False
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith(("json", "xml", "javascript"))
+        or media_type == "image/svg+xml"
+    )
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        # wbits 16 + MAX_WBITS writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class CompressedBodyCache:
+    """Bounded LRU of compressed bodies."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key, body: bytes):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip/brotli middleware; streaming bodies are compressed chunk by chunk."""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        cache_entries: int = 512,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = CompressedBodyCache(cache_entries)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding"))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            encoding = None
+
+        responder = _CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def stream(self, encoding: str):
+        if encoding == "br":
+            return _BrotliStream(self.brotli_quality)
+        return _GzipStream(self.gzip_level)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: Optional[str], send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.stream = None
+        self.passthrough = False
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+        self.cpu_seconds = 0.0
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress.
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+        if self.start_message is not None:
+            await self._first_body(message)
+            return
+        await self._next_body(message)
+
+    async def _first_body(self, message):
+        start, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=list(start.get("headers", [])))
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        compressible = (
+            compressible_type(headers.get("content-type", ""))
+            and "content-encoding" not in headers
+            and "content-range" not in headers
+        )
+        if compressible:
+            # The representation depends on Accept-Encoding even when sent as is.
+            headers.add_vary_header("Accept-Encoding")
+        if not compressible or self.encoding is None or (not more_body and len(body) < self.middleware.minimum_size):
+            self.passthrough = True
+            await self._send({**start, "headers": headers.raw})
+            await self._send(message)
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # Compressed bytes differ from the identity body: weaken the
+            # validator so it still matches If-None-Match upstream.
+            headers["ETag"] = f"W/{etag}"
+
+        if not more_body:
+            compressed = self._compress_whole(body, etag)
+            headers["Content-Length"] = str(len(compressed))
+            await self._send({**start, "headers": headers.raw})
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        if "content-length" in headers:
+            del headers["content-length"]
+        self.stream = self.middleware.stream(self.encoding)
+        await self._send({**start, "headers": headers.raw})
+        await self._next_body(message)
+
+    async def _next_body(self, message):
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        started = time.thread_time()
+        chunk = self.stream.compress(body, final=not more_body)
+        self.cpu_seconds += time.thread_time() - started
+        self.original_bytes += len(body)
+        self.compressed_bytes += len(chunk)
+        if not more_body:
+            self._record()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compress_whole(self, body: bytes, etag: Optional[str]) -> bytes:
+        key = None
+        if etag and not etag.startswith("W/"):
+            key = (hashlib.blake2b(body, digest_size=16).digest(), self.encoding)
+            compressed = self.middleware.cache.get(key)
+            record_cache("compressed_body", compressed is not None)
+            if compressed is not None:
+                self.original_bytes, self.compressed_bytes = len(body), len(compressed)
+                self._record()
+                return compressed
+
+        started = time.thread_time()
+        compressed = self.middleware.stream(self.encoding).compress(body, final=True)
+        self.cpu_seconds = time.thread_time() - started
+        self.original_bytes, self.compressed_bytes = len(body), len(compressed)
+        self._record()
+        if key is not None:
+            self.middleware.cache.put(key, compressed)
+        return compressed
+
+    def _record(self):
+        route = getattr(self.scope.get("route"), "path", "unmatched")
+        COMPRESSION_BYTES.labels(route=route, encoding=self.encoding, stage="original").inc(self.original_bytes)
+        COMPRESSION_BYTES.labels(route=route, encoding=self.encoding, stage="compressed").inc(self.compressed_bytes)
+        if self.cpu_seconds:
+            COMPRESSION_CPU_SECONDS.labels(route=route, encoding=self.encoding).observe(self.cpu_seconds)
@@ -1,30 +1,208 @@
 ## === app/db/database.py ===
-import os
+import itertools
+import time
 
+from redis.exceptions import RedisError
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
+from app.core.metrics import instrument_pool
+from app.core.query_stats import install_query_hooks
+from app.core.redis import redis_client
+from app.core.tracing import install_tracing_hooks
 
-# DATABASE_URL = settings.DATABASE_URL
+WRITE_STATEMENT_PREFIXES = ("INSERT", "UPDATE", "DELETE", "WITH", "COPY")
+# Set (with a max_staleness TTL) while any worker has committed a recent write
+RECENT_WRITE_KEY = "db:recent_write"
 
-engine = create_async_engine(
-    settings.database_url, 
-    pool_size = int(os.getenv("DATABASE_POOL_SIZE", 5)),
-    max_overflow=int(os.getenv("DATABASE_MAX_OVERFLOW", 10)),
-    pool_pre_ping=True,
-    pool_recycle=3600
-    # connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+
+def create_engine(url: str, pool_size: int, max_overflow: int):
+    """Async engine with the shared pool settings and instrumentation hooks."""
+    new_engine = create_async_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.database_pool_timeout,
+        pool_pre_ping=settings.database_pool_pre_ping,
+        pool_recycle=settings.database_pool_recycle,
+    )
+    install_query_hooks(new_engine)
+    install_tracing_hooks(new_engine)
+    track_writes(new_engine)
+    return new_engine
+
+
+def _begin(conn):
+    conn.info.pop("pending_write", None)
+
+
+def _mark_write(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip()[:6].upper().startswith(WRITE_STATEMENT_PREFIXES):
+        conn.info["pending_write"] = True
+
+
+def track_writes(engine):
+    """Flag connections whose current transaction has executed a write."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "begin", _begin):
+        event.listen(sync_engine, "begin", _begin)
+        event.listen(sync_engine, "before_cursor_execute", _mark_write)
+
+
+class ReadRouter:
+    """
+    Picks the engine for read-only sessions.
+
+    Reads go to the replicas in round-robin, except for `max_staleness`
+    seconds after a write is committed, when they stay on the primary so a
+    client sees its own changes despite replication lag. A worker knows of
+    its own commits right away; `publish_write()` shares them through a
+    Redis key with a `max_staleness` TTL, so a client whose write landed on
+    one worker and whose next read lands on another still reads the
+    primary. Without Redis (or with it unreachable) the window is only
+    enforced by the worker that committed.
+    """
+
+    def __init__(self, primary, replicas, max_staleness: float, redis=None):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_staleness = max_staleness
+        self.redis = redis
+        self.last_write = float("-inf")
+        self._published = float("-inf")
+        self._replica_cycle = itertools.cycle(self.replicas) if self.replicas else None
+
+    def record_write(self):
+        self.last_write = time.monotonic()
+
+    def engine_for_read(self):
+        if self._replica_cycle is None:
+            return self.primary
+        if time.monotonic() - self.last_write < self.max_staleness:
+            return self.primary
+        return next(self._replica_cycle)
+
+    async def engine_for_request(self):
+        """`engine_for_read()`, also honouring writes committed by other workers."""
+        if self._replica_cycle is None or self.redis is None:
+            return self.engine_for_read()
+        if time.monotonic() - self.last_write < self.max_staleness:
+            return self.primary
+        try:
+            if await self.redis.exists(RECENT_WRITE_KEY):
+                return self.primary
+        except RedisError:
+            pass
+        return next(self._replica_cycle)
+
+    async def publish_write(self):
+        """Tell the other workers about a write this worker committed since the last call."""
+        if self._replica_cycle is None or self.redis is None or self.last_write <= self._published:
+            return
+        last_write = self.last_write
+        try:
+            await self.redis.set(RECENT_WRITE_KEY, "1", px=max(1, int(self.max_staleness * 1000)))
+        except RedisError:
+            return
+        self._published = max(self._published, last_write)
+
+    def install(self):
+        """Track committed writes on the primary engine."""
+        track_writes(self.primary)
+        sync_engine = getattr(self.primary, "sync_engine", self.primary)
+        event.listen(sync_engine, "commit", self._commit)
+
+    def _commit(self, conn):
+        if conn.info.get("pending_write"):
+            self.record_write()
+
+
+engine = create_engine(
+    settings.database_url,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+)
+instrument_pool(engine, "primary")
+
+replica_engines = []
+for index, replica_url in enumerate(settings.database_replica_urls):
+    replica_engine = create_engine(
+        replica_url,
+        pool_size=settings.database_replica_pool_size,
+        max_overflow=settings.database_replica_max_overflow,
+    )
+    instrument_pool(replica_engine, f"replica{index}")
+    replica_engines.append(replica_engine)
+
+# Admin analytics get their own small pool so long reports can't exhaust
+# the connections checkout and cart traffic depend on.
+analytics_engine = create_engine(
+    settings.database_analytics_url or next(iter(settings.database_replica_urls), settings.database_url),
+    pool_size=settings.database_analytics_pool_size,
+    max_overflow=settings.database_analytics_max_overflow,
 )
+instrument_pool(analytics_engine, "analytics")
+
+class LazySession(AsyncSession):
+    """
+    AsyncSession that can hand its connection back early.
+
+    A session only checks out a pooled connection on its first statement.
+    `release()` ends a read-only transaction as soon as the caller is done
+    with the database, instead of holding the connection until the request
+    finishes; loaded objects stay usable and the next statement checks out
+    a connection again.
+    """
+
+    async def release(self):
+        if not self.in_transaction():
+            return
+        if self.new or self.dirty or self.deleted:
+            return
+        connection = await self.connection()
+        if connection.info.get("pending_write"):
+            # Flushed but uncommitted writes belong to whoever commits them.
+            return
+        # Nothing to persist and expire_on_commit=False: committing just ends
+        # the transaction and returns the connection to the pool.
+        await self.commit()
+
+
+read_router = ReadRouter(
+    engine, replica_engines, settings.database_replica_max_staleness_seconds, redis=redis_client
+)
+read_router.install()
+
 AsyncSessionLocal = sessionmaker(engine,
-                                 class_=AsyncSession,
+                                 class_=LazySession,
                                  expire_on_commit=False
                                  )
+AnalyticsSessionLocal = sessionmaker(analytics_engine,
+                                     class_=LazySession,
+                                     expire_on_commit=False
+                                     )
 
 Base = declarative_base()
- 
+
 async def get_db():
     async with AsyncSessionLocal() as session: 
         try: 
             yield session 
         finally: 
             await session.close() 
+            # Runs before the response is sent, so the client's next read
+            # finds the marker whichever worker serves it.
+            await read_router.publish_write()
+
+
+async def get_read_db():
+    """Session for read-only endpoints, routed to a replica when one is fresh enough."""
+    async with AsyncSessionLocal(bind=await read_router.engine_for_request()) as session:
+        yield session
+
+
+async def get_analytics_db():
+    """Session from the isolated analytics pool."""
+    async with AnalyticsSessionLocal() as session:
+        yield session
@@ -1,22 +1,23 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional
 import jwt
 from jwt.exceptions import PyJWTError
 from pydantic import ValidationError
 
-from app.core.database import get_db
+from app.core.database import LazySession, get_db
 from app.config import settings
 from app.core.redis import redis_client
+from app.core.tracing import traced
 from app.models.user import User
 
 security = HTTPBearer()
 
+@traced()
 async def get_current_user(
     token: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
+    db: LazySession = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,6 +42,9 @@ async def get_current_user(
         
     result = await db.execute(select(User).where(User.user_id == user_id))
     user = result.scalar_one_or_none()
+    # The handler shares this session (FastAPI caches get_db per request);
+    # give the connection back until it actually needs one.
+    await db.release()
     
     if user is None:
         raise credentials_exception
@@ -62,9 +66,10 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
 
 security_optional = HTTPBearer(auto_error=False)
 
+@traced()
 async def get_current_user_optional(
     token: Optional[HTTPAuthorizationCredentials] = Depends(security_optional),
-    db: AsyncSession = Depends(get_db)
+    db: LazySession = Depends(get_db)
 ) -> Optional[User]:
     if not token:
         return None
@@ -81,6 +86,7 @@ async def get_current_user_optional(
         
     result = await db.execute(select(User).where(User.user_id == user_id))
     user = result.scalar_one_or_none()
+    await db.release()
     
     if user is None:
         return None
@@ -0,0 +1,112 @@
+"""
+Conditional GET for catalog endpoints.
+
+Each catalog entity type has a version counter in Redis that the service
+write paths bump after committing. A response's ETag is a hash of the
+request URL and the versions of the entities it is built from, so
+`If-None-Match` can be answered with 304 from Redis alone, before the
+endpoint touches the database.
+
+Endpoints using `catalog_cache` may read from a replica (`get_read_db`).
+The ETag names the current version, so a lagging replica must not be
+allowed to build the body: every later revalidation would keep that old
+body alive until the next write. Bumping a version therefore also sets
+the shared recent-write marker, which keeps `get_read_db` on the primary
+for DATABASE_REPLICA_MAX_STALENESS_SECONDS. `catalog_cache` has to
+resolve before `get_read_db` (as a route-level dependency, or a parameter
+declared ahead of the session), so the versions are read before the
+engine is picked, and a version newer than the replica always comes with
+the marker.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, Response
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.database import RECENT_WRITE_KEY
+from app.core.logger import logger
+from app.core.metrics import record_cache
+from app.core.redis import redis_client
+
+PRODUCTS = "products"
+CATEGORIES = "categories"
+STOCK = "stock"
+
+VERSION_KEY = "catalog:version:{}"
+
+
+async def bump_catalog_version(*entities: str):
+    """
+    Invalidate the ETags of every response built from `entities`, and keep
+    catalog reads off the replicas until they have the change. Call after commit.
+    """
+    staleness_ms = max(1, int(settings.database_replica_max_staleness_seconds * 1000))
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(RECENT_WRITE_KEY, "1", px=staleness_ms)
+            for entity in entities:
+                pipe.incr(VERSION_KEY.format(entity))
+            await pipe.execute()
+    except RedisError:
+        logger.warning(f"Could not bump catalog version for {', '.join(entities)}")
+
+
+async def get_catalog_versions(*entities: str) -> Optional[list]:
+    try:
+        return await redis_client.mget([VERSION_KEY.format(entity) for entity in entities])
+    except RedisError:
+        return None
+
+
+def version_tag(versions: list) -> str:
+    """Compact string identifying a set of catalog versions."""
+    return ":".join(v or "0" for v in versions)
+
+
+def _etag(request: Request, versions: list) -> str:
+    key = f"{request.url.path}?{request.url.query}|{version_tag(versions)}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cache_control() -> str:
+    return (
+        f"public, max-age={settings.http_cache_max_age}, "
+        f"stale-while-revalidate={settings.http_cache_stale_while_revalidate}"
+    )
+
+
+def catalog_cache(*entities: str):
+    """
+    Dependency adding ETag and Cache-Control headers to a catalog response,
+    and answering a matching If-None-Match with 304 Not Modified.
+
+    Returns the headers so endpoints that build their own Response can pass
+    them on; for the rest they are set on the injected response.
+    """
+
+    async def dependency(request: Request, response: Response) -> Dict[str, str]:
+        versions = await get_catalog_versions(*entities)
+        if versions is None:
+            # Without the counters a cached copy can't be validated.
+            return {}
+
+        etag = _etag(request, versions)
+        headers = {"ETag": etag, "Cache-Control": cache_control()}
+        hit = etag_matches(request.headers.get("if-none-match"), etag)
+        record_cache("http_etag", hit)
+        if hit:
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return headers
+
+    return dependency
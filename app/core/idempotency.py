@@ -0,0 +1,311 @@
+"""
+Idempotency-Key support for retried POSTs.
+
+A request that carries an `Idempotency-Key` header runs once. Its response,
+2xx or 4xx, is stored for IDEMPOTENCY_TTL_SECONDS. Later requests with the
+same key get the stored response back, marked `Idempotent-Replayed: true`.
+A duplicate that arrives while the first request is still running waits
+up to IDEMPOTENCY_WAIT_SECONDS for that response instead of running in
+parallel. Reusing a key for a different request body is a 422. 5xx
+responses and exceptions are not stored, so the client can retry. Keys
+are namespaced by an owner; a request without one (an anonymous guest)
+can't use a key at all, since a replay would hand it whatever another
+anonymous client stored under the same key.
+
+Records live in Redis: `idempotency:{key}` holds the response and
+`idempotency:{key}:lock` marks the request in flight. While Redis is
+unreachable the idempotency_keys table is used instead. Its expired rows
+are overwritten when their key is used again, and deleted by the outbox
+worker every IDEMPOTENCY_PURGE_INTERVAL_SECONDS (`purge_expired`).
+"""
+import asyncio
+import datetime
+import hashlib
+import time
+import uuid
+from typing import Awaitable, Callable, Optional, Union
+
+import orjson
+from fastapi import Header, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from redis.exceptions import RedisError
+from sqlalchemy import and_, or_, select, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from starlette.responses import Response
+
+from app.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.core.metrics import IDEMPOTENCY_REQUESTS
+from app.core.redis import redis_client
+from app.models.idempotency import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+RECORD_KEY = "idempotency:{}"
+LOCK_KEY = "idempotency:{}:lock"
+
+# KEYS[1] record, KEYS[2] lock; ARGV lock token, lock ttl in ms. The stored
+# record, 1 if the caller now holds the lock, 0 if someone else does.
+BEGIN_SCRIPT = """
+local record = redis.call('GET', KEYS[1])
+if record then
+    return record
+end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] record, KEYS[2] lock; ARGV record, ttl, lock token
+COMPLETE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+if redis.call('GET', KEYS[2]) == ARGV[3] then
+    redis.call('DEL', KEYS[2])
+end
+return 1
+"""
+
+# KEYS[1] lock; ARGV lock token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# What a store's begin() returns: a stored response, or whether the lock was taken
+BeginResult = Union[dict, bool]
+
+
+class RedisIdempotencyStore:
+    async def begin(self, key: str, fingerprint: str, token: str) -> BeginResult:
+        result = await redis_client.eval(
+            BEGIN_SCRIPT, 2, RECORD_KEY.format(key), LOCK_KEY.format(key),
+            token, int(settings.idempotency_lock_seconds * 1000),
+        )
+        if isinstance(result, str):
+            record = orjson.loads(result)
+            record["body"] = record["body"].encode()
+            return record
+        return bool(result)
+
+    async def complete(self, key: str, token: str, record: dict):
+        stored = orjson.dumps(dict(record, body=record["body"].decode()))
+        await redis_client.eval(
+            COMPLETE_SCRIPT, 2, RECORD_KEY.format(key), LOCK_KEY.format(key),
+            stored, settings.idempotency_ttl_seconds, token,
+        )
+
+    async def release(self, key: str, token: str):
+        await redis_client.eval(RELEASE_SCRIPT, 1, LOCK_KEY.format(key), token)
+
+
+class DatabaseIdempotencyStore:
+    """The same contract on the idempotency_keys table; each call commits on its own connection."""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def begin(self, key: str, fingerprint: str, token: str) -> BeginResult:
+        now = datetime.datetime.utcnow()
+        table = IdempotencyKey.__table__
+        values = {
+            "key": key,
+            "fingerprint": fingerprint,
+            "status_code": None,
+            "body": None,
+            "content_type": None,
+            "locked_until": now + datetime.timedelta(seconds=settings.idempotency_lock_seconds),
+            "lock_token": token,
+            "created_at": now,
+            "expires_at": now + datetime.timedelta(seconds=settings.idempotency_ttl_seconds),
+        }
+        stmt = pg_insert(table).values(**values)
+        # Take over a key whose record expired or whose first request died holding the lock
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={column: stmt.excluded[column] for column in values if column != "key"},
+            where=or_(
+                table.c.expires_at < now,
+                and_(table.c.status_code.is_(None), table.c.locked_until < now),
+            ),
+        ).returning(table.c.key)
+
+        async with self.session_factory() as db:
+            claimed = (await db.execute(stmt)).first()
+            row = None
+            if claimed is None:
+                row = (await db.execute(
+                    select(table.c.fingerprint, table.c.status_code, table.c.body, table.c.content_type)
+                    .where(table.c.key == key)
+                )).one_or_none()
+            await db.commit()
+        if claimed is not None:
+            return True
+        if row is None or row.status_code is None:
+            return False
+        return dict(row._mapping)
+
+    async def complete(self, key: str, token: str, record: dict):
+        table = IdempotencyKey.__table__
+        async with self.session_factory() as db:
+            await db.execute(
+                update(table)
+                .where(table.c.key == key)
+                .values(
+                    status_code=record["status_code"],
+                    body=record["body"],
+                    content_type=record["content_type"],
+                    expires_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=settings.idempotency_ttl_seconds),
+                )
+            )
+            await db.commit()
+
+    async def release(self, key: str, token: str):
+        table = IdempotencyKey.__table__
+        async with self.session_factory() as db:
+            # Only our own lock: after it expired, a retry may have taken the key over
+            await db.execute(delete(table).where(
+                table.c.key == key, table.c.status_code.is_(None), table.c.lock_token == token
+            ))
+            await db.commit()
+
+
+    async def purge_expired(self, batch_size: int = 1000) -> int:
+        """Delete expired records in batches of batch_size; returns how many went."""
+        table = IdempotencyKey.__table__
+        purged = 0
+        while True:
+            expired = (
+                select(table.c.key)
+                .where(table.c.expires_at < datetime.datetime.utcnow())
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            async with self.session_factory() as db:
+                deleted = (await db.execute(delete(table).where(table.c.key.in_(expired)))).rowcount
+                await db.commit()
+            purged += deleted
+            if deleted < batch_size:
+                return purged
+
+
+redis_store = RedisIdempotencyStore()
+database_store = DatabaseIdempotencyStore()
+
+
+class Idempotency:
+    """Per-request handle given to an endpoint by the `idempotent` dependency."""
+
+    def __init__(self, scope: str, key: Optional[str], fingerprint: str):
+        self.scope = scope
+        self.key = key
+        self.fingerprint = fingerprint
+
+    async def run(self, handler: Callable[[], Awaitable[Response]], owner: Optional[str] = None) -> Response:
+        """
+        Return handler()'s response, or the stored one for a repeated key.
+        `owner` (a user or order id) namespaces the key so that clients
+        can't replay each other's responses; a key sent without an owner
+        is refused with a 400.
+        """
+        if self.key is None:
+            return await handler()
+        if owner is None:
+            raise HTTPException(
+                status_code=400, detail=f"{IDEMPOTENCY_HEADER} requires a signed-in user"
+            )
+
+        key = f"{self.scope}:{owner}:{self.key}"
+        token = uuid.uuid4().hex
+        store, record = await self._begin(key, token)
+        if record is not None:
+            IDEMPOTENCY_REQUESTS.labels(scope=self.scope, result="replayed").inc()
+            return Response(
+                content=record["body"],
+                status_code=record["status_code"],
+                media_type=record["content_type"],
+                headers={REPLAYED_HEADER: "true"},
+            )
+
+        IDEMPOTENCY_REQUESTS.labels(scope=self.scope, result="new").inc()
+        try:
+            try:
+                response = await handler()
+            except HTTPException as exc:
+                response = ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+        except BaseException:
+            await self._finish(store.release(key, token))
+            raise
+
+        if response.status_code >= 500:
+            await self._finish(store.release(key, token))
+        else:
+            await self._finish(store.complete(key, token, {
+                "fingerprint": self.fingerprint,
+                "status_code": response.status_code,
+                "body": bytes(response.body),
+                "content_type": response.headers.get("content-type"),
+            }))
+        return response
+
+    async def _begin(self, key: str, token: str):
+        """Take the key's lock (returns (store, None)) or get its stored response ((store, record))."""
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        delay = 0.02
+        while True:
+            store = redis_store
+            try:
+                result = await store.begin(key, self.fingerprint, token)
+            except RedisError as exc:
+                logger.warning(f"Idempotency falling back to the database: {exc}")
+                store = database_store
+                result = await store.begin(key, self.fingerprint, token)
+
+            if result is True:
+                return store, None
+            if isinstance(result, dict):
+                if result["fingerprint"] != self.fingerprint:
+                    IDEMPOTENCY_REQUESTS.labels(scope=self.scope, result="mismatch").inc()
+                    raise HTTPException(
+                        status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request"
+                    )
+                return store, result
+            if time.monotonic() >= deadline:
+                IDEMPOTENCY_REQUESTS.labels(scope=self.scope, result="timeout").inc()
+                raise HTTPException(
+                    status_code=409, detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    @staticmethod
+    async def _finish(operation: Awaitable):
+        # A lost write only costs the replay; the lock expires on its own
+        try:
+            await operation
+        except Exception as exc:
+            logger.warning(f"Couldn't store idempotent response: {exc}")
+
+
+def idempotent(scope: str):
+    """Dependency factory: an Idempotency handle for the request's Idempotency-Key, if any."""
+
+    async def dependency(
+        request: Request,
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    ) -> Idempotency:
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters"
+            )
+        if idempotency_key is None:
+            return Idempotency(scope, None, "")
+        digest = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+        digest.update(await request.body())
+        return Idempotency(scope, idempotency_key, digest.hexdigest())
+
+    return dependency
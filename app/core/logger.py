@@ -1,39 +1,217 @@
+"""
+Application logging.
+
+Importing this module only re-exports loguru's `logger`; nothing is created
+on disk until `setup_logging()` runs (the app and workers call it at
+startup). Sinks are chosen through Settings:
+
+    LOG_SINK=stdout   JSON records on stdout (default)
+    LOG_SINK=file     JSON records in LOG_DIR/tap2cart.log, rotated daily
+    LOG_SINK=none     logging disabled
+
+Records go through a bounded in-memory queue drained by a writer thread;
+when the queue is full new records are dropped and counted instead of
+blocking request handling.
+"""
+import atexit
+import datetime
+import os
+import queue
 import sys
-from datetime import datetime
+import threading
+import time
+import zipfile
 from pathlib import Path
+
 from loguru import logger
 
-# Create a logs directory inside the system temp folder
-LOG_DIR = Path("/var/log/tap2cart")
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-
-# Log file path with current date
-LOG_FILE = LOG_DIR / f"{datetime.now().strftime('%Y-%m-%d')}.log"
-
-# Remove default logger
-logger.remove()
-
-# Add file logger
-logger.add(
-    LOG_FILE,
-    rotation="1 day",         # New log file every day
-    retention="10 days",      # Keep logs for 10 days
-    compression="zip",        # Compress old logs
-    enqueue=True,             # Safe for multi-thread/multi-process
-    serialize=True,           # JSON format for structured logging
-    level="INFO",             # Default log level
-)
-
-# Optional: console logging for dev environment
-# logger.add(
-#     sys.stdout,
-#     colorize=True,
-#     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
-#            "<level>{level}</level> | "
-#            "<cyan>{module}</cyan>:<cyan>{line}</cyan> - "
-#            "<level>{message}</level>",
-#     level="DEBUG",
-# )
-
-# Example usage
-# logger.info("Logger initialized")
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+LOG_FILE_NAME = "tap2cart.log"
+
+_configured = False
+_sink = None
+
+
+class BoundedQueueSink:
+    """
+    Loguru sink that hands formatted records to a writer thread through a
+    bounded queue. Records arriving while the queue is full are dropped.
+    """
+
+    def __init__(self, writer, maxsize: int):
+        self._writer = writer
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        try:
+            self._queue.put_nowait(str(message))
+        except queue.Full:
+            self.dropped += 1
+            from app.core.metrics import LOG_RECORDS_DROPPED
+            LOG_RECORDS_DROPPED.inc()
+
+    def flush(self):
+        # The writer thread flushes whenever it drains the queue.
+        pass
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self._writer.write(message)
+                if self._queue.empty():
+                    self._writer.flush()
+            except Exception:
+                pass
+        try:
+            self._writer.flush()
+        except Exception:
+            # At interpreter shutdown the stream may already be closed
+            pass
+
+    def stop(self, timeout: float = 5.0):
+        """Drain queued records and stop the writer thread."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class StreamWriter:
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, message: str):
+        self._stream.write(message)
+
+    def flush(self):
+        self._stream.flush()
+
+
+class SharedFileWriter:
+    """
+    Appends to LOG_DIR/tap2cart.log from any number of worker processes.
+
+    Exactly one process (whoever holds an flock on LOG_DIR/.rotation.lock)
+    rotates the file at midnight, compresses rotated files and applies
+    retention. The others notice the rotation by inode change and reopen.
+    """
+
+    CHECK_INTERVAL = 1.0
+    COMPRESS_DELAY = 60.0
+
+    def __init__(self, directory: Path, retention_days: int):
+        self.directory = directory
+        self.path = directory / LOG_FILE_NAME
+        self.retention_days = retention_days
+        self._lock_file = None
+        self._next_check = 0.0
+        self._file = None
+        self._open()
+        self._try_become_owner()
+
+    @property
+    def is_owner(self) -> bool:
+        return self._lock_file is not None
+
+    def _open(self):
+        if self._file:
+            self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._day = datetime.date.today()
+
+    def _try_become_owner(self):
+        if self._lock_file is not None:
+            return
+        if fcntl is None:
+            self._lock_file = True
+            return
+        lock_file = open(self.directory / ".rotation.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+
+    def write(self, message: str):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.CHECK_INTERVAL
+            self._maintain()
+        self._file.write(message)
+
+    def flush(self):
+        self._file.flush()
+
+    def _maintain(self):
+        if self.is_owner:
+            if datetime.date.today() != self._day:
+                self._rotate()
+            return
+
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            self._open()
+        # Take over rotation if the previous owner exited.
+        self._try_become_owner()
+
+    def _rotate(self):
+        rotated = self.directory / f"tap2cart.{self._day.isoformat()}.log"
+        self._file.flush()
+        os.replace(self.path, rotated)
+        self._open()
+        timer = threading.Timer(self.COMPRESS_DELAY, self._compress_and_prune, args=(rotated,))
+        timer.daemon = True
+        timer.start()
+
+    def _compress_and_prune(self, rotated: Path):
+        archive = rotated.with_suffix(".log.zip")
+        with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.write(rotated, arcname=rotated.name)
+        rotated.unlink()
+
+        cutoff = time.time() - self.retention_days * 86400
+        for old in self.directory.glob("tap2cart.*.log.zip"):
+            if old.stat().st_mtime < cutoff:
+                old.unlink()
+
+
+def setup_logging():
+    """Configure sinks from Settings. Safe to call more than once."""
+    global _configured, _sink
+    if _configured:
+        return
+    _configured = True
+
+    from app.config import settings
+
+    logger.remove()
+    sink_type = settings.log_sink.lower()
+    if sink_type == "none":
+        return
+
+    if sink_type == "file":
+        directory = Path(settings.log_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        writer = SharedFileWriter(directory, settings.log_retention_days)
+    else:
+        writer = StreamWriter(sys.stdout)
+
+    _sink = BoundedQueueSink(writer, maxsize=settings.log_queue_size)
+    logger.add(_sink, serialize=True, level=settings.log_level, enqueue=False)
+    atexit.register(_sink.stop)
@@ -0,0 +1,237 @@
+import os
+import time
+
+from app.config import settings
+
+# prometheus_client decides between single- and multi-process storage when it is
+# first imported, so the directory has to be exported before that import.
+if settings.prometheus_multiproc_dir:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.prometheus_multiproc_dir)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    REGISTRY,
+)
+from sqlalchemy import event  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+PROCESS_STARTED_AT = time.time()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code.",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served.",
+    multiprocess_mode="livesum",
+)
+
+COMPRESSION_BYTES = Counter(
+    "http_compression_bytes_total",
+    "Response body bytes before (original) and after (compressed) compression.",
+    ["route", "encoding", "stage"],
+)
+COMPRESSION_CPU_SECONDS = Histogram(
+    "http_compression_cpu_seconds",
+    "CPU time spent compressing a response body (cache hits excluded).",
+    ["route", "encoding"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured pool_size of each connection pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out",
+    "Database connections currently checked out of the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond pool_size (negative while the pool is below size).",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency.",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss).",
+    ["cache", "result"],
+)
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Coalesced service calls by function and result (executed/coalesced).",
+    ["call", "result"],
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the log queue was full.",
+)
+
+ORDERS_CREATED = Counter("orders_created_total", "Orders created.")
+ORDER_CONFIRMATIONS = Counter(
+    "order_confirmations_total",
+    "Checkout payment confirmations by outcome.",
+    ["result"],
+)
+ORDERS_CANCELLED = Counter("orders_cancelled_total", "Orders cancelled.")
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "Requests with an Idempotency-Key by scope and result (new/replayed/mismatch/timeout).",
+    ["scope", "result"],
+)
+
+OUTBOX_EVENTS = Counter(
+    "outbox_events_total",
+    "Outbox events handled by the worker, by type and result (done/retry/failed).",
+    ["event_type", "result"],
+)
+OUTBOX_PENDING = Gauge(
+    "outbox_pending_events",
+    "Outbox events waiting to be delivered.",
+    multiprocess_mode="max",
+)
+OUTBOX_LAG_SECONDS = Gauge(
+    "outbox_lag_seconds",
+    "Age of the oldest undelivered outbox event.",
+    multiprocess_mode="max",
+)
+OUTBOX_DELIVERY_SECONDS = Histogram(
+    "outbox_delivery_seconds",
+    "Time from an outbox event being written to being delivered.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+
+WHATSAPP_MESSAGES = Counter(
+    "whatsapp_messages_total",
+    "WhatsApp notifications by result (sent/retry/deferred/dead).",
+    ["result"],
+)
+WHATSAPP_SEND_SECONDS = Histogram(
+    "whatsapp_send_seconds",
+    "Twilio API latency per WhatsApp message.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+WHATSAPP_QUEUE_DEPTH = Gauge(
+    "whatsapp_queue_depth",
+    "WhatsApp notifications queued or waiting for a retry.",
+    multiprocess_mode="max",
+)
+
+SSE_CONNECTIONS = Gauge(
+    "sse_connections",
+    "Open Server-Sent Events streams.",
+    multiprocess_mode="livesum",
+)
+SSE_EVENTS_DROPPED = Counter(
+    "sse_events_dropped_total",
+    "Events dropped because a slow subscriber's queue was full (the newest is kept).",
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def instrument_pool(engine, name: str = "primary"):
+    """Track checked-out and overflow connection counts for an engine's pool."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.labels(pool=name).set(pool.size())
+    checked_out = DB_POOL_CHECKED_OUT.labels(pool=name)
+    overflow = DB_POOL_OVERFLOW.labels(pool=name)
+
+    def update(*_):
+        checked_out.set(pool.checkedout())
+        overflow.set(pool.overflow())
+
+    event.listen(pool, "checkout", update)
+    event.listen(pool, "checkin", update)
+
+
+def uptime_seconds() -> float:
+    return time.time() - PROCESS_STARTED_AT
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request counts, latency and in-flight
+    requests, labelled by route template rather than raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method=method, route=route_path).observe(duration)
+            HTTP_REQUESTS.labels(method=method, route=route_path, status=str(status_code)).inc()
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the shared multiprocess directory."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus scrape endpoint, aggregated across workers in multiprocess mode."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,13 +1,31 @@
-from fastapi import FastAPI, Request
+import random
+import time
+import uuid
+
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.config import settings
+from app.core.compression import CompressionMiddleware
 from app.core.logger import logger
+from app.core.metrics import MetricsMiddleware
+from app.core.idempotency import REPLAYED_HEADER
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.query_stats import start_query_stats
+from app.core.tracing import TracingMiddleware, current_trace_id, tracing_enabled
 
 def setup_middlewares(app: FastAPI):
+    # Compression (innermost, so everything outside sees final headers and sizes)
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        cache_entries=settings.compression_cache_entries,
+    )
+
     # In production
     if settings.environment == "production":
         app.add_middleware(HTTPSRedirectMiddleware)
@@ -15,30 +33,107 @@ def setup_middlewares(app: FastAPI):
             TrustedHostMiddleware,
             allowed_hosts=["yourdomain.com"]
         )
-    
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.allowed_origins,
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER],
     )
 
     # Logging middleware
-    app.add_middleware(BaseHTTPMiddleware, dispatch=log_requests)
+    app.add_middleware(
+        RequestLoggingMiddleware,
+        sample_rate_2xx=settings.log_sample_rate_2xx,
+        slow_request_ms=settings.log_slow_request_ms,
+    )
+
+    # Tracing middleware (wraps the logger so request records carry the trace ID)
+    if tracing_enabled():
+        app.add_middleware(TracingMiddleware)
+
+    # Metrics middleware (outermost, so it times the whole stack)
+    app.add_middleware(MetricsMiddleware)
 
-async def log_requests(request: Request, call_next):
+
+class RequestLoggingMiddleware:
     """
-    Middleware to log all requests and responses.
+    Pure ASGI request logger.
+
+    Emits one structured record per request (method, route template, status,
+    duration, request ID and SQL stats) after the response completes. 2xx
+    responses are sampled at `sample_rate_2xx` unless slower than
+    `slow_request_ms`; everything else is always logged. Response bodies are
+    passed through untouched, so streaming responses are not buffered.
     """
-    logger.info(f"Request: {request.method} {request.url}")
-    try:
-        response = await call_next(request)
-        logger.info(
-            f"Response: {request.method} {request.url} "
-            f"Status: {response.status_code}"
-        )
-        return response
-    except Exception as e:
-        logger.exception(f"Error processing request: {request.method} {request.url}")
-        raise e
\ No newline at end of file
+
+    def __init__(self, app, sample_rate_2xx: float = 1.0, slow_request_ms: float = 1000.0):
+        self.app = app
+        self.sample_rate_2xx = sample_rate_2xx
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        log_context = {"request_id": request_id}
+        trace_id = current_trace_id()
+        if trace_id:
+            log_context["trace_id"] = trace_id
+
+        stats = start_query_stats()
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with logger.contextualize(**log_context):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except Exception:
+                logger.bind(
+                    method=scope["method"],
+                    route=self._route(scope),
+                    **stats.log_fields()
+                ).exception("Unhandled error")
+                raise
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            if (
+                200 <= status_code < 300
+                and duration_ms < self.slow_request_ms
+                and self.sample_rate_2xx < 1.0
+                and random.random() >= self.sample_rate_2xx
+            ):
+                return
+
+            logger.bind(
+                method=scope["method"],
+                route=self._route(scope),
+                status=status_code,
+                duration_ms=round(duration_ms, 2),
+                **stats.log_fields()
+            ).info("request")
+
+    @staticmethod
+    def _route(scope) -> str:
+        route = scope.get("route")
+        return getattr(route, "path", None) or scope["path"]
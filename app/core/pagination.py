@@ -0,0 +1,27 @@
+"""
+Opaque keyset cursors.
+
+A cursor carries the sort key of the last row of a page, (created_at, id),
+so the next page is read with `WHERE (created_at, id) < cursor` along an
+index instead of an OFFSET that scans and discards every earlier row.
+"""
+import base64
+from datetime import datetime
+from typing import Tuple
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, key: str) -> str:
+    raw = f"{created_at.isoformat()}|{key}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for anything it didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, key = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), key
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
@@ -0,0 +1,111 @@
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.core.logger import logger
+
+SLOWEST_KEPT = 3
+STATEMENT_PREVIEW_CHARS = 300
+
+
+class QueryStats:
+    """
+    Per-request SQL statistics: statement count, total DB time, rows fetched
+    and the slowest few statements.
+    """
+    __slots__ = ("count", "duration", "rows", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.rows = 0
+        self.slowest: List[Tuple[float, str]] = []
+
+    def record(self, statement: str, duration: float, rows: int = 0):
+        self.count += 1
+        self.duration += duration
+        if rows > 0:
+            self.rows += rows
+        if len(self.slowest) < SLOWEST_KEPT or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement[:STATEMENT_PREVIEW_CHARS]))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header."""
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+    def log_fields(self) -> dict:
+        return {
+            "db_queries": self.count,
+            "db_time_ms": round(self.duration * 1000, 2),
+            "db_rows": self.rows,
+            "db_slowest": [
+                {"ms": round(duration * 1000, 2), "statement": statement}
+                for duration, statement in self.slowest
+            ],
+        }
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start_query_stats() -> QueryStats:
+    """Begin collecting statistics for the current request (or task) context."""
+    stats = QueryStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def _redact(parameters) -> str:
+    """Describe bound parameters by type only so values never reach the logs."""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f"<{len(parameters)} parameter sets>"
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return "()"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    duration = time.perf_counter() - started
+
+    stats = _current_stats.get()
+    if stats is not None:
+        rows = cursor.rowcount if cursor.description is not None else 0
+        stats.record(statement, duration, rows)
+
+    if duration * 1000 >= settings.slow_query_threshold_ms:
+        logger.bind(
+            db_time_ms=round(duration * 1000, 2),
+            db_statement=statement[:STATEMENT_PREVIEW_CHARS * 4],
+            db_parameters=_redact(parameters),
+            db_executemany=executemany,
+        ).warning(f"Slow query ({duration * 1000:.1f} ms)")
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def install_query_hooks(engine):
+    """Attach statement timing hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
@@ -1,9 +1,29 @@
+import time
+
 import redis.asyncio as redis
 from app.config import settings
+from app.core.metrics import REDIS_COMMAND_DURATION
+from app.core.tracing import redis_span
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that records per-command latency and trace spans."""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        started = time.perf_counter()
+        try:
+            with redis_span(command):
+                return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(command=command).observe(time.perf_counter() - started)
+
 
 # Initialize Redis client
 # You might want to add REDIS_URL to your settings
-redis_client = redis.from_url(getattr(settings, "redis_url", "redis://localhost:6379/0"), encoding="utf-8", decode_responses=True)
+redis_client = InstrumentedRedis.from_url(getattr(settings, "redis_url", "redis://localhost:6379/0"), encoding="utf-8", decode_responses=True)
+# For binary payloads (precompressed snapshots)
+redis_binary_client = InstrumentedRedis.from_url(getattr(settings, "redis_url", "redis://localhost:6379/0"), decode_responses=False)
 
 async def get_redis_client():
     return redis_client
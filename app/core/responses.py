@@ -0,0 +1,36 @@
+from typing import Any, Optional
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+
+def json_response(adapter: TypeAdapter, value: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    Serialize `value` with a prebuilt TypeAdapter straight to JSON bytes.
+
+    Returning a Response skips FastAPI's response_model validation and
+    encoding pass; the route's response_model still documents the schema.
+    """
+    return Response(
+        content=adapter.dump_json(value),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings an Accept-Encoding header allows (q > 0), lowercased."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip() and quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
@@ -0,0 +1,104 @@
+"""
+Request coalescing ("single flight") for hot reads.
+
+A service coroutine decorated with `@single_flight()` runs once for any
+number of concurrent calls with equal arguments: the first call executes,
+calls arriving while it is in flight await the same result (or exception)
+instead of repeating the query. Nothing is cached - once the call has
+finished, the next one executes again - and calls are only shared within
+one worker process.
+
+The key is the function plus its arguments. The session argument (`db`)
+is left out, except for the engine it is bound to, so a replica read
+never answers a caller on the primary. The shared execution doesn't use
+any caller's session: it opens its own on that engine and closes it when
+done, so a caller that is cancelled (and closes its session) doesn't
+break the others. Decorated functions should return plain rows or
+schemas, not ORM objects, which would outlive their session.
+"""
+import asyncio
+import functools
+import inspect
+from typing import Callable, Dict, Hashable, Optional
+
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import SINGLEFLIGHT_CALLS
+
+
+def _freeze(value) -> Hashable:
+    """A hashable stand-in for a list, dict or set argument."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+class SingleFlight:
+    """The calls in flight in this worker, by key."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, name: str, key: Hashable, call: Callable):
+        task = self._calls.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.labels(call=name, result="executed").inc()
+            # A task rather than an await, so the callers share one execution
+            # that outlives any of them being cancelled (a client disconnect).
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            SINGLEFLIGHT_CALLS.labels(call=name, result="coalesced").inc()
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller went away
+
+
+flights = SingleFlight()
+
+
+def single_flight(name: Optional[str] = None, session: str = "db"):
+    """Decorator: concurrent calls with equal arguments share one execution."""
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        call_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                key = (func,) + tuple(
+                    (param, getattr(value, "bind", None) if param == session else _freeze(value))
+                    for param, value in bound.arguments.items()
+                )
+                hash(key)
+            except TypeError:
+                # Arguments that can't be compared this way just aren't coalesced
+                return await func(*args, **kwargs)
+
+            async def shared():
+                db = bound.arguments.get(session)
+                if db is None:
+                    return await func(*args, **kwargs)
+                async with AsyncSessionLocal(bind=db.bind) as own:
+                    bound.arguments[session] = own
+                    return await func(*bound.args, **bound.kwargs)
+
+            return await flights.do(call_name, key, shared)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,227 @@
+"""
+OpenTelemetry tracing.
+
+Spans are created for every route (TracingMiddleware), every service
+method (`traced_service`), every SQL statement (`install_tracing_hooks`)
+and every Redis command (`redis_span`). Tracing is off unless
+TRACING_EXPORTER is set:
+
+    TRACING_EXPORTER=none   no spans are created (default)
+    TRACING_EXPORTER=otlp   OTLP/HTTP to TRACING_OTLP_ENDPOINT (local collector)
+    TRACING_EXPORTER=file   one JSON span per line in TRACING_FILE
+
+TRACING_SAMPLE_RATIO sets the fraction of traces recorded. Sampling is
+decided at the root (or taken from an incoming `traceparent` header), and
+child spans are only created while the current span is recording, so
+unsampled requests pay almost nothing.
+"""
+import functools
+import inspect
+import os
+from contextlib import nullcontext
+from typing import Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+
+STATEMENT_ATTRIBUTE_CHARS = 2000
+
+tracer = trace.get_tracer("tap2cart")
+
+_enabled = False
+_provider = None
+
+
+def setup_tracing():
+    """Install the tracer provider from Settings. Safe to call more than once."""
+    global _enabled, _provider
+    if _provider is not None:
+        return
+
+    from app.config import settings
+
+    exporter_type = settings.tracing_exporter.lower()
+    if exporter_type == "none":
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if exporter_type == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    elif exporter_type == "file":
+        out = open(settings.tracing_file, "a", encoding="utf-8")
+        exporter = ConsoleSpanExporter(
+            out=out,
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {settings.tracing_exporter}")
+
+    _provider = TracerProvider(
+        resource=Resource.create({
+            "service.name": settings.project_name,
+            "deployment.environment": settings.environment,
+        }),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    _enabled = True
+
+
+def shutdown_tracing():
+    """Flush buffered spans."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+
+def _recording() -> bool:
+    return _enabled and trace.get_current_span().is_recording()
+
+
+def current_trace_id() -> Optional[str]:
+    """Hex trace ID of the current span, if it is being recorded."""
+    if not _recording():
+        return None
+    return format(trace.get_current_span().get_span_context().trace_id, "032x")
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening a server span per request. Continues the
+    trace from an incoming `traceparent` header and names the span after the
+    route template once routing has happened.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        method = scope["method"]
+
+        with tracer.start_as_current_span(
+            f"{method} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            record_exception=True,
+        ) as span:
+            if not span.is_recording():
+                await self.app(scope, receive, send)
+                return
+
+            span.set_attribute("http.request.method", method)
+            span.set_attribute("url.path", scope["path"])
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.set_attribute("http.route", route)
+                    span.update_name(f"{method} {route}")
+
+
+def traced(name: Optional[str] = None):
+    """Decorator opening an internal span around a coroutine function."""
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not _recording():
+                return await fn(*args, **kwargs)
+            with tracer.start_as_current_span(span_name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_service(cls):
+    """Class decorator wrapping every coroutine method (including static ones) in a span."""
+    for attr_name, attr in list(vars(cls).items()):
+        if attr_name.startswith("__"):
+            continue
+        span_name = f"{cls.__name__}.{attr_name}"
+        if isinstance(attr, staticmethod) and inspect.iscoroutinefunction(attr.__func__):
+            setattr(cls, attr_name, staticmethod(traced(span_name)(attr.__func__)))
+        elif inspect.iscoroutinefunction(attr):
+            setattr(cls, attr_name, traced(span_name)(attr))
+    return cls
+
+
+def redis_span(command: str):
+    """Context manager for a Redis client span (a no-op when not recording)."""
+    if not _recording():
+        return nullcontext()
+    return tracer.start_as_current_span(
+        f"redis {command}",
+        kind=SpanKind.CLIENT,
+        attributes={"db.system": "redis", "db.operation.name": command},
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not _recording():
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    context._trace_span = tracer.start_span(
+        f"db {operation}",
+        kind=SpanKind.CLIENT,
+        attributes={
+            "db.system": conn.dialect.name,
+            "db.operation.name": operation,
+            "db.query.text": statement[:STATEMENT_ATTRIBUTE_CHARS],
+            "db.executemany": executemany,
+        },
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        if cursor.description is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.response.returned_rows", cursor.rowcount)
+        span.end()
+        context._trace_span = None
+
+
+def _handle_error(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()
+        exception_context.execution_context._trace_span = None
+
+
+def install_tracing_hooks(engine):
+    """Attach per-statement span hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
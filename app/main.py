@@ -2,15 +2,21 @@
 
 from fastapi import FastAPI
 from app.api.v1 import v1_router
+from app.core.logger import setup_logging
 from app.core.middleware import setup_middlewares
+from app.core.metrics import mark_process_dead, metrics_endpoint
+from app.core.tracing import setup_tracing, shutdown_tracing
 from app.config import settings
 from fastapi.middleware.cors import CORSMiddleware
 
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.encoders import jsonable_encoder
 
-app = FastAPI(title=settings.project_name, debug=settings.debug)
+setup_logging()
+setup_tracing()
+
+app = FastAPI(title=settings.project_name, debug=settings.debug, default_response_class=ORJSONResponse)
 
 
 
@@ -31,6 +37,7 @@ setup_middlewares(app)
 
 # Include routers
 app.include_router(v1_router, prefix="/api/v1")
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 
 @app.exception_handler(RequestValidationError)
@@ -47,4 +54,9 @@ async def validation_exception_handler(request, exc):
 async def startup():
     # Example: Check DB connection or preload models
     # from app.settings import settings
-    print(f"Starting up  {settings.project_name} in {settings.environment} mode...")
\ No newline at end of file
+    print(f"Starting up  {settings.project_name} in {settings.environment} mode...")
+
+@app.on_event("shutdown")
+async def shutdown():
+    mark_process_dead()
+    shutdown_tracing()
@@ -3,3 +3,5 @@ from .offers import Offer
 from .order import Order, OrderItem
 from .product import Category, Subcategory, Product
 from .user import User, Address
+from .outbox import OutboxEvent
+from .idempotency import IdempotencyKey
@@ -0,0 +1,25 @@
+import datetime
+from sqlalchemy import Column, String, DateTime, Integer, LargeBinary, Index
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    SQLAlchemy model for the 'idempotency_keys' table.
+    Fallback store for Idempotency-Key responses while Redis is unavailable
+    (see app.core.idempotency).
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    key = Column(String(400), primary_key=True)  # scope, owner and client key
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is in flight
+    body = Column(LargeBinary, nullable=True)
+    content_type = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=False)
+    lock_token = Column(String(32), nullable=True)  # the request holding the lock
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
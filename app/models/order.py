@@ -1,6 +1,6 @@
 import uuid
 import datetime
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, Boolean, Numeric, ForeignKey
+from sqlalchemy import create_engine, Column, String, DateTime, Integer, Boolean, Numeric, ForeignKey, Index, text
 from sqlalchemy.orm import sessionmaker, relationship
 from app.core.database import Base
 
@@ -13,6 +13,15 @@ class Order(Base):
     Stores order information.
     """
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Order history per user, newest first
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        # Date-range analytics
+        Index("ix_orders_created_at", "created_at"),
+        Index("ix_orders_payment_status_created_at", "payment_status", "created_at"),
+        # Admin order lists filtered by status
+        Index("ix_orders_status_created_at_active", "order_status", "created_at", postgresql_where=text("is_active")),
+    )
 
     order_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey('users.user_id'))
@@ -37,6 +46,10 @@ class OrderItem(Base):
     Stores individual products within an order.
     """
     __tablename__ = 'order_items'
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+        Index("ix_order_items_product_id", "product_id"),
+    )
 
     order_item_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     order_id = Column(String, ForeignKey('orders.order_id'))
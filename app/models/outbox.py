@@ -0,0 +1,28 @@
+import uuid
+import datetime
+from sqlalchemy import Column, String, DateTime, Integer, JSON, Text, Index, text
+from app.core.database import Base
+
+
+class OutboxEvent(Base):
+    """
+    SQLAlchemy model for the 'outbox_events' table.
+    Side-effect events written in the same transaction as the change they
+    describe, and delivered afterwards by the outbox worker.
+    """
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # The worker's claim query: due pending events, oldest first
+        Index("ix_outbox_events_pending", "available_at", postgresql_where=text("status = 'pending'")),
+    )
+
+    event_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    event_type = Column(String(50), nullable=False)  # e.g. 'order.created', 'order.paid'
+    aggregate_id = Column(String, nullable=False)  # e.g. the order_id
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)  # next attempt
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
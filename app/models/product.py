@@ -1,6 +1,6 @@
 import uuid
 import datetime
-from sqlalchemy import Column, String, DateTime, Integer, Boolean, Numeric, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, Boolean, Numeric, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -40,6 +40,9 @@ class Subcategory(Base):
     Stores sub-level product categories.
     """
     __tablename__ = 'subcategories'
+    __table_args__ = (
+        Index("ix_subcategories_category_id", "category_id"),
+    )
 
     subcategory_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     subcategory_name = Column(String(50))
@@ -61,6 +64,10 @@ class Product(Base):
     Stores individual product details.
     """
     __tablename__ = 'products'
+    __table_args__ = (
+        Index("ix_products_category_id", "category_id"),
+        Index("ix_products_subcategory_id", "subcategory_id"),
+    )
 
     product_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     product_name = Column(String(100))
@@ -1,6 +1,6 @@
 import uuid
 import datetime
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, Boolean, Numeric, ForeignKey
+from sqlalchemy import create_engine, Column, String, DateTime, Integer, Boolean, Numeric, ForeignKey, Index
 from sqlalchemy.orm import sessionmaker, relationship
 from app.core.database import Base
 
@@ -43,6 +43,9 @@ class Address(Base):
     Stores a user's delivery addresses.
     """
     __tablename__ = 'addresses'
+    __table_args__ = (
+        Index("ix_addresses_user_id", "user_id"),
+    )
 
     address_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey('users.user_id'))
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import Optional, List
+from typing_extensions import TypedDict
 from datetime import datetime
 from decimal import Decimal
 
@@ -40,4 +41,30 @@ class CartItemResponse(BaseModel):
 class CartSummary(BaseModel):
     items: List[CartItemResponse]
     total_items: int
-    total_amount: Decimal
\ No newline at end of file
+    total_amount: Decimal
+
+class ProductInfoRow(TypedDict):
+    product_id: str
+    product_name: str
+    price: Decimal
+    image_url: Optional[str]
+    is_active: bool
+
+class CartItemRow(TypedDict):
+    """CartItemResponse as a plain dict, built straight from a column select."""
+    cart_item_id: str
+    user_id: Optional[str]
+    guest_id: Optional[str]
+    product_id: str
+    quantity: int
+    added_at: datetime
+    updated_at: datetime
+    product: ProductInfoRow
+    subtotal: Decimal
+
+class CartSummaryRow(TypedDict):
+    items: List[CartItemRow]
+    total_items: int
+    total_amount: Decimal
+
+cart_summary_adapter = TypeAdapter(CartSummaryRow)
@@ -1,6 +1,7 @@
 import uuid
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional, List
+from typing_extensions import TypedDict
 from datetime import datetime
 
 
@@ -109,5 +110,24 @@ class ProductOut(BaseModel):
     description: Optional[str] = None
 
     class Config:
-        orm_mode = True 
-        
+        orm_mode = True
+
+
+# ---------- Category tree snapshot ----------
+
+class SubcategoryTreeNode(TypedDict):
+    subcategory_id: str
+    subcategory_name: str
+    product_count: int
+
+
+class CategoryTreeNode(TypedDict):
+    category_id: str
+    category_name: str
+    image_url: Optional[str]
+    sort_order: int
+    product_count: int
+    subcategories: List[SubcategoryTreeNode]
+
+
+category_tree_adapter = TypeAdapter(List[CategoryTreeNode])
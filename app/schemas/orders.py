@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, TypeAdapter, validator
 from typing import Optional, List
+from typing_extensions import TypedDict
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
@@ -82,6 +83,20 @@ class OrderSummary(BaseModel):
     class Config:
         from_attributes = True
 
+
+class OrderSummaryRow(TypedDict):
+    """OrderSummary as a plain dict, built straight from a column select."""
+    order_id: str
+    total_amount: Decimal
+    order_status: str
+    payment_status: str
+    created_at: datetime
+    items_count: int
+
+
+order_summary_list_adapter = TypeAdapter(List[OrderSummaryRow])
+order_response_adapter = TypeAdapter(OrderResponse)
+
 from app.schemas.address import AddressResponse
 
 class OrderTrackingResponse(BaseModel):
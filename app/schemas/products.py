@@ -1,6 +1,7 @@
 from typing import List, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from typing_extensions import TypedDict
 
 from app.schemas.base import SchemaBase
 
@@ -19,6 +20,22 @@ class ProductBase(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ProductRow(TypedDict):
+    """ProductBase as a plain dict, built straight from a column select."""
+    product_id: str
+    product_name: str
+    price: float
+    description: str
+    image_url: Optional[str]
+    category_id: str
+    category_name: Optional[str]
+    subcategory_id: Optional[str]
+    subcategory_name: Optional[str]
+
+
+product_list_adapter = TypeAdapter(List[ProductRow])
+
+
 class ProductCreate(BaseModel):
     product_name: str
     description: str
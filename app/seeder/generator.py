@@ -0,0 +1,367 @@
+"""
+Synthetic data generator for performance work.
+
+Creates a configurable volume of categories, subcategories, products, users,
+addresses, carts, orders (with items) and offers. Rows are built in chunks and
+written with PostgreSQL COPY through asyncpg, so millions of rows load in
+minutes instead of hours.
+
+Usage:
+    python -m app.seeder.generator --products 100000 --users 50000 --orders 200000
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal
+from app.core.security import get_password_hash
+from app.models.cart import CartItem
+from app.models.offers import Offer
+from app.models.order import Order, OrderItem
+from app.models.product import Category, Product, Subcategory
+from app.models.user import Address, User
+
+
+ORDER_STATUSES = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
+PAYMENT_STATUSES = {
+    "Pending": "Pending",
+    "Processing": "Paid",
+    "Shipped": "Paid",
+    "Delivered": "Paid",
+    "Cancelled": "Refunded",
+}
+PAYMENT_METHODS = ["Cash on Delivery", "Credit Card", "UPI"]
+CITIES = ["Kochi", "Bengaluru", "Chennai", "Mumbai", "Delhi", "Hyderabad", "Pune", "Kolkata"]
+WORDS = [
+    "Classic", "Organic", "Premium", "Smart", "Wireless", "Fresh", "Deluxe", "Eco",
+    "Compact", "Ultra", "Pro", "Mini", "Family", "Travel", "Daily", "Festive",
+]
+
+
+class GeneratorConfig:
+    """Row counts and knobs for a generation run."""
+
+    def __init__(
+        self,
+        categories: int = 20,
+        subcategories_per_category: int = 8,
+        products: int = 10000,
+        users: int = 10000,
+        addresses_per_user: int = 2,
+        cart_fraction: float = 0.3,
+        max_cart_items: int = 5,
+        orders: int = 50000,
+        max_items_per_order: int = 5,
+        offers: int = 500,
+        days: int = 365,
+        chunk_size: int = 10000,
+        seed: int = 42,
+        admin_username: Optional[str] = None,
+        admin_password: Optional[str] = None,
+    ):
+        self.categories = categories
+        self.subcategories_per_category = subcategories_per_category
+        self.products = products
+        self.users = users
+        self.addresses_per_user = addresses_per_user
+        self.cart_fraction = cart_fraction
+        self.max_cart_items = max_cart_items
+        self.orders = orders
+        self.max_items_per_order = max_items_per_order
+        self.offers = offers
+        self.days = days
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.admin_username = admin_username
+        self.admin_password = admin_password
+
+
+def _columns(model) -> List[str]:
+    return [column.name for column in model.__table__.columns]
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterable[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _copy_rows(db: AsyncSession, model, rows: Iterable[dict], chunk_size: int) -> int:
+    """COPY rows into the model's table in chunks. Returns the number of rows written."""
+    columns = _columns(model)
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    driver = raw.driver_connection
+
+    written = 0
+    for chunk in _chunks(rows, chunk_size):
+        records = [tuple(row.get(column) for column in columns) for row in chunk]
+        await driver.copy_records_to_table(model.__tablename__, records=records, columns=columns)
+        written += len(records)
+    return written
+
+
+class SyntheticDataGenerator:
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.now = datetime.datetime.utcnow()
+        self.category_ids: List[str] = []
+        self.subcategories: List[Dict[str, str]] = []
+        self.products: List[Dict[str, object]] = []
+        self.user_ids: List[str] = []
+        self.user_address: Dict[str, str] = {}
+
+    def _timestamp(self) -> datetime.datetime:
+        return self.now - datetime.timedelta(seconds=self.random.randint(0, self.config.days * 86400))
+
+    def _category_rows(self) -> Iterable[dict]:
+        for index in range(self.config.categories):
+            category_id = str(uuid.uuid4())
+            self.category_ids.append(category_id)
+            created = self._timestamp()
+            yield {
+                "category_id": category_id,
+                "category_name": f"Category {index + 1}",
+                "description": f"Synthetic category {index + 1}",
+                "image_url": None,
+                "is_active": True,
+                "sort_order": index,
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    def _subcategory_rows(self) -> Iterable[dict]:
+        for category_id in self.category_ids:
+            for index in range(self.config.subcategories_per_category):
+                subcategory_id = str(uuid.uuid4())
+                self.subcategories.append({"subcategory_id": subcategory_id, "category_id": category_id})
+                created = self._timestamp()
+                yield {
+                    "subcategory_id": subcategory_id,
+                    "subcategory_name": f"Subcategory {len(self.subcategories)}",
+                    "category_id": category_id,
+                    "is_active": True,
+                    "created_at": created,
+                    "updated_at": created,
+                }
+
+    def _product_rows(self) -> Iterable[dict]:
+        for index in range(self.config.products):
+            product_id = str(uuid.uuid4())
+            subcategory = self.random.choice(self.subcategories)
+            price = Decimal(self.random.randint(100, 500000)) / 100
+            self.products.append({"product_id": product_id, "price": price})
+            created = self._timestamp()
+            name = f"{self.random.choice(WORDS)} {self.random.choice(WORDS)} Item {index + 1}"
+            yield {
+                "product_id": product_id,
+                "product_name": name[:100],
+                "description": f"Synthetic product {index + 1}.",
+                "price": price,
+                "image_url": None,
+                "stock_quantity": self.random.randint(0, 1000),
+                "category_id": subcategory["category_id"],
+                "subcategory_id": subcategory["subcategory_id"],
+                "is_active": self.random.random() > 0.05,
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    def _user_rows(self) -> Iterable[dict]:
+        for index in range(self.config.users):
+            user_id = str(uuid.uuid4())
+            self.user_ids.append(user_id)
+            created = self._timestamp()
+            yield {
+                "user_id": user_id,
+                "role": "user",
+                "is_active": True,
+                "created_at": created,
+                "updated_at": created,
+                "whatsapp_id": None,
+                "phone_number": f"+9199{index:08d}",
+                "email": f"user{index}@example.com",
+                "username": None,
+                "password_hash": None,
+            }
+
+    def _address_rows(self) -> Iterable[dict]:
+        for user_id in self.user_ids:
+            for index in range(self.config.addresses_per_user):
+                address_id = str(uuid.uuid4())
+                if index == 0:
+                    self.user_address[user_id] = address_id
+                created = self._timestamp()
+                yield {
+                    "address_id": address_id,
+                    "user_id": user_id,
+                    "street_address": f"{self.random.randint(1, 999)} Main Road",
+                    "city": self.random.choice(CITIES),
+                    "state": "State",
+                    "postal_code": f"{self.random.randint(100000, 999999)}",
+                    "country": "India",
+                    "is_default": index == 0,
+                    "is_active": True,
+                    "created_at": created,
+                    "updated_at": created,
+                }
+
+    def _cart_rows(self) -> Iterable[dict]:
+        for user_id in self.user_ids:
+            if self.random.random() >= self.config.cart_fraction:
+                continue
+            count = self.random.randint(1, self.config.max_cart_items)
+            for product in self.random.sample(self.products, min(count, len(self.products))):
+                added = self._timestamp()
+                yield {
+                    "cart_item_id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "guest_id": None,
+                    "product_id": product["product_id"],
+                    "quantity": self.random.randint(1, 5),
+                    "added_at": added,
+                    "updated_at": added,
+                    "is_active": True,
+                }
+
+    def _order_rows(self, order_items: List[dict]) -> Iterable[dict]:
+        """Yield order rows and append their items to order_items as a side effect."""
+        for _ in range(self.config.orders):
+            order_id = str(uuid.uuid4())
+            user_id = self.random.choice(self.user_ids)
+            created = self._timestamp()
+            status = self.random.choice(ORDER_STATUSES)
+            count = self.random.randint(1, self.config.max_items_per_order)
+            total = Decimal("0.00")
+            for product in self.random.sample(self.products, min(count, len(self.products))):
+                quantity = self.random.randint(1, 4)
+                total += product["price"] * quantity
+                order_items.append({
+                    "order_item_id": str(uuid.uuid4()),
+                    "order_id": order_id,
+                    "product_id": product["product_id"],
+                    "quantity": quantity,
+                    "price_at_purchase": product["price"],
+                    "is_active": True,
+                    "created_at": created,
+                    "updated_at": created,
+                })
+            yield {
+                "order_id": order_id,
+                "user_id": user_id,
+                "address_id": self.user_address.get(user_id),
+                "total_amount": total,
+                "order_status": status,
+                "payment_status": PAYMENT_STATUSES[status],
+                "payment_method": self.random.choice(PAYMENT_METHODS),
+                "is_active": True,
+                "tracking_token": str(uuid.uuid4()),
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    def _offer_rows(self) -> Iterable[dict]:
+        for index in range(self.config.offers):
+            start = self._timestamp()
+            on_product = self.random.random() < 0.5
+            yield {
+                "offer_id": str(uuid.uuid4()),
+                "offer_name": f"Offer {index + 1}",
+                "discount_type": self.random.choice(["percentage", "fixed"]),
+                "discount_value": Decimal(self.random.randint(100, 5000)) / 100,
+                "start_date": start,
+                "end_date": start + datetime.timedelta(days=self.random.randint(1, 60)),
+                "product_id": self.random.choice(self.products)["product_id"] if on_product else None,
+                "subcategory_id": None if on_product else self.random.choice(self.subcategories)["subcategory_id"],
+                "is_active": True,
+                "created_at": start,
+                "updated_at": start,
+            }
+
+    async def _orders(self, db: AsyncSession) -> Dict[str, int]:
+        chunk_size = self.config.chunk_size
+        orders_written = 0
+        items_written = 0
+        order_items: List[dict] = []
+        for chunk in _chunks(self._order_rows(order_items), chunk_size):
+            orders_written += await _copy_rows(db, Order, chunk, chunk_size)
+            items_written += await _copy_rows(db, OrderItem, order_items, chunk_size)
+            order_items.clear()
+        return {"orders": orders_written, "order_items": items_written}
+
+    async def run(self, db: AsyncSession) -> Dict[str, int]:
+        chunk_size = self.config.chunk_size
+        counts: Dict[str, int] = {}
+
+        counts["categories"] = await _copy_rows(db, Category, self._category_rows(), chunk_size)
+        counts["subcategories"] = await _copy_rows(db, Subcategory, self._subcategory_rows(), chunk_size)
+        counts["products"] = await _copy_rows(db, Product, self._product_rows(), chunk_size)
+        counts["users"] = await _copy_rows(db, User, self._user_rows(), chunk_size)
+        counts["addresses"] = await _copy_rows(db, Address, self._address_rows(), chunk_size)
+        counts["cart_items"] = await _copy_rows(db, CartItem, self._cart_rows(), chunk_size)
+        counts.update(await self._orders(db))
+        counts["offers"] = await _copy_rows(db, Offer, self._offer_rows(), chunk_size)
+
+        if self.config.admin_username and self.config.admin_password:
+            db.add(User(
+                role="admin",
+                username=self.config.admin_username,
+                password_hash=get_password_hash(self.config.admin_password),
+                is_active=True
+            ))
+            counts["admins"] = 1
+
+        await db.commit()
+        return counts
+
+
+async def generate_synthetic_data(db: AsyncSession, config: Optional[GeneratorConfig] = None) -> Dict[str, int]:
+    """
+    Populate the database with synthetic data and return per-table row counts.
+    Everything is written in a single transaction.
+    """
+    generator = SyntheticDataGenerator(config or GeneratorConfig())
+    return await generator.run(db)
+
+
+def _parse_args(argv: Optional[Sequence[str]] = None) -> GeneratorConfig:
+    defaults = GeneratorConfig()
+    parser = argparse.ArgumentParser(description="Generate synthetic Tap2Cart data.")
+    for name in [
+        "categories", "subcategories_per_category", "products", "users", "addresses_per_user",
+        "max_cart_items", "orders", "max_items_per_order", "offers", "days", "chunk_size", "seed",
+    ]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=getattr(defaults, name))
+    parser.add_argument("--cart-fraction", type=float, default=defaults.cart_fraction)
+    parser.add_argument("--admin-username", default=None)
+    parser.add_argument("--admin-password", default=None)
+    return GeneratorConfig(**vars(parser.parse_args(argv)))
+
+
+async def _main(config: GeneratorConfig) -> None:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        counts = await generate_synthetic_data(session, config)
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    for table, count in counts.items():
+        print(f"{table:>15}: {count}")
+    print(f"Inserted {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(_parse_args()))
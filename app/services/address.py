@@ -4,8 +4,10 @@ from app.models.user import Address
 from app.schemas.address import AddressCreate, AddressUpdate
 from typing import List, Optional
 import datetime
+from app.core.tracing import traced_service
 
 
+@traced_service
 class AddressService:
     def __init__(self):
         self.model = Address
@@ -64,33 +66,41 @@ class AddressService:
         
         db.add(db_obj)
         await db.commit()
-        await db.refresh(db_obj)
         return db_obj
 
     async def update(
         self, 
         db: AsyncSession, 
         *, 
-        db_obj: Address, 
-        obj_in: AddressUpdate | dict
-    ) -> Address:
-         # Check default flag in update
+        id: str,
+        obj_in: AddressUpdate | dict,
+        user_id: Optional[str] = None
+    ) -> Optional[Address]:
+        """Update an active address with UPDATE ... RETURNING."""
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.model_dump(exclude_unset=True)
-            
+
+        conditions = [Address.address_id == id, Address.is_active == True]
+        if user_id:
+            conditions.append(Address.user_id == user_id)
+
+        # Check default flag in update
         if update_data.get("is_default"):
-            await self._unset_defaults(db, db_obj.user_id)
-            
-        # Inline logic from CRUDBase.update
-        for field in update_data:
-            if hasattr(db_obj, field):
-                setattr(db_obj, field, update_data[field])
-        
-        db.add(db_obj)
+            await self._unset_defaults(db, user_id, except_id=id)
+
+        stmt = (
+            update(Address)
+            .where(*conditions)
+            .values(**{field: value for field, value in update_data.items() if hasattr(Address, field)})
+            .returning(Address)
+        )
+        db_obj = (await db.execute(stmt)).scalar_one_or_none()
+        if not db_obj:
+            await db.rollback()
+            return None
         await db.commit()
-        await db.refresh(db_obj)
         return db_obj
 
     async def remove(
@@ -101,20 +111,33 @@ class AddressService:
         user_id: Optional[str] = None
     ) -> Optional[Address]:
         # Soft delete
-        obj = await self.get(db, id=id, user_id=user_id)
+        conditions = [Address.address_id == id, Address.is_active == True]
+        if user_id:
+            conditions.append(Address.user_id == user_id)
+
+        stmt = (
+            update(Address)
+            .where(*conditions)
+            .values(is_active=False, updated_at=datetime.datetime.utcnow())
+            .returning(Address)
+        )
+        obj = (await db.execute(stmt)).scalar_one_or_none()
         if not obj:
             return None
-        
-        obj.is_active = False
-        obj.updated_at = datetime.datetime.utcnow()
         await db.commit()
         return obj
 
-    async def _unset_defaults(self, db: AsyncSession, user_id: str):
+    async def _unset_defaults(self, db: AsyncSession, user_id: Optional[str], except_id: Optional[str] = None):
         """Unset is_default for all user addresses."""
+        if user_id is None:
+            # Updates without an owner filter: find the owner from the address itself
+            user_id = select(Address.user_id).where(Address.address_id == except_id).scalar_subquery()
         stmt = update(Address).where(
-            Address.user_id == user_id
+            Address.user_id == user_id,
+            Address.is_default == True
         ).values(is_default=False)
+        if except_id:
+            stmt = stmt.where(Address.address_id != except_id)
         await db.execute(stmt)
 
 address_service = AddressService()
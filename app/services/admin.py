@@ -1,5 +1,10 @@
+import asyncio
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, text
+from sqlalchemy import select, func, desc, text, literal, null, union_all
 from sqlalchemy.orm import selectinload
 from app.models.user import User
 from app.models.product import Product
@@ -9,14 +14,23 @@ from app.schemas.admin import (
     DashboardStats, UserSummary, ProductSummary, OrderSummary, 
     RecentActivity, SystemHealth
 )
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from decimal import Decimal
 import datetime
 import psutil
 import time
+from app.config import settings
 from app.core.security import verify_password, create_access_token
 from app.core.redis import redis_client
+from app.core.database import AnalyticsSessionLocal, AsyncSessionLocal, engine
+from app.core.logger import logger
+from app.core.metrics import record_cache, uptime_seconds
+from app.core.singleflight import flights
+from app.core.tracing import traced_service
+
+OVERVIEW_CACHE_KEY = "admin:overview:{}"
 
+@traced_service
 class AdminService:
 
     @staticmethod
@@ -45,104 +59,75 @@ class AdminService:
     
     @staticmethod
     async def get_dashboard_stats(db: AsyncSession) -> DashboardStats:
-        """Get comprehensive dashboard statistics."""
-        
-        # Total users
-        users_query = select(func.count(User.user_id)).where(
-            User.is_active == True,
-            User.role == 'user'
-        )
-        users_result = await db.execute(users_query)
-        total_users = users_result.scalar() or 0
-        
-        # Total products
-        products_query = select(func.count(Product.product_id)).where(Product.is_active == True)
-        products_result = await db.execute(products_query)
-        total_products = products_result.scalar() or 0
-        
-        # Total orders
-        orders_query = select(func.count(Order.order_id)).where(Order.is_active == True)
-        orders_result = await db.execute(orders_query)
-        total_orders = orders_result.scalar() or 0
-        
-        # Total categories
-        categories_query = select(func.count(Category.category_id)).where(Category.is_active == True)
-        categories_result = await db.execute(categories_query)
-        total_categories = categories_result.scalar() or 0
-        
-        # Total revenue
-        revenue_query = select(func.sum(Order.total_amount)).where(
-            Order.is_active == True,
-            Order.payment_status == 'Paid'
-        )
-        revenue_result = await db.execute(revenue_query)
-        total_revenue = revenue_result.scalar() or Decimal('0.00')
-        
-        # Pending orders
-        pending_query = select(func.count(Order.order_id)).where(
-            Order.is_active == True,
-            Order.order_status == 'Pending'
-        )
-        pending_result = await db.execute(pending_query)
-        pending_orders = pending_result.scalar() or 0
-        
-        # Low stock products (assuming stock_quantity < 10 is low)
-        low_stock_query = select(func.count(Product.product_id)).where(
-            Product.is_active == True,
-            Product.stock_quantity < 10
+        """Get comprehensive dashboard statistics (one statement of scalar subqueries)."""
+        count = lambda column, *where: select(func.count(column)).where(*where).scalar_subquery()
+        query = select(
+            count(User.user_id, User.is_active == True, User.role == 'user').label('total_users'),
+            count(Product.product_id, Product.is_active == True).label('total_products'),
+            count(Order.order_id, Order.is_active == True).label('total_orders'),
+            count(Category.category_id, Category.is_active == True).label('total_categories'),
+            select(func.sum(Order.total_amount)).where(
+                Order.is_active == True,
+                Order.payment_status == 'Paid'
+            ).scalar_subquery().label('total_revenue'),
+            count(Order.order_id, Order.is_active == True, Order.order_status == 'Pending').label('pending_orders'),
+            # Low stock products (assuming stock_quantity < 10 is low)
+            count(Product.product_id, Product.is_active == True, Product.stock_quantity < 10).label('low_stock_products'),
         )
-        low_stock_result = await db.execute(low_stock_query)
-        low_stock_products = low_stock_result.scalar() or 0
+        row = (await db.execute(query)).one()
         
         return DashboardStats(
-            total_users=total_users,
-            total_products=total_products,
-            total_orders=total_orders,
-            total_categories=total_categories,
-            total_revenue=total_revenue,
-            pending_orders=pending_orders,
-            low_stock_products=low_stock_products
+            total_users=row.total_users,
+            total_products=row.total_products,
+            total_orders=row.total_orders,
+            total_categories=row.total_categories,
+            total_revenue=row.total_revenue or Decimal('0.00'),
+            pending_orders=row.pending_orders,
+            low_stock_products=row.low_stock_products
         )
     
     @staticmethod
     async def get_recent_activity(db: AsyncSession, limit: int = 20) -> List[RecentActivity]:
-        """Get recent system activity."""
-        activities = []
-        
-        # Recent orders
-        recent_orders_query = select(Order).where(
+        """Get recent system activity: the newest orders and registrations in one UNION ALL."""
+        recent_orders = select(
+            literal("order").label("activity_type"),
+            Order.order_id.label("related_id"),
+            Order.user_id,
+            Order.created_at,
+            Order.total_amount,
+            null().label("email")
+        ).where(
             Order.is_active == True
-        ).order_by(desc(Order.created_at)).limit(10)
-        recent_orders_result = await db.execute(recent_orders_query)
-        recent_orders = recent_orders_result.scalars().all()
-        
-        for order in recent_orders:
-            activities.append(RecentActivity(
-                activity_type="order",
-                description=f"New order #{order.order_id[:8]} - ${order.total_amount}",
-                timestamp=order.created_at,
-                user_id=order.user_id,
-                related_id=order.order_id
-            ))
+        ).order_by(desc(Order.created_at)).limit(limit)
         
-        # Recent user registrations
-        recent_users_query = select(User).where(
+        recent_users = select(
+            literal("user_registration"),
+            null(),
+            User.user_id,
+            User.created_at,
+            null(),
+            User.email
+        ).where(
             User.is_active == True
-        ).order_by(desc(User.created_at)).limit(10)
-        recent_users_result = await db.execute(recent_users_query)
-        recent_users = recent_users_result.scalars().all()
+        ).order_by(desc(User.created_at)).limit(limit)
         
-        for user in recent_users:
+        query = union_all(recent_orders, recent_users).order_by(desc("created_at")).limit(limit)
+        result = await db.execute(query)
+        
+        activities = []
+        for row in result.all():
+            if row.activity_type == "order":
+                description = f"New order #{row.related_id[:8]} - ${row.total_amount}"
+            else:
+                description = f"New user registered: {row.email}"
             activities.append(RecentActivity(
-                activity_type="user_registration",
-                description=f"New user registered: {user.email}",
-                timestamp=user.created_at,
-                user_id=user.user_id
+                activity_type=row.activity_type,
+                description=description,
+                timestamp=row.created_at,
+                user_id=row.user_id,
+                related_id=row.related_id
             ))
-        
-        # Sort all activities by timestamp and return limited results
-        activities.sort(key=lambda x: x.timestamp, reverse=True)
-        return activities[:limit]
+        return activities
     
     @staticmethod
     async def get_users_summary(db: AsyncSession, skip: int = 0, limit: int = 50) -> List[UserSummary]:
@@ -176,9 +161,6 @@ class AdminService:
     @staticmethod
     async def get_products_summary(db: AsyncSession, skip: int = 0, limit: int = 50) -> List[ProductSummary]:
         """Get products summary with sales statistics."""
-        # This assumes you have OrderItem model linked to products
-        from models.order import OrderItem
-        
         query = select(
             Product,
             Category.category_name,
@@ -238,6 +220,49 @@ class AdminService:
         
         return orders_summary
     
+    @staticmethod
+    async def stream_orders_export(
+        db: AsyncSession,
+        start_date: Optional[datetime.datetime] = None,
+        end_date: Optional[datetime.datetime] = None,
+        order_status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Stream orders for export in batches of plain row dicts.
+        Uses a server-side cursor (yield_per) so memory stays bounded by
+        batch_size no matter how many orders match the filters.
+        """
+        query = select(
+            Order.order_id,
+            Order.created_at,
+            Order.updated_at,
+            Order.user_id,
+            User.phone_number,
+            User.email,
+            Order.address_id,
+            Order.total_amount,
+            Order.order_status,
+            Order.payment_status,
+            Order.payment_method,
+        ).outerjoin(User, Order.user_id == User.user_id).where(Order.is_active == True)
+
+        if start_date:
+            query = query.where(Order.created_at >= start_date)
+        if end_date:
+            query = query.where(Order.created_at < end_date)
+        if order_status:
+            query = query.where(Order.order_status == order_status)
+        if payment_status:
+            query = query.where(Order.payment_status == payment_status)
+
+        query = query.order_by(Order.created_at, Order.order_id).execution_options(yield_per=batch_size)
+
+        result = await db.stream(query)
+        async for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
     @staticmethod
     async def get_system_health(db: AsyncSession) -> SystemHealth:
         """Get system health information."""
@@ -262,13 +287,120 @@ class AdminService:
         memory = psutil.virtual_memory()
         memory_usage = f"{memory.percent}% ({memory.used // (1024**3)}GB/{memory.total // (1024**3)}GB)"
         
-        # Uptime (simplified - you might want to track this differently)
-        uptime = "System running"
+        # Uptime of this worker process
+        uptime = str(datetime.timedelta(seconds=int(uptime_seconds())))
         
         return SystemHealth(
             database_status=db_status,
             total_tables=total_tables,
-            active_sessions=1,  # Simplified - in real app, track active sessions
+            active_sessions=engine.pool.checkedout(),  # Connections checked out by this worker
             memory_usage=memory_usage,
             uptime=uptime
         )
+
+    @staticmethod
+    async def get_revenue_analytics(db: AsyncSession, days: int = 30) -> dict:
+        """Daily paid revenue for the last `days` days."""
+        end_date = datetime.datetime.utcnow()
+        start_date = end_date - datetime.timedelta(days=days)
+        
+        revenue_query = select(
+            func.date(Order.created_at).label('date'),
+            func.sum(Order.total_amount).label('revenue')
+        ).where(
+            Order.payment_status == 'Paid',
+            Order.created_at >= start_date,
+            Order.created_at <= end_date
+        ).group_by(func.date(Order.created_at)).order_by('date')
+        
+        result = await db.execute(revenue_query)
+        
+        revenue_data = [
+            {"date": str(row.date), "revenue": float(row.revenue)}
+            for row in result.all()
+        ]
+        
+        return {
+            "period_days": days,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "daily_revenue": revenue_data,
+            "total_revenue": sum(item["revenue"] for item in revenue_data)
+        }
+
+    @staticmethod
+    async def get_top_products(db: AsyncSession, limit: int = 10) -> List[dict]:
+        """Best-selling products by quantity sold."""
+        query = select(
+            Product.product_name,
+            Product.price,
+            func.sum(OrderItem.quantity).label('total_sold'),
+            func.sum(OrderItem.quantity * OrderItem.price_at_purchase).label('total_revenue')
+        ).join(OrderItem).group_by(
+            Product.product_id, Product.product_name, Product.price
+        ).order_by(desc('total_sold')).limit(limit)
+        
+        result = await db.execute(query)
+        
+        return [
+            {
+                "product_name": row.product_name,
+                "price": float(row.price),
+                "total_sold": row.total_sold,
+                "total_revenue": float(row.total_revenue)
+            }
+            for row in result.all()
+        ]
+
+    @staticmethod
+    async def get_overview(session_factory=None, health_session_factory=None) -> Dict[str, object]:
+        """
+        Every dashboard panel in one payload. Panels missing from Redis are
+        loaded concurrently, each in its own session (so on its own pooled
+        connection), at most ADMIN_OVERVIEW_CONCURRENCY at a time, and kept
+        for ADMIN_OVERVIEW_CACHE_SECONDS.
+        """
+        session_factory = session_factory or AnalyticsSessionLocal
+        health_session_factory = health_session_factory or AsyncSessionLocal
+        panels = {
+            "dashboard": AdminService.get_dashboard_stats,
+            "activity": AdminService.get_recent_activity,
+            "system_health": AdminService.get_system_health,
+            "revenue": AdminService.get_revenue_analytics,
+            "top_products": AdminService.get_top_products,
+        }
+        keys = [OVERVIEW_CACHE_KEY.format(name) for name in panels]
+        try:
+            cached = dict(zip(panels, await redis_client.mget(keys)))
+            cache_available = True
+        except RedisError:
+            cached, cache_available = {}, False
+
+        semaphore = asyncio.Semaphore(settings.admin_overview_concurrency)
+
+        async def load(name: str) -> bytes:
+            # Health reports on the primary, like /system/health
+            factory = health_session_factory if name == "system_health" else session_factory
+            async with semaphore:
+                async with factory() as db:
+                    return orjson.dumps(jsonable_encoder(await panels[name](db)))
+
+        missing = [name for name in panels if not cached.get(name)]
+        for name in panels:
+            record_cache("admin_overview", name not in missing)
+        # Admins refreshing at the same moment share one load per panel
+        loaded = await asyncio.gather(*(
+            flights.do(f"AdminService.overview.{name}", (OVERVIEW_CACHE_KEY, name), lambda name=name: load(name))
+            for name in missing
+        ))
+        if loaded and cache_available:
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for name, body in zip(missing, loaded):
+                        pipe.set(OVERVIEW_CACHE_KEY.format(name), body, ex=settings.admin_overview_cache_seconds)
+                    await pipe.execute()
+            except RedisError:
+                logger.warning("Could not cache the admin overview")
+
+        bodies = dict(cached, **dict(zip(missing, loaded)))
+        return {name: orjson.loads(bodies[name]) for name in panels}
@@ -1,6 +1,6 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func
+from sqlalchemy import String, delete, exists, func, insert, literal, select, true, union_all, update
 from sqlalchemy.orm import selectinload
 from app.models.cart import CartItem
 from app.models.product import Product
@@ -8,7 +8,10 @@ from app.schemas.cart import CartItemAdd, CartItemUpdate
 from typing import List, Optional, Dict
 from decimal import Decimal
 import datetime
+import uuid
+from app.core.tracing import traced_service
 
+@traced_service
 class CartService:
     def __init__(self):
         self.model = CartItem
@@ -33,6 +36,63 @@ class CartService:
         result = await db.execute(query)
         return result.scalars().all()
     
+    async def get_cart_summary_rows(
+        self,
+        db: AsyncSession,
+        user_id: Optional[str] = None,
+        guest_id: Optional[str] = None
+    ) -> dict:
+        """
+        The cart and its totals as a CartSummaryRow dict, from one column
+        select joined to products instead of hydrating CartItem/Product objects.
+        """
+        query = (
+            select(
+                CartItem.cart_item_id,
+                CartItem.user_id,
+                CartItem.guest_id,
+                CartItem.product_id,
+                CartItem.quantity,
+                CartItem.added_at,
+                CartItem.updated_at,
+                Product.product_name,
+                Product.price,
+                Product.image_url,
+                Product.is_active,
+                (CartItem.quantity * Product.price).label("subtotal"),
+            )
+            .join(Product, Product.product_id == CartItem.product_id)
+            .where(CartItem.is_active == True, self._owner_clause(user_id, guest_id))
+            .order_by(CartItem.added_at.desc())
+        )
+        result = await db.execute(query)
+
+        items = [
+            {
+                "cart_item_id": row.cart_item_id,
+                "user_id": row.user_id,
+                "guest_id": row.guest_id,
+                "product_id": row.product_id,
+                "quantity": row.quantity,
+                "added_at": row.added_at,
+                "updated_at": row.updated_at,
+                "product": {
+                    "product_id": row.product_id,
+                    "product_name": row.product_name,
+                    "price": row.price,
+                    "image_url": row.image_url,
+                    "is_active": row.is_active,
+                },
+                "subtotal": row.subtotal,
+            }
+            for row in result
+        ]
+        return {
+            "items": items,
+            "total_items": sum(item["quantity"] for item in items),
+            "total_amount": Decimal(str(sum(item["subtotal"] for item in items))),
+        }
+
     async def add_item_to_cart(
         self, 
         db: AsyncSession, 
@@ -40,45 +100,71 @@ class CartService:
         cart_data: CartItemAdd, 
         guest_id: Optional[str] = None
     ) -> Optional[CartItem]:
-        
-        query = select(CartItem).options(selectinload(CartItem.product)).where(
-            CartItem.product_id == cart_data.product_id,
-            CartItem.is_active == True
-        )
-        
-        if user_id:
-            query = query.where(CartItem.user_id == user_id)
-        elif guest_id:
-            query = query.where(CartItem.guest_id == guest_id)
-
-        existing_item = (await db.execute(query)).scalar_one_or_none()
-
-        if existing_item:
-            existing_item.quantity += cart_data.quantity
-            existing_item.updated_at = datetime.datetime.utcnow()
-            await db.commit()
-            await db.refresh(existing_item)
-            return existing_item
-            
-    
-        product = await db.get(Product, cart_data.product_id)
-        if not product or not product.is_active:
+        """
+        Add a product to the cart, or increase the quantity of the active line
+        for that product, in a single statement. Returns None when the product
+        does not exist or is inactive.
+        """
+        owner = self._owner_clause(user_id, guest_id)
+        if owner is None:
             return None
 
-        cart_item = CartItem(
-            user_id=user_id,
-            guest_id=guest_id,
-            product_id=cart_data.product_id,
-            quantity=cart_data.quantity
+        now = datetime.datetime.utcnow()
+        cart_items = CartItem.__table__
+        product = (
+            select(
+                Product.product_id,
+                Product.product_name,
+                Product.price,
+                Product.image_url,
+                Product.is_active.label("product_is_active"),
+            )
+            .where(Product.product_id == cart_data.product_id, Product.is_active == True)
+            .cte("product")
         )
-        
-        db.add(cart_item)
-        await db.commit()
-        await db.refresh(cart_item)
-
-        cart_item.product = product
+        updated = (
+            update(cart_items)
+            .where(
+                cart_items.c.product_id == product.c.product_id,
+                cart_items.c.is_active == True,
+                owner,
+            )
+            .values(quantity=cart_items.c.quantity + cart_data.quantity, updated_at=now)
+            .returning(*cart_items.c)
+            .cte("updated")
+        )
+        inserted = (
+            insert(cart_items)
+            .from_select(
+                ["cart_item_id", "user_id", "guest_id", "product_id", "quantity", "added_at", "updated_at", "is_active"],
+                select(
+                    literal(str(uuid.uuid4())),
+                    literal(user_id, String),
+                    literal(guest_id, String),
+                    product.c.product_id,
+                    literal(cart_data.quantity),
+                    literal(now),
+                    literal(now),
+                    literal(True),
+                ).where(~exists(updated.select()))
+            )
+            .returning(*cart_items.c)
+            .cte("inserted")
+        )
+        item = union_all(select(updated), select(inserted)).subquery("item")
+        stmt = select(
+            item,
+            product.c.product_name,
+            product.c.price,
+            product.c.image_url,
+            product.c.product_is_active,
+        ).join_from(item, product, true())
 
-        return cart_item
+        row = (await db.execute(stmt)).mappings().first()
+        await db.commit()
+        if row is None:
+            return None
+        return self._cart_item_from_row(row)
     
     async def get_cart_item(
         self, 
@@ -115,16 +201,34 @@ class CartService:
         user_id: Optional[str] = None, 
         guest_id: Optional[str] = None
     ) -> Optional[CartItem]:
-        cart_item = await self.get_cart_item(db, cart_item_id, user_id, guest_id)
-        if not cart_item:
+        owner = self._owner_clause(user_id, guest_id)
+        if owner is None:
             return None
-        
-        cart_item.quantity = cart_data.quantity
-        cart_item.updated_at = datetime.datetime.utcnow()
-        
+
+        cart_items = CartItem.__table__
+        products = Product.__table__
+        stmt = (
+            update(cart_items)
+            .where(
+                cart_items.c.cart_item_id == cart_item_id,
+                cart_items.c.is_active == True,
+                owner,
+                products.c.product_id == cart_items.c.product_id,
+            )
+            .values(quantity=cart_data.quantity, updated_at=datetime.datetime.utcnow())
+            .returning(
+                *cart_items.c,
+                products.c.product_name,
+                products.c.price,
+                products.c.image_url,
+                products.c.is_active.label("product_is_active"),
+            )
+        )
+        row = (await db.execute(stmt)).mappings().first()
         await db.commit()
-        await db.refresh(cart_item)
-        return cart_item
+        if row is None:
+            return None
+        return self._cart_item_from_row(row)
     
     async def remove_cart_item(
         self, 
@@ -133,15 +237,20 @@ class CartService:
         user_id: Optional[str] = None, 
         guest_id: Optional[str] = None
     ) -> bool:
-        cart_item = await self.get_cart_item(db, cart_item_id, user_id, guest_id)
-        if not cart_item:
+        owner = self._owner_clause(user_id, guest_id)
+        if owner is None:
             return False
-        
-        cart_item.is_active = False
-        cart_item.updated_at = datetime.datetime.utcnow()
-        
+
+        cart_items = CartItem.__table__
+        stmt = (
+            update(cart_items)
+            .where(cart_items.c.cart_item_id == cart_item_id, cart_items.c.is_active == True, owner)
+            .values(is_active=False, updated_at=datetime.datetime.utcnow())
+            .returning(cart_items.c.cart_item_id)
+        )
+        removed = (await db.execute(stmt)).scalar_one_or_none()
         await db.commit()
-        return True
+        return removed is not None
     
     async def calculate_cart_summary(self, cart_items: List[CartItem]) -> dict:
         total_items = sum(item.quantity for item in cart_items)
@@ -166,24 +275,39 @@ class CartService:
         if not product_ids:
             return
 
-        stmt = select(CartItem).where(
-            CartItem.product_id.in_(product_ids),
-            CartItem.is_active == True
-        )
-        
-        if user_id:
-            stmt = stmt.where(CartItem.user_id == user_id)
-        elif guest_id:
-            stmt = stmt.where(CartItem.guest_id == guest_id)
-        else:
+        owner = self._owner_clause(user_id, guest_id)
+        if owner is None:
             return
-        result = await db.execute(stmt)
-        cart_items = result.scalars().all()
 
-        for item in cart_items:
-            item.is_active = False
-            item.updated_at = datetime.datetime.utcnow()
+        cart_items = CartItem.__table__
+        await db.execute(
+            update(cart_items)
+            .where(cart_items.c.product_id.in_(product_ids), cart_items.c.is_active == True, owner)
+            .values(is_active=False, updated_at=datetime.datetime.utcnow())
+        )
         
         # Note: No commit here, as this is part of a larger transaction
 
+    @staticmethod
+    def _owner_clause(user_id: Optional[str], guest_id: Optional[str]):
+        cart_items = CartItem.__table__
+        if user_id:
+            return cart_items.c.user_id == user_id
+        if guest_id:
+            return cart_items.c.guest_id == guest_id
+        return None
+
+    @staticmethod
+    def _cart_item_from_row(row) -> CartItem:
+        """Build a (detached) CartItem and its product from a RETURNING row."""
+        cart_item = CartItem(**{column.key: row[column.key] for column in CartItem.__table__.c})
+        cart_item.product = Product(
+            product_id=row["product_id"],
+            product_name=row["product_name"],
+            price=row["price"],
+            image_url=row["image_url"],
+            is_active=row["product_is_active"],
+        )
+        return cart_item
+
 cart_service = CartService()
\ No newline at end of file
@@ -1,28 +1,35 @@
+import datetime
 import uuid
 from typing import List, Optional
 
-from sqlalchemy import and_, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import lazyload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.http_cache import CATEGORIES, PRODUCTS, bump_catalog_version
+from app.core.singleflight import single_flight
+from app.core.tracing import traced_service
 from app.models.product import Category, Subcategory, Product
 from app.schemas.category import (
-    CategoryCreate, CategoryUpdate,
+    CategoryCreate, CategoryResponse, CategoryUpdate,
     SubcategoryCreate, SubcategoryUpdate
 )
 
 
+@traced_service
 class CategoryService:
 
     @staticmethod
+    @single_flight()
     async def get_all_categories(
         db: AsyncSession,
         skip: int = 0,
         limit: int = 100,
         include_inactive: bool = False
-    ) -> List[Category]:
+    ) -> List[CategoryResponse]:
         """
-        Retrieves all categories with pagination.
+        Retrieves all categories with pagination, as response schemas.
         Eager-loads subcategories to avoid lazy-load IO during serialization.
         """
         stmt = (
@@ -36,7 +43,7 @@ class CategoryService:
         stmt = stmt.order_by(Category.sort_order, Category.category_name).offset(skip).limit(limit)
 
         result = await db.execute(stmt)
-        return result.scalars().unique().all()
+        return [CategoryResponse.model_validate(category) for category in result.scalars().unique()]
 
     @staticmethod
     async def get_category_by_id(db: AsyncSession, category_id: str) -> Optional[Category]:
@@ -57,46 +64,120 @@ class CategoryService:
         """
         Creates a new category.
         """
-        category = Category(**category_data.model_dump())
+        # A new category has no children yet; setting the collections avoids
+        # reloading them for the response.
+        category = Category(**category_data.model_dump(), subcategories=[], products=[])
         db.add(category)
         await db.commit()
-        await db.refresh(category)
-
-        # Eager-load subcategories (avoid MissingGreenlet error)
-        stmt = select(Category).where(Category.category_id == category.category_id)
-        result = await db.execute(stmt)
-        return result.scalars().first()
+        await bump_catalog_version(CATEGORIES)
+        return category
     
     @staticmethod
     async def update_category(db: AsyncSession, category_id: str, category_data: CategoryUpdate) -> Optional[Category]:
         """
-        Updates an existing category.
+        Updates an existing category with UPDATE ... RETURNING, then loads the
+        subcategories and products the response includes.
         """
-        category = await CategoryService.get_category_by_id(db, category_id)
-        if not category:
-            return None
-
-        update_data = category_data.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(category, field, value)
-
+        stmt = (
+            update(Category)
+            .where(Category.category_id == category_id)
+            .values(**category_data.model_dump(exclude_unset=True))
+            .returning(Category)
+            .options(
+                selectinload(Category.subcategories).lazyload("*"),
+                selectinload(Category.products).lazyload("*"),
+            )
+        )
+        category = (await db.execute(stmt)).scalar_one_or_none()
         await db.commit()
-        await db.refresh(category)
+        if category:
+            await bump_catalog_version(CATEGORIES)
         return category
 
     @staticmethod
     async def delete_category(db: AsyncSession, category_id: str) -> bool:
         """
-        Deletes a category by its ID.
+        Deletes a category by its ID. Its subcategories and products are kept
+        and detached (category_id set to NULL) in the same statement, as the
+        ORM delete used to do.
         """
-        category = await CategoryService.get_category_by_id(db, category_id)
-        if not category:
+        # updated_at is set explicitly: two onupdate defaults in one statement
+        # would both compile to the same bind parameter name.
+        now = datetime.datetime.utcnow()
+        detach_subcategories = (
+            update(Subcategory).where(Subcategory.category_id == category_id).values(category_id=None, updated_at=now)
+        ).cte("detached_subcategories")
+        detach_products = (
+            update(Product).where(Product.category_id == category_id).values(category_id=None, updated_at=now)
+        ).cte("detached_products")
+        deleted = await db.execute(
+            delete(Category)
+            .add_cte(detach_subcategories)
+            .add_cte(detach_products)
+            .where(Category.category_id == category_id)
+            .returning(Category.category_id)
+        )
+        if deleted.scalar_one_or_none() is None:
+            await db.rollback()
             return False
-
-        await db.delete(category)
         await db.commit()
+        await bump_catalog_version(CATEGORIES, PRODUCTS)
         return True
 
+    @staticmethod
+    async def get_category_tree(db: AsyncSession) -> List[dict]:
+        """
+        Active categories with their active subcategories and active product
+        counts, as CategoryTreeNode dicts. Two column selects, no ORM objects.
+        """
+        category_counts = (
+            select(Product.category_id, func.count().label("product_count"))
+            .where(Product.is_active == True)
+            .group_by(Product.category_id)
+            .subquery()
+        )
+        subcategory_counts = (
+            select(Product.subcategory_id, func.count().label("product_count"))
+            .where(Product.is_active == True, Product.subcategory_id.isnot(None))
+            .group_by(Product.subcategory_id)
+            .subquery()
+        )
+
+        categories = await db.execute(
+            select(
+                Category.category_id,
+                Category.category_name,
+                Category.image_url,
+                func.coalesce(Category.sort_order, 0).label("sort_order"),
+                func.coalesce(category_counts.c.product_count, 0).label("product_count"),
+            )
+            .outerjoin(category_counts, category_counts.c.category_id == Category.category_id)
+            .where(Category.is_active == True)
+            .order_by(Category.sort_order, Category.category_name)
+        )
+        tree = [{**row, "subcategories": []} for row in categories.mappings()]
+        by_id = {node["category_id"]: node for node in tree}
+
+        subcategories = await db.execute(
+            select(
+                Subcategory.category_id,
+                Subcategory.subcategory_id,
+                Subcategory.subcategory_name,
+                func.coalesce(subcategory_counts.c.product_count, 0).label("product_count"),
+            )
+            .join(Category, Category.category_id == Subcategory.category_id)
+            .outerjoin(subcategory_counts, subcategory_counts.c.subcategory_id == Subcategory.subcategory_id)
+            .where(Subcategory.is_active == True, Category.is_active == True)
+            .order_by(Subcategory.subcategory_name)
+        )
+        for row in subcategories:
+            by_id[row.category_id]["subcategories"].append({
+                "subcategory_id": row.subcategory_id,
+                "subcategory_name": row.subcategory_name,
+                "product_count": row.product_count,
+            })
+        return tree
+
     @staticmethod
     async def get_category_products(
         db: AsyncSession,
@@ -129,6 +210,7 @@ class CategoryService:
         result = await db.execute(stmt)
         return result.scalars().all()
 
+@traced_service
 class SubcategoryService:
 
     @staticmethod
@@ -165,15 +247,15 @@ class SubcategoryService:
         """
         Creates a new subcategory.
         """
-        # Verify parent category exists
-        category = await CategoryService.get_category_by_id(db, subcategory_data.category_id)
-        if not category:
-            return None
-
+        # The foreign key rejects a missing parent category
         subcategory = Subcategory(**subcategory_data.model_dump())
         db.add(subcategory)
-        await db.commit()
-        await db.refresh(subcategory)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
+        await bump_catalog_version(CATEGORIES)
         return subcategory
 
     @staticmethod
@@ -183,38 +265,48 @@ class SubcategoryService:
         subcategory_data: SubcategoryUpdate
     ) -> Optional[Subcategory]:
         """
-        Updates an existing subcategory.
+        Updates an existing subcategory with UPDATE ... RETURNING.
+        Returns None if it does not exist or the new parent category doesn't.
         """
-        subcategory = await SubcategoryService.get_subcategory_by_id(db, subcategory_id)
-        if not subcategory:
+        stmt = (
+            update(Subcategory)
+            .where(Subcategory.subcategory_id == subcategory_id)
+            .values(**subcategory_data.model_dump(exclude_unset=True))
+            .returning(Subcategory)
+            .options(lazyload("*"))
+        )
+        try:
+            subcategory = (await db.execute(stmt)).scalar_one_or_none()
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
             return None
-
-        update_data = subcategory_data.model_dump(exclude_unset=True)
-
-        # Verify parent category exists if being updated
-        if "category_id" in update_data:
-            category = await CategoryService.get_category_by_id(db, update_data["category_id"])
-            if not category:
-                return None
-
-        for field, value in update_data.items():
-            setattr(subcategory, field, value)
-
-        await db.commit()
-        await db.refresh(subcategory)
+        if subcategory:
+            await bump_catalog_version(CATEGORIES)
         return subcategory
 
     @staticmethod
     async def delete_subcategory(db: AsyncSession, subcategory_id: str) -> bool:
         """
-        Deletes a subcategory by its ID.
+        Deletes a subcategory by its ID. Its products are kept and detached
+        (subcategory_id set to NULL) in the same statement.
         """
-        subcategory = await SubcategoryService.get_subcategory_by_id(db, subcategory_id)
-        if not subcategory:
+        detach_products = (
+            update(Product)
+            .where(Product.subcategory_id == subcategory_id)
+            .values(subcategory_id=None, updated_at=datetime.datetime.utcnow())
+        ).cte("detached_products")
+        deleted = await db.execute(
+            delete(Subcategory)
+            .add_cte(detach_products)
+            .where(Subcategory.subcategory_id == subcategory_id)
+            .returning(Subcategory.subcategory_id)
+        )
+        if deleted.scalar_one_or_none() is None:
+            await db.rollback()
             return False
-
-        await db.delete(subcategory)
         await db.commit()
+        await bump_catalog_version(CATEGORIES, PRODUCTS)
         return True
 
     @staticmethod
@@ -0,0 +1,121 @@
+"""
+Prebuilt /category/tree payload.
+
+The tree (categories -> subcategories -> product counts) is rebuilt when the
+product or category catalog version changes (see app.core.http_cache), then
+kept serialized and precompressed in Redis for every worker and in memory
+for this one.
+"""
+import asyncio
+import gzip
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.http_cache import CATEGORIES, PRODUCTS, get_catalog_versions, version_tag
+from app.core.logger import logger
+from app.core.metrics import record_cache
+from app.core.redis import redis_binary_client
+from app.core.responses import accepted_encodings
+from app.core.tracing import traced_service
+from app.schemas.category import category_tree_adapter
+from app.services.category import CategoryService
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+SNAPSHOT_KEY = "catalog:tree:{}"
+SNAPSHOT_TTL_SECONDS = 24 * 3600
+# Server preference when a client accepts several
+PREFERRED_ENCODINGS = ("br", "gzip")
+
+
+@dataclass(frozen=True)
+class TreeSnapshot:
+    version: Optional[str]
+    bodies: Dict[str, bytes]  # keyed by content coding: identity, gzip, br
+
+    def negotiate(self, accept_encoding: Optional[str]) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in PREFERRED_ENCODINGS:
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return "identity"
+
+    def etag(self, encoding: str) -> Optional[str]:
+        # Each coding is a different representation, so each gets its own strong ETag.
+        if self.version is None:
+            return None
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"tree-{self.version}{suffix}"'
+
+
+def build_snapshot(version: Optional[str], tree: list) -> TreeSnapshot:
+    body = category_tree_adapter.dump_json(tree)
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=11)
+    return TreeSnapshot(version=version, bodies=bodies)
+
+
+@traced_service
+class CategoryTreeCache:
+    def __init__(self):
+        self._snapshot: Optional[TreeSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> TreeSnapshot:
+        """
+        The snapshot for the current catalog version: from memory, else
+        Redis, else built from the database (once per worker at a time).
+        """
+        versions = await get_catalog_versions(PRODUCTS, CATEGORIES)
+        if versions is None:
+            # Redis is down: the version is unknown, so nothing can be reused.
+            return build_snapshot(None, await CategoryService.get_category_tree(db))
+
+        version = version_tag(versions)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            record_cache("category_tree_memory", True)
+            return snapshot
+        record_cache("category_tree_memory", False)
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+            snapshot = await self._load(version)
+            record_cache("category_tree_redis", snapshot is not None)
+            if snapshot is None:
+                snapshot = build_snapshot(version, await CategoryService.get_category_tree(db))
+                await self._store(snapshot)
+            self._snapshot = snapshot
+            return snapshot
+
+    async def _load(self, version: str) -> Optional[TreeSnapshot]:
+        try:
+            stored = await redis_binary_client.hgetall(SNAPSHOT_KEY.format(version))
+        except RedisError:
+            return None
+        if b"identity" not in stored:
+            return None
+        return TreeSnapshot(version=version, bodies={key.decode(): value for key, value in stored.items()})
+
+    async def _store(self, snapshot: TreeSnapshot):
+        key = SNAPSHOT_KEY.format(snapshot.version)
+        try:
+            async with redis_binary_client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=snapshot.bodies)
+                pipe.expire(key, SNAPSHOT_TTL_SECONDS)
+                await pipe.execute()
+        except RedisError:
+            logger.warning("Could not store category tree snapshot")
+
+
+category_tree = CategoryTreeCache()
@@ -0,0 +1,181 @@
+"""
+Live order status streams (Server-Sent Events).
+
+Order write paths publish every status change they apply on one Redis
+channel (see app.services.order_tracking). Each worker holds a single
+pub/sub connection on that channel and fans messages out to its local
+streams by order id. An idle stream therefore costs a
+small bounded queue and no Redis or database connection of its own.
+"""
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Set
+
+import orjson
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.logger import logger
+from app.core.metrics import SSE_CONNECTIONS, SSE_EVENTS_DROPPED
+from app.core.redis import redis_client
+from app.services.order_tracking import ORDER_EVENTS_CHANNEL, STATUS_FIELDS, order_tracking, timestamp
+
+# How long a new stream waits for the worker's channel subscription
+SUBSCRIBE_TIMEOUT_SECONDS = 5.0
+RECONNECT_DELAY_SECONDS = 1.0
+# Clients reconnect after this long when a stream drops
+CLIENT_RETRY_MS = 5000
+
+
+class EventsUnavailable(Exception):
+    """Too many streams on this worker, or the channel can't be subscribed."""
+
+
+def status_event(order) -> dict:
+    """The stream payload for an order's current status."""
+    return {
+        "order_id": order.order_id,
+        "order_status": order.order_status,
+        "payment_status": order.payment_status,
+        "updated_at": timestamp(order.updated_at),
+    }
+
+
+def format_event(event: dict) -> bytes:
+    return b"event: status\ndata: " + orjson.dumps(event) + b"\n\n"
+
+
+class Subscription:
+    __slots__ = ("keys", "queue")
+
+    def __init__(self, keys: tuple, size: int):
+        self.keys = keys
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    def push(self, event: dict):
+        if self.queue.full():
+            # Only the latest status matters to a client that fell behind.
+            self.queue.get_nowait()
+            SSE_EVENTS_DROPPED.inc()
+        self.queue.put_nowait(event)
+
+
+class OrderEventHub:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._listener: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    def has_capacity(self) -> bool:
+        return self._count < settings.sse_max_connections
+
+    async def subscribe(self, *keys: str) -> Subscription:
+        """
+        Register a stream for events of the given order ids.
+        Returns once the worker's channel subscription is live, so a status
+        read after this call can't miss a change.
+        """
+        if not self.has_capacity():
+            raise EventsUnavailable("Too many open streams")
+
+        subscription = Subscription(keys, settings.sse_queue_size)
+        for key in keys:
+            self._subscribers.setdefault(key, set()).add(subscription)
+        self._count += 1
+        SSE_CONNECTIONS.inc()
+
+        try:
+            self._ensure_listener()
+            await asyncio.wait_for(self._ready.wait(), SUBSCRIBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.unsubscribe(subscription)
+            raise EventsUnavailable("Order events channel unavailable")
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for key in subscription.keys:
+            subscribers = self._subscribers.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[key]
+        self._count -= 1
+        SSE_CONNECTIONS.dec()
+        if self._count == 0 and self._listener is not None:
+            # Nobody is listening: give the pub/sub connection back.
+            self._listener.cancel()
+            self._listener = None
+            self._ready = asyncio.Event()
+
+    async def stream(self, current: dict, tracking_token: Optional[str]) -> AsyncIterator[bytes]:
+        """
+        SSE frames for one order: its current status, then every newer one,
+        with heartbeats while idle. `current` was read before subscribing, so
+        the published status is checked again once the subscription is live.
+        """
+        yield f"retry: {CLIENT_RETRY_MS}\n\n".encode()
+        try:
+            subscription = await self.subscribe(current["order_id"])
+        except EventsUnavailable:
+            # The client reconnects after `retry`.
+            return
+
+        try:
+            published = await order_tracking.get_status(tracking_token)
+            if published and published["updated_at"] > current["updated_at"]:
+                current = {"order_id": current["order_id"], **published}
+            yield format_event(current)
+            last_update = current["updated_at"]
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.sse_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                # The current status may already include events that were queued meanwhile.
+                if event["updated_at"] <= last_update:
+                    continue
+                last_update = event["updated_at"]
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def dispatch(self, message: bytes):
+        event = orjson.loads(message)
+        payload = {"order_id": event["order_id"], **{field: event[field] for field in STATUS_FIELDS}}
+        for subscription in self._subscribers.get(event["order_id"], ()):
+            subscription.push(payload)
+
+    def _ensure_listener(self):
+        listener = self._listener
+        if listener is not None and not listener.done() and listener.get_loop() is asyncio.get_running_loop():
+            return
+        self._ready = asyncio.Event()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(ORDER_EVENTS_CHANNEL)
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        self.dispatch(message["data"])
+                    except (ValueError, KeyError):
+                        logger.warning("Ignoring malformed order event")
+            except RedisError:
+                self._ready.clear()
+                logger.warning("Order events subscription lost, reconnecting")
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+
+order_events = OrderEventHub()
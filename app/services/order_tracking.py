@@ -0,0 +1,242 @@
+"""
+Public order tracking served from Redis.
+
+Each tracking token has two keys:
+
+* `order:track:{token}` - the parts of the tracking response that don't
+  change after checkout (items, address, amounts), as JSON. Built from
+  the database on the first poll.
+* `order:track:{token}:status` - a hash of order_status, payment_status and
+  updated_at, rewritten by the order write paths after they commit. Each
+  change that is applied is also published on ORDER_EVENTS_CHANNEL for
+  live streams (see app.services.order_events).
+
+A poll reads both (plus its rate-limit counter) in one pipeline and never
+reaches Postgres once the snapshot exists. Status writes only apply when
+their updated_at is not older than the stored one, so a rebuild from a
+lagging replica can't roll a newer status back.
+"""
+import datetime
+from typing import List, Optional
+
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.logger import logger
+from app.core.metrics import record_cache
+from app.core.redis import redis_client
+from app.core.singleflight import single_flight
+from app.core.tracing import traced_service
+from app.schemas.orders import OrderStatus, OrderTrackingResponse
+
+SNAPSHOT_KEY = "order:track:{}"
+STATUS_KEY = "order:track:{}:status"
+RATE_KEY = "order:track:{}:rate"
+SNAPSHOT_TTL_SECONDS = 30 * 24 * 3600
+# Unknown tokens are remembered briefly so guessing doesn't reach the database
+MISSING_TTL_SECONDS = 60
+STATUS_FIELDS = ("order_status", "payment_status", "updated_at")
+ORDER_EVENTS_CHANNEL = "order:events"
+
+# KEYS[1] status hash; ARGV order_status, payment_status, updated_at, ttl,
+# then optionally a channel and message to publish once applied.
+# ISO timestamps compare correctly as strings.
+SET_STATUS_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'updated_at')
+if current and current > ARGV[3] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'order_status', ARGV[1], 'payment_status', ARGV[2], 'updated_at', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if ARGV[5] then
+    redis.call('PUBLISH', ARGV[5], ARGV[6])
+end
+return 1
+"""
+
+
+class TrackingRateLimited(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Too many tracking requests")
+        self.retry_after = retry_after
+
+
+def delivery_steps(order_status: str, created_at) -> List[dict]:
+    return [
+        {"status": "Placed", "completed": True, "date": created_at},
+        {"status": "Processing", "completed": order_status in ["Processing", "Shipped", "Delivered"], "date": None},
+        {"status": "Shipped", "completed": order_status in ["Shipped", "Delivered"], "date": None},
+        {"status": "Delivered", "completed": order_status == OrderStatus.DELIVERED.value, "date": None},
+    ]
+
+
+def timestamp(value: datetime.datetime) -> str:
+    return value.isoformat(timespec="microseconds")
+
+
+def render(snapshot: dict, status: dict) -> bytes:
+    """The OrderTrackingResponse body for a snapshot and its current status."""
+    body = dict(snapshot, **status)
+    body["delivery_steps"] = delivery_steps(status["order_status"], snapshot["created_at"])
+    return orjson.dumps(body)
+
+
+@traced_service
+class OrderTrackingCache:
+    async def get(self, db: AsyncSession, tracking_token: str) -> Optional[bytes]:
+        """
+        Tracking response body for a token, or None if there's no such order.
+        Raises TrackingRateLimited once the token has been polled more than
+        TRACKING_RATE_LIMIT times in the current window.
+        """
+        rate_key = RATE_KEY.format(tracking_token)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(rate_key, 0, ex=settings.tracking_rate_window_seconds, nx=True)
+                pipe.incr(rate_key)
+                pipe.get(SNAPSHOT_KEY.format(tracking_token))
+                pipe.hgetall(STATUS_KEY.format(tracking_token))
+                _, polls, snapshot, status = await pipe.execute()
+        except RedisError:
+            logger.warning("Order tracking cache unavailable, reading from the database")
+            return await self._build(db, tracking_token, store=False)
+
+        if polls > settings.tracking_rate_limit:
+            ttl = await self._ttl(rate_key)
+            raise TrackingRateLimited(retry_after=max(ttl, 1))
+
+        has_status = set(STATUS_FIELDS) <= status.keys()
+        if snapshot == "" and not has_status:
+            record_cache("order_tracking", True)
+            return None
+        # A status without a snapshot (or over a "missing" marker) means the
+        # order exists but hasn't been tracked yet, or a replica lagged.
+        hit = bool(snapshot) and has_status
+        record_cache("order_tracking", hit)
+        if not hit:
+            return await self._build(db, tracking_token, store=True, published=status)
+        return render(orjson.loads(snapshot), {field: status[field] for field in STATUS_FIELDS})
+
+    async def set_status(
+        self,
+        order_id: str,
+        tracking_token: Optional[str],
+        order_status: str,
+        payment_status: str,
+        updated_at: datetime.datetime
+    ):
+        """Publish an order's new status to trackers and live streams. Call after commit."""
+        if not tracking_token:
+            return
+        event = {
+            "order_id": order_id,
+            "tracking_token": tracking_token,
+            "order_status": order_status,
+            "payment_status": payment_status,
+            "updated_at": timestamp(updated_at),
+        }
+        try:
+            await self._set_status(
+                tracking_token, order_status, payment_status, event["updated_at"],
+                ORDER_EVENTS_CHANNEL, orjson.dumps(event),
+            )
+        except RedisError:
+            logger.warning(f"Could not update tracking status for {tracking_token}")
+
+    async def get_status(self, tracking_token: Optional[str]) -> Optional[dict]:
+        """The last published status of an order, if Redis has one."""
+        if not tracking_token:
+            return None
+        try:
+            status = await redis_client.hgetall(STATUS_KEY.format(tracking_token))
+        except RedisError:
+            return None
+        if not set(STATUS_FIELDS) <= status.keys():
+            return None
+        return {field: status[field] for field in STATUS_FIELDS}
+
+    async def invalidate(self, tracking_token: Optional[str]):
+        """Drop the snapshot after a change to the order's static parts (e.g. its address)."""
+        if not tracking_token:
+            return
+        try:
+            await redis_client.delete(SNAPSHOT_KEY.format(tracking_token))
+        except RedisError:
+            logger.warning(f"Could not invalidate tracking snapshot for {tracking_token}")
+
+    async def _build(
+        self,
+        db: AsyncSession,
+        tracking_token: str,
+        store: bool,
+        published: Optional[dict] = None
+    ) -> Optional[bytes]:
+        loaded = await self._load(db, tracking_token, store)
+        if loaded is None:
+            return None
+        snapshot, status = loaded
+        if published and set(STATUS_FIELDS) <= published.keys() and published["updated_at"] > status["updated_at"]:
+            # Already newer in Redis than what this (replica) read saw
+            status = {field: published[field] for field in STATUS_FIELDS}
+        return render(snapshot, status)
+
+    @single_flight()
+    async def _load(self, db: AsyncSession, tracking_token: str, store: bool) -> Optional[tuple]:
+        """(snapshot, status) from the database, shared by concurrent first polls of a token."""
+        # Imported here: the order service publishes statuses through this module.
+        from app.services.orders import order_service
+
+        order = await order_service.get_by_tracking_token(db, tracking_token)
+        if order is None:
+            if store:
+                await self._store_missing(tracking_token)
+            return None
+
+        snapshot = OrderTrackingResponse.model_validate(order).model_dump(
+            mode="json", exclude={*STATUS_FIELDS, "delivery_steps"}
+        )
+        status = {
+            "order_status": order.order_status,
+            "payment_status": order.payment_status,
+            "updated_at": timestamp(order.updated_at),
+        }
+        if store:
+            await self._store(tracking_token, snapshot, status)
+        return snapshot, status
+
+    async def _store(self, tracking_token: str, snapshot: dict, status: dict):
+        try:
+            await redis_client.set(SNAPSHOT_KEY.format(tracking_token), orjson.dumps(snapshot), ex=SNAPSHOT_TTL_SECONDS)
+            await self._set_status(tracking_token, status["order_status"], status["payment_status"], status["updated_at"])
+        except RedisError:
+            logger.warning(f"Could not store tracking snapshot for {tracking_token}")
+
+    async def _store_missing(self, tracking_token: str):
+        try:
+            await redis_client.set(SNAPSHOT_KEY.format(tracking_token), "", ex=MISSING_TTL_SECONDS)
+        except RedisError:
+            pass
+
+    async def _set_status(
+        self,
+        tracking_token: str,
+        order_status: str,
+        payment_status: str,
+        updated_at: str,
+        *publish
+    ):
+        await redis_client.eval(
+            SET_STATUS_SCRIPT, 1, STATUS_KEY.format(tracking_token),
+            order_status, payment_status, updated_at, SNAPSHOT_TTL_SECONDS, *publish,
+        )
+
+    async def _ttl(self, key: str) -> int:
+        try:
+            return await redis_client.ttl(key)
+        except RedisError:
+            return settings.tracking_rate_window_seconds
+
+
+order_tracking = OrderTrackingCache()
@@ -3,13 +3,13 @@ import uuid
 from decimal import Decimal
 from typing import List, Optional
 
-from sqlalchemy import and_, desc, select, delete
+from sqlalchemy import and_, desc, func, select, delete, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 
 from decimal import Decimal
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from app.models.user import User
 from app.models.order import Order, OrderItem
 from app.models.cart import CartItem
@@ -22,7 +22,16 @@ from app.schemas.orders import (
     PaymentStatus,
 )
 from app.services.cart import cart_service
+from app.services.order_tracking import order_tracking
+from app.services.outbox import (
+    ORDER_CANCELLED, ORDER_CREATED, ORDER_PAID, ORDER_PAYLOAD_COLUMNS, ORDER_REFUNDED, ORDER_STATUS_CHANGED,
+    order_event, order_event_cte,
+)
+from app.core.http_cache import STOCK, bump_catalog_version
+from app.core.metrics import ORDER_CONFIRMATIONS, ORDERS_CANCELLED, ORDERS_CREATED
+from app.core.tracing import traced_service
 
+@traced_service
 class OrderService:
 
     async def create_order(
@@ -58,14 +67,14 @@ class OrderService:
         product_ids = {item.product_id for item in order_data.items}
         items_map = {item.product_id: item for item in order_data.items}
 
-        # 🔒 Lock products
+        # 🔒 Lock products (columns only, so no relationship loads are triggered)
         stmt = (
-            select(Product)
+            select(Product.product_id, Product.product_name, Product.price, Product.stock_quantity)
             .where(Product.product_id.in_(product_ids))
             .with_for_update()
         )
 
-        products = (await db.execute(stmt)).scalars().all()
+        products = (await db.execute(stmt)).all()
 
         if len(products) != len(product_ids):
             raise ValueError("Some products not found")
@@ -94,6 +103,7 @@ class OrderService:
             )
 
         order = Order(
+            order_id=str(uuid.uuid4()),  # set up front so the outbox payload can carry it
             user_id=user_id,
             address_id=order_data.address_id,
             total_amount=total_amount,
@@ -105,6 +115,7 @@ class OrderService:
         )
 
         db.add(order)
+        db.add(order_event(ORDER_CREATED, order))
 
         # Bulk clear cart
         await db.execute(
@@ -115,12 +126,13 @@ class OrderService:
         )
         
         await db.commit()
-        
-        # Re-fetch order with items to ensure they are loaded for response
-        stmt = select(Order).options(selectinload(Order.items)).where(Order.order_id == order.order_id)
-        result = await db.execute(stmt)
-        order = result.scalar_one()
+        ORDERS_CREATED.inc()
+        await order_tracking.set_status(
+            order.order_id, order.tracking_token, order.order_status, order.payment_status, order.updated_at
+        )
 
+        # Every column is set client-side and `items` was assigned above, so the
+        # order can be returned as is without re-selecting it.
         return order
 
     async def update_order(
@@ -156,7 +168,11 @@ class OrderService:
 
         order.updated_at = datetime.datetime.utcnow()
         await db.commit()
-        await db.refresh(order)
+        if "address_id" in update_data:
+            await order_tracking.invalidate(order.tracking_token)
+        await order_tracking.set_status(
+            order.order_id, order.tracking_token, order.order_status, order.payment_status, order.updated_at
+        )
         return order
 
     async def update_order_status(
@@ -165,26 +181,31 @@ class OrderService:
         order_id: str,
         status_update: OrderStatusUpdate
     ) -> Optional[Order]:
-        stmt = select(Order).where(and_(Order.order_id == order_id, Order.is_active == True))
-        result = await db.execute(stmt)
-        order = result.scalars().first()
-        if not order:
-            return None
-        
+        conditions = [Order.order_id == order_id, Order.is_active == True]
+
         # If Admin cancels order, we must restore stock
-        if status_update.order_status == OrderStatus.CANCELLED and order.order_status != OrderStatus.CANCELLED.value:
-             success = await self.cancel_order(db, order_id, is_admin=True) # Re-use cancel logic
-             if success:
-                 # Fetch revised order
-                 await db.refresh(order)
-                 return order
-             else:
-                 return None
-
-        order.order_status = status_data.order_status.value
-        order.updated_at = datetime.datetime.utcnow()
+        if status_update.order_status == OrderStatus.CANCELLED:
+            if await self.cancel_order(db, order_id, is_admin=True):  # Re-use cancel logic
+                stmt = select(Order).options(selectinload(Order.items)).where(*conditions)
+                return (await db.execute(stmt)).scalar_one_or_none()
+            # Not cancellable: only an order that is already cancelled is "updated"
+            conditions.append(Order.order_status == OrderStatus.CANCELLED.value)
+
+        stmt = (
+            update(Order)
+            .where(*conditions)
+            .values(order_status=status_update.order_status.value, updated_at=datetime.datetime.utcnow())
+            .returning(Order)
+            .options(selectinload(Order.items))
+        )
+        order = (await db.execute(stmt)).scalar_one_or_none()
+        if order is not None and status_update.order_status != OrderStatus.CANCELLED:
+            db.add(order_event(ORDER_STATUS_CHANGED, order))
         await db.commit()
-        await db.refresh(order)
+        if order is not None:
+            await order_tracking.set_status(
+                order.order_id, order.tracking_token, order.order_status, order.payment_status, order.updated_at
+            )
         return order
 
     async def cancel_order(
@@ -194,41 +215,62 @@ class OrderService:
         user_id: Optional[str] = None,
         is_admin: bool = False
     ) -> bool:
-        # 1. Fetch Order and Items (Implicitly starts transaction if not active)
-        query = select(Order).options(
-            selectinload(Order.items).selectinload(OrderItem.product)
-        ).where(and_(Order.order_id == order_id, Order.is_active == True))
-
+        """
+        Cancel an order and restore its stock in one statement: the order
+        UPDATE runs in a CTE and only the items of an order it actually
+        cancelled are added back to products.
+        """
+        orders = Order.__table__
+        products = Product.__table__
+
+        conditions = [
+            orders.c.order_id == order_id,
+            orders.c.is_active == True,
+            orders.c.order_status.notin_([OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value]),
+        ]
         if not is_admin and user_id:
-            query = query.where(Order.user_id == user_id)
-        
-        # Lock order row
-        query = query.with_for_update()
-
-        result = await db.execute(query)
-        order = result.scalars().first()
-
-        if not order:
-            return False
+            conditions.append(orders.c.user_id == user_id)
+
+        now = datetime.datetime.utcnow()
+        cancelled = (
+            update(orders)
+            .where(*conditions)
+            .values(order_status=OrderStatus.CANCELLED.value, updated_at=now)
+            .returning(*(orders.c[column] for column in ORDER_PAYLOAD_COLUMNS))
+            .cte("cancelled")
+        )
+        event = order_event_cte(ORDER_CANCELLED, cancelled, "cancel_event")
+        restock = (
+            self._quantities_needed()
+            .join(cancelled, cancelled.c.order_id == OrderItem.order_id)
+            .subquery("restock")
+        )
+        restocked = (
+            update(products)
+            .where(products.c.product_id == restock.c.product_id)
+            .values(stock_quantity=products.c.stock_quantity + restock.c.quantity)
+            .returning(products.c.product_id)
+            .cte("restocked")
+        )
+        stmt = select(
+            cancelled.c.order_id,
+            cancelled.c.tracking_token,
+            cancelled.c.payment_status,
+            select(func.count()).select_from(restocked).scalar_subquery(),
+            select(func.count()).select_from(event).scalar_subquery(),
+        )
 
-        if order.order_status in [OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value]:
+        cancelled_order = (await db.execute(stmt)).one_or_none()
+        if cancelled_order is None:
             return False
 
-        # 2. Restore Stock
-        # We need to lock products to safely increment
-        for item in order.items:
-             # Reload product with lock to ensure atomic update
-             stmt = select(Product).where(Product.product_id == item.product_id).with_for_update()
-             res = await db.execute(stmt)
-             product = res.scalars().first()
-             if product:
-                 product.stock_quantity += item.quantity
-
-        # 3. Update Status
-        order.order_status = OrderStatus.CANCELLED.value
-        order.updated_at = datetime.datetime.utcnow()
-        
         await db.commit()
+        await bump_catalog_version(STOCK)
+        await order_tracking.set_status(
+            cancelled_order.order_id, cancelled_order.tracking_token,
+            OrderStatus.CANCELLED.value, cancelled_order.payment_status, now
+        )
+        ORDERS_CANCELLED.inc()
         return True
 
     async def get_order_status(
@@ -258,72 +300,214 @@ class OrderService:
     ) -> dict:
         """
         Confirms order payment and deducts stock.
-        Concurrency safe: uses FOR UPDATE locking.
+
+        The happy path is a single statement: the order is marked paid (unless
+        it already is) and stock is deducted only where enough is left. If any
+        product falls short the transaction is rolled back and the reason is
+        looked up afterwards.
         Returns status/message.
         """
+        orders = Order.__table__
+        products = Product.__table__
         try:
-            # 1. Fetch Order
-            stmt = select(Order).options(selectinload(Order.items)).where(Order.order_id == order_id)
-            result = await db.execute(stmt)
-            order = result.scalar_one_or_none()
-            
-            if not order:
-                return {"status": "error", "message": "Order not found"}
-            
-            if order.payment_status == PaymentStatus.PAID.value:
-                 return {"status": "success", "message": "Order already paid"}
-            
-            # 2. Lock Products & Check Stock
-            # Prepare map of product_id -> quantity needed
-            items_map = {}
-            for item in order.items:
-                 if item.product_id in items_map:
-                     items_map[item.product_id] += item.quantity
-                 else:
-                     items_map[item.product_id] = item.quantity
-            
-            product_stmt = select(Product).where(Product.product_id.in_(items_map.keys())).with_for_update()
-            result = await db.execute(product_stmt)
-            products = result.scalars().all()
-            products_dict = {p.product_id: p for p in products}
-            
-            if len(products) != len(items_map):
-                 # Product disappeared?
-                 return {"status": "refund", "message": "Some products unavailable"}
-            
-            for product in products:
-                qty_needed = items_map[product.product_id]
-                if product.stock_quantity < qty_needed:
-                     # Stock insufficient
-                     # In real world: Trigger Refund
-                     order.payment_status = PaymentStatus.REFUNDED.value
-                     order.order_status = OrderStatus.CANCELLED.value
-                     await db.commit()
-                     return {"status": "refund", "message": f"Insufficient stock for {product.product_name}. Refund initiated."}
-                
-                # Deduct Stock
-                product.stock_quantity -= qty_needed
-            
-            # 3. Mark Paid
-            order.payment_status = PaymentStatus.PAID.value
-            order.order_status = OrderStatus.PROCESSING.value # Or Confirmed
-            # order.transaction_id = transaction_id 
-            
+            now = datetime.datetime.utcnow()
+            claimed = (
+                update(orders)
+                .where(
+                    orders.c.order_id == order_id,
+                    orders.c.payment_status.is_distinct_from(PaymentStatus.PAID.value),
+                )
+                .values(
+                    payment_status=PaymentStatus.PAID.value,
+                    order_status=OrderStatus.PROCESSING.value,  # Or Confirmed
+                    updated_at=now,
+                )
+                .returning(*(orders.c[column] for column in ORDER_PAYLOAD_COLUMNS))
+                .cte("claimed")
+            )
+            # Rolled back with the claim if any product is short
+            event = order_event_cte(ORDER_PAID, claimed, "paid_event")
+            needed = (
+                self._quantities_needed()
+                .join(claimed, claimed.c.order_id == OrderItem.order_id)
+                .cte("needed")
+            )
+            deducted = (
+                update(products)
+                .where(
+                    products.c.product_id == needed.c.product_id,
+                    products.c.stock_quantity >= needed.c.quantity,
+                )
+                .values(stock_quantity=products.c.stock_quantity - needed.c.quantity)
+                .returning(products.c.product_id)
+                .cte("deducted")
+            )
+            stmt = select(
+                select(func.count()).select_from(claimed).scalar_subquery().label("claimed"),
+                select(claimed.c.tracking_token).scalar_subquery().label("tracking_token"),
+                select(func.count()).select_from(needed).scalar_subquery().label("needed"),
+                select(func.count()).select_from(deducted).scalar_subquery().label("deducted"),
+                select(func.count()).select_from(event).scalar_subquery().label("events"),
+            )
+            counts = (await db.execute(stmt)).one()
+
+            if counts.claimed == 0:
+                await db.rollback()
+                payment_status = (await db.execute(
+                    select(orders.c.payment_status).where(orders.c.order_id == order_id)
+                )).scalar_one_or_none()
+                if payment_status is None:
+                    return {"status": "error", "message": "Order not found"}
+                return {"status": "success", "message": "Order already paid"}
+
+            if counts.deducted == counts.needed:
+                await db.commit()
+                await bump_catalog_version(STOCK)
+                await order_tracking.set_status(
+                    order_id, counts.tracking_token, OrderStatus.PROCESSING.value, PaymentStatus.PAID.value, now
+                )
+                ORDER_CONFIRMATIONS.labels(result="success").inc()
+                return {"status": "success", "message": "Order confirmed"}
+
+            # Some product is missing or short: undo the claim and deductions
+            await db.rollback()
+            needed = self._quantities_needed().where(OrderItem.order_id == order_id).subquery("needed")
+            stock = (await db.execute(
+                select(needed.c.quantity, products.c.product_id, products.c.product_name, products.c.stock_quantity)
+                .select_from(needed.outerjoin(products, products.c.product_id == needed.c.product_id))
+            )).all()
+
+            if any(row.product_id is None for row in stock):
+                # Product disappeared?
+                ORDER_CONFIRMATIONS.labels(result="refund").inc()
+                return {"status": "refund", "message": "Some products unavailable"}
+
+            short = next((row for row in stock if row.stock_quantity < row.quantity), None)
+            if short is None:
+                # Stock was replenished between the two statements
+                ORDER_CONFIRMATIONS.labels(result="error").inc()
+                return {"status": "error", "message": "Stock changed during confirmation, please retry"}
+
+            # Stock insufficient
+            # In real world: Trigger Refund
+            refunded_at = datetime.datetime.utcnow()
+            refunded = (await db.execute(
+                update(orders)
+                .where(orders.c.order_id == order_id)
+                .values(
+                    payment_status=PaymentStatus.REFUNDED.value,
+                    order_status=OrderStatus.CANCELLED.value,
+                    updated_at=refunded_at,
+                )
+                .returning(*(orders.c[column] for column in ORDER_PAYLOAD_COLUMNS))
+            )).one()
+            db.add(order_event(ORDER_REFUNDED, refunded))
             await db.commit()
-            return {"status": "success", "message": "Order confirmed"}
+            # The claim was rolled back, but its statement already returned the token
+            await order_tracking.set_status(
+                order_id, counts.tracking_token, OrderStatus.CANCELLED.value, PaymentStatus.REFUNDED.value, refunded_at
+            )
+            ORDER_CONFIRMATIONS.labels(result="refund").inc()
+            return {"status": "refund", "message": f"Insufficient stock for {short.product_name}. Refund initiated."}
 
         except Exception as e:
             await db.rollback()
+            ORDER_CONFIRMATIONS.labels(result="error").inc()
             print(f"Confirm order error: {e}")
             return {"status": "error", "message": str(e)}
 
+    @staticmethod
+    def _quantities_needed():
+        """Total quantity per product of order items; callers narrow it to an order."""
+        return (
+            select(OrderItem.product_id, func.sum(OrderItem.quantity).label("quantity"))
+            .group_by(OrderItem.product_id)
+        )
+
+    async def get(
+        self,
+        db: AsyncSession,
+        id: str,
+        user_id: Optional[str] = None,
+        is_admin: bool = False
+    ) -> Optional[Order]:
+        """Get an active order with its items; non-admins only see their own."""
+        stmt = (
+            select(Order)
+            .options(selectinload(Order.items))
+            .where(Order.order_id == id, Order.is_active == True)
+        )
+        if not is_admin:
+            stmt = stmt.where(Order.user_id == user_id)
+
+        return (await db.execute(stmt)).scalar_one_or_none()
+
+    async def get_multi_by_user(
+        self,
+        db: AsyncSession,
+        user_id: Optional[str] = None,
+        is_admin: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[Tuple[datetime.datetime, str]] = None
+    ) -> List[Order]:
+        """
+        One page of order history, newest first, with items.
+        Two queries: the page of orders, then all of their items in one IN load.
+        """
+        stmt = self._history(select(Order), user_id, is_admin, skip, limit, cursor)
+        stmt = stmt.options(selectinload(Order.items))
+        return (await db.execute(stmt)).scalars().all()
+
+    async def get_order_summaries(
+        self,
+        db: AsyncSession,
+        user_id: Optional[str] = None,
+        is_admin: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[Tuple[datetime.datetime, str]] = None
+    ) -> List[dict]:
+        """Same page as get_multi_by_user as OrderSummary rows, items counted in SQL (one query)."""
+        items_count = (
+            select(func.count(OrderItem.order_item_id))
+            .where(OrderItem.order_id == Order.order_id)
+            .scalar_subquery()
+        )
+        stmt = select(
+            Order.order_id,
+            Order.total_amount,
+            Order.order_status,
+            Order.payment_status,
+            Order.created_at,
+            items_count.label("items_count"),
+        )
+        stmt = self._history(stmt, user_id, is_admin, skip, limit, cursor)
+        return [dict(row) for row in (await db.execute(stmt)).mappings()]
+
+    @staticmethod
+    def _history(stmt, user_id, is_admin, skip, limit, cursor):
+        """
+        Narrow an orders select to one page, newest first.
+        A cursor (created_at, order_id of the previous page's last order)
+        takes precedence over `skip`.
+        """
+        stmt = stmt.where(Order.is_active == True)
+        if user_id or not is_admin:
+            stmt = stmt.where(Order.user_id == user_id)
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Order.created_at, Order.order_id) < tuple_(*cursor))
+        else:
+            stmt = stmt.offset(skip)
+        return stmt.order_by(Order.created_at.desc(), Order.order_id.desc()).limit(limit)
+
     async def get_by_tracking_token(
         self,
         db: AsyncSession,
         tracking_token: str
     ) -> Optional[Order]:
         stmt = select(Order).options(
-            selectinload(Order.items).selectinload(OrderItem.product),
+            selectinload(Order.items),
             selectinload(Order.address)
         ).where(Order.tracking_token == tracking_token)
         
@@ -0,0 +1,195 @@
+"""
+Transactional outbox for order side effects.
+
+Write paths add an event to `outbox_events` in the same transaction as the
+change it describes, so an event exists exactly when the change committed.
+The outbox worker (app.workers.outbox) delivers events to the handlers
+registered here, outside any request: it claims due events in batches with
+FOR UPDATE SKIP LOCKED, so several workers never take the same event, and
+retries failures with exponential backoff.
+"""
+import datetime
+import random
+from itertools import chain
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import String, cast, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.logger import logger
+from app.core.metrics import OUTBOX_DELIVERY_SECONDS, OUTBOX_EVENTS, OUTBOX_LAG_SECONDS, OUTBOX_PENDING
+from app.models.outbox import OutboxEvent
+
+ORDER_CREATED = "order.created"
+ORDER_PAID = "order.paid"
+ORDER_REFUNDED = "order.refunded"
+ORDER_CANCELLED = "order.cancelled"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+# Order columns copied into every order event's payload
+ORDER_PAYLOAD_COLUMNS = ("order_id", "user_id", "total_amount", "order_status", "payment_status", "tracking_token")
+
+Handler = Callable[[OutboxEvent], Awaitable[None]]
+_handlers: Dict[str, List[Handler]] = {}
+
+
+def handles(*event_types: str):
+    """Register an async handler for outbox events of the given types."""
+    def register(handler: Handler) -> Handler:
+        for event_type in event_types:
+            _handlers.setdefault(event_type, []).append(handler)
+        return handler
+    return register
+
+
+def handlers_for(event_type: str) -> List[Handler]:
+    return _handlers.get(event_type, [])
+
+
+def order_event(event_type: str, order) -> OutboxEvent:
+    """Outbox row for an order (an Order or a row with ORDER_PAYLOAD_COLUMNS); add it before commit."""
+    payload = {column: getattr(order, column) for column in ORDER_PAYLOAD_COLUMNS}
+    payload["total_amount"] = str(payload["total_amount"])
+    return OutboxEvent(event_type=event_type, aggregate_id=order.order_id, payload=payload)
+
+
+def order_event_cte(event_type: str, source, name: str):
+    """
+    INSERT of one outbox row per order returned by a data-modifying CTE
+    (`source` must return ORDER_PAYLOAD_COLUMNS), for write paths that
+    change orders in a single statement. Reference the returned CTE from
+    the final SELECT so it is rendered.
+    """
+    outbox = OutboxEvent.__table__
+    now = datetime.datetime.utcnow()
+    payload = func.json_build_object(*chain.from_iterable(
+        (literal(column), cast(source.c[column], String) if column == "total_amount" else source.c[column])
+        for column in ORDER_PAYLOAD_COLUMNS
+    ))
+    rows = select(
+        cast(func.gen_random_uuid(), String),
+        literal(event_type),
+        source.c.order_id,
+        payload,
+        literal("pending"),
+        literal(0),
+        literal(now),
+        literal(now),
+    )
+    return (
+        insert(outbox)
+        .from_select(
+            ["event_id", "event_type", "aggregate_id", "payload", "status", "attempts", "available_at", "created_at"],
+            rows,
+        )
+        .returning(outbox.c.event_id)
+        .cte(name)
+    )
+
+
+def retry_delay(attempts: int, base: Optional[float] = None, cap: Optional[float] = None) -> float:
+    """Exponential backoff with jitter; defaults to the OUTBOX_RETRY_* settings."""
+    base = settings.outbox_retry_base_seconds if base is None else base
+    cap = settings.outbox_retry_max_seconds if cap is None else cap
+    return min(base * 2 ** max(attempts - 1, 0), cap) * random.uniform(0.5, 1.0)
+
+
+class OutboxRelay:
+    """Claims due outbox events and runs their handlers."""
+
+    def __init__(
+        self,
+        batch_size: int = settings.outbox_batch_size,
+        lease_seconds: float = settings.outbox_lease_seconds,
+        max_attempts: int = settings.outbox_max_attempts
+    ):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    async def claim(self, db: AsyncSession) -> List[OutboxEvent]:
+        """
+        Lease up to batch_size due events, oldest first, and commit.
+        Rows locked by another worker are skipped; a leased event becomes
+        due again after lease_seconds if it is never finished.
+        """
+        now = datetime.datetime.utcnow()
+        due = (
+            select(OutboxEvent.event_id)
+            .where(OutboxEvent.status == "pending", OutboxEvent.available_at <= now)
+            .order_by(OutboxEvent.available_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(OutboxEvent)
+            .where(OutboxEvent.event_id.in_(due))
+            .values(
+                attempts=OutboxEvent.attempts + 1,
+                available_at=now + datetime.timedelta(seconds=self.lease_seconds),
+            )
+            .returning(OutboxEvent)
+            .execution_options(synchronize_session=False)
+        )
+        events = (await db.execute(stmt)).scalars().all()
+        await db.commit()
+        return sorted(events, key=lambda event: event.created_at)
+
+    async def run_once(self, db: AsyncSession) -> int:
+        """Deliver one batch; returns how many events were claimed."""
+        events = await self.claim(db)
+        delivered = []
+        for event in events:
+            try:
+                for handler in handlers_for(event.event_type):
+                    await handler(event)
+            except Exception as exc:
+                await self._failed(db, event, exc)
+                continue
+            delivered.append(event)
+
+        if delivered:
+            now = datetime.datetime.utcnow()
+            await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.event_id.in_([event.event_id for event in delivered]))
+                .values(status="done", processed_at=now, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+            for event in delivered:
+                OUTBOX_EVENTS.labels(event_type=event.event_type, result="done").inc()
+                OUTBOX_DELIVERY_SECONDS.observe((now - event.created_at).total_seconds())
+        await db.commit()
+        return len(events)
+
+    async def record_lag(self, db: AsyncSession):
+        """Export the backlog size and the age of its oldest event."""
+        count, oldest = (await db.execute(
+            select(func.count(), func.min(OutboxEvent.created_at)).where(OutboxEvent.status == "pending")
+        )).one()
+        await db.commit()
+        OUTBOX_PENDING.set(count)
+        OUTBOX_LAG_SECONDS.set((datetime.datetime.utcnow() - oldest).total_seconds() if oldest else 0)
+
+    async def _failed(self, db: AsyncSession, event: OutboxEvent, exc: Exception):
+        error = f"{type(exc).__name__}: {exc}"[:2000]
+        if event.attempts >= self.max_attempts:
+            values = {"status": "failed", "last_error": error}
+            result = "failed"
+            logger.error(f"Outbox event {event.event_id} ({event.event_type}) failed for good: {error}")
+        else:
+            delay = retry_delay(event.attempts)
+            values = {
+                "available_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=delay),
+                "last_error": error,
+            }
+            result = "retry"
+            logger.warning(f"Outbox event {event.event_id} ({event.event_type}) failed, retrying in {delay:.0f}s: {error}")
+        await db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.event_id == event.event_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        OUTBOX_EVENTS.labels(event_type=event.event_type, result=result).inc()
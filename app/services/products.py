@@ -1,12 +1,17 @@
 from decimal import Decimal
 from typing import List, Optional
-from sqlalchemy import or_, select
+from sqlalchemy import Float, cast, delete, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import lazyload
 
 from app.models.product import Category, Product, Subcategory
 from app.schemas.products import ProductCreate, ProductUpdate
+from app.core.http_cache import PRODUCTS, bump_catalog_version
+from app.core.singleflight import single_flight
+from app.core.tracing import traced_service
 
 
+@traced_service
 class ProductService:
     @staticmethod
     async def get_all_products(
@@ -28,32 +33,98 @@ class ProductService:
         stmt = select(Product).options(
             selectinload(Product.category),
             selectinload(Product.subcategory)
-        ).where(Product.is_active == True)
+        ).where(*ProductService._filters(category, subcategory, search, min_price, max_price))
+        # Note: 'brand' and 'rating' are not supported in your current Product model.
+
+        # Apply pagination
+        offset = (page - 1) * page_size
+        stmt = stmt.offset(offset).limit(page_size)
+
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    @staticmethod
+    async def get_product_rows(
+        db: AsyncSession,
+        category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        search: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        page: int = 1,
+        page_size: int = 10
+    ) -> List[dict]:
+        """
+        Same filtering and pagination as get_all_products, returned as
+        ProductRow dicts from a single column select (no ORM objects).
+        """
+        stmt = (
+            ProductService._row_select()
+            .where(*ProductService._filters(category, subcategory, search, min_price, max_price))
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        )
+        result = await db.execute(stmt)
+        return [dict(row) for row in result.mappings()]
 
+    @staticmethod
+    @single_flight()
+    async def get_product_row(db: AsyncSession, product_id: str) -> Optional[dict]:
+        """
+        A single product as a ProductRow dict (one column select), for the
+        product detail endpoint. Concurrent requests for one product share
+        the query.
+        """
+        result = await db.execute(ProductService._row_select().where(Product.product_id == product_id))
+        row = result.mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _row_select():
+        """Columns of a ProductRow, with the category and subcategory names joined in."""
+        return (
+            select(
+                Product.product_id,
+                Product.product_name,
+                cast(Product.price, Float).label("price"),
+                Product.description,
+                Product.image_url,
+                Product.category_id,
+                Category.category_name,
+                Product.subcategory_id,
+                Subcategory.subcategory_name,
+            )
+            .outerjoin(Category, Category.category_id == Product.category_id)
+            .outerjoin(Subcategory, Subcategory.subcategory_id == Product.subcategory_id)
+        )
+
+    @staticmethod
+    def _filters(
+        category: Optional[str],
+        subcategory: Optional[str],
+        search: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+    ) -> list:
+        """WHERE clauses shared by the product listing queries."""
+        clauses = [Product.is_active == True]
         if category:
-            stmt = stmt.where(Product.category_id == category)
+            clauses.append(Product.category_id == category)
         if subcategory:
-            stmt = stmt.where(Product.subcategory_id == subcategory)
+            clauses.append(Product.subcategory_id == subcategory)
         if search:
             search_pattern = f"%{search}%"
-            stmt = stmt.where(
+            clauses.append(
                 or_(
                     Product.product_name.ilike(search_pattern),
                     Product.description.ilike(search_pattern)
                 )
             )
         if min_price:
-            stmt = stmt.where(Product.price >= min_price)
+            clauses.append(Product.price >= min_price)
         if max_price:
-            stmt = stmt.where(Product.price <= max_price)
-        # Note: 'brand' and 'rating' are not supported in your current Product model.
-
-        # Apply pagination
-        offset = (page - 1) * page_size
-        stmt = stmt.offset(offset).limit(page_size)
-
-        result = await db.execute(stmt)
-        return result.scalars().all()
+            clauses.append(Product.price <= max_price)
+        return clauses
 
     @staticmethod
     async def get_product_by_id(db: AsyncSession, product_id: str) -> Optional[Product]:
@@ -85,27 +156,29 @@ class ProductService:
         )
         db.add(new_product)
         await db.commit()
-        await db.refresh(new_product)
+        await bump_catalog_version(PRODUCTS)
         return new_product
 
     @staticmethod
     async def update_product(db: AsyncSession, product_id: str, product_data: ProductUpdate) -> Optional[Product]:
         """
-        Updates an existing product by its ID.
+        Updates an existing product by its ID with a single UPDATE ... RETURNING.
         """
-        product = await ProductService.get_product_by_id(db, product_id)
-        if not product:
-            return None
-
         update_data = product_data.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            if key == "price":
-                setattr(product, key, Decimal(value))
-            else:
-                setattr(product, key, value)
+        if "price" in update_data and update_data["price"] is not None:
+            update_data["price"] = Decimal(update_data["price"])
 
+        stmt = (
+            update(Product)
+            .where(Product.product_id == product_id)
+            .values(**update_data)
+            .returning(Product)
+            .options(lazyload("*"))
+        )
+        product = (await db.execute(stmt)).scalar_one_or_none()
         await db.commit()
-        await db.refresh(product)
+        if product:
+            await bump_catalog_version(PRODUCTS)
         return product
 
     @staticmethod
@@ -113,10 +186,11 @@ class ProductService:
         """
         Deletes a product by its ID.
         """
-        product = await ProductService.get_product_by_id(db, product_id)
-        if not product:
+        deleted = await db.execute(
+            delete(Product).where(Product.product_id == product_id).returning(Product.product_id)
+        )
+        if deleted.scalar_one_or_none() is None:
             return False
-
-        await db.delete(product)
         await db.commit()
+        await bump_catalog_version(PRODUCTS)
         return True
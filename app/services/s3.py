@@ -4,7 +4,9 @@ from fastapi import UploadFile, HTTPException
 import uuid
 import os
 from app.config import settings
+from app.core.tracing import traced_service
 
+@traced_service
 class S3Service:
     def __init__(self):
         self.s3_client = boto3.client(
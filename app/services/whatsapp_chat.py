@@ -0,0 +1,355 @@
+"""
+Ordering over WhatsApp chat.
+
+Twilio posts each inbound message to the webhook
+(app/api/v1/endpoints/whatsapp.py). The webhook only appends the message to
+a Redis stream and answers. The chat worker (app.workers.whatsapp_chat)
+does everything else.
+
+* `whatsapp:inbound:{n}` - inbound messages, spread over
+  WHATSAPP_INBOUND_PARTITIONS streams by sender, so a conversation always
+  lands in the same stream. Don't change the partition count while
+  messages are queued.
+* `whatsapp:inbound:{n}:lease` - the worker currently reading stream n.
+  Workers renew their leases and share the partitions evenly
+  (`whatsapp:inbound:workers` lists the live ones). Inside a batch,
+  different senders are handled concurrently and each sender's messages
+  are handled in order.
+* `whatsapp:chat:{number}` - the conversation state as JSON: the last menu
+  shown, so that a reply like "2" can be resolved.
+
+Replies are queued through app.services.whatsapp_service.
+"""
+import asyncio
+import math
+import os
+import re
+import socket
+import time
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.core.redis import redis_client
+from app.models.user import Address, User
+from app.schemas.cart import CartItemAdd
+from app.schemas.orders import OrderCreate, OrderItemCreate
+from app.services.cart import cart_service
+from app.services.category import CategoryService
+from app.services.orders import order_service
+from app.services.whatsapp_service import enqueue
+
+INBOUND_KEY = "whatsapp:inbound:{}"
+INBOUND_SEEN_KEY = "whatsapp:inbound:seen:{}"
+LEASE_KEY = "whatsapp:inbound:{}:lease"
+WORKERS_KEY = "whatsapp:inbound:workers"
+CHAT_KEY = "whatsapp:chat:{}"
+GROUP = "chat"
+# Twilio may post the same message again if it didn't get a timely answer
+INBOUND_SEEN_TTL_SECONDS = 24 * 3600
+# Options listed per menu
+MENU_SIZE = 20
+# "3", "3 2", "3 x 2": option number and optional quantity
+SELECTION = re.compile(r"(\d+)(?:\s*[x*]?\s*(\d+))?")
+
+# KEYS[1] seen marker, KEYS[2] stream; ARGV marker ttl, stream maxlen, then
+# the entry's field/value pairs.
+INBOUND_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', unpack(ARGV, 3))
+return 1
+"""
+
+# KEYS[1] lease; ARGV owner, ttl in ms
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS[1] lease; ARGV owner
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def partition_for(sender: str) -> int:
+    return zlib.crc32(sender.encode()) % settings.whatsapp_inbound_partitions
+
+
+async def push_inbound(sid: str, sender: str, body: str, profile_name: str = "") -> bool:
+    """Append an inbound message to its sender's stream; returns False for a redelivery."""
+    added = await redis_client.eval(
+        INBOUND_SCRIPT, 2, INBOUND_SEEN_KEY.format(sid), INBOUND_KEY.format(partition_for(sender)),
+        INBOUND_SEEN_TTL_SECONDS, settings.whatsapp_inbound_stream_maxlen,
+        "sid", sid, "from", sender, "body", body, "profile_name", profile_name,
+    )
+    return bool(added)
+
+
+class InboundConsumer:
+    """Leases a share of the inbound partitions and feeds their messages to `handler`."""
+
+    def __init__(
+        self,
+        handler: Handler,
+        partitions: int = settings.whatsapp_inbound_partitions,
+        batch_size: int = settings.whatsapp_chat_batch_size,
+        lease_seconds: float = settings.whatsapp_chat_lease_seconds,
+        name: Optional[str] = None
+    ):
+        self.handler = handler
+        self.partitions = partitions
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stops: Dict[int, asyncio.Event] = {}
+
+    @property
+    def owned(self) -> List[int]:
+        return sorted(self._tasks)
+
+    async def run(self, stop: asyncio.Event):
+        """Consume until `stop` is set, then finish the batches in flight and release the leases."""
+        try:
+            while not stop.is_set():
+                try:
+                    await self.rebalance()
+                except RedisError as exc:
+                    logger.error(f"WhatsApp chat worker can't reach Redis: {exc}")
+                try:
+                    await asyncio.wait_for(stop.wait(), self.lease_seconds / 3)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Finish the batches in flight and hand every partition back."""
+        await asyncio.gather(*(self._stop(partition, release=True) for partition in self.owned))
+        await redis_client.zrem(WORKERS_KEY, self.name)
+
+    async def rebalance(self):
+        """Renew held leases, then take or hand back partitions to reach this worker's share."""
+        now = time.time()
+        lease_ms = int(self.lease_seconds * 1000)
+        await redis_client.zadd(WORKERS_KEY, {self.name: now})
+        await redis_client.zremrangebyscore(WORKERS_KEY, "-inf", now - self.lease_seconds)
+        share = math.ceil(self.partitions / max(await redis_client.zcard(WORKERS_KEY), 1))
+
+        for partition in self.owned:
+            if self._tasks[partition].done():
+                await self._stop(partition, release=True)
+            elif not await redis_client.eval(RENEW_SCRIPT, 1, LEASE_KEY.format(partition), self.name, lease_ms):
+                # Someone else owns it now: stop at once rather than race them
+                await self._stop(partition, release=False)
+        await asyncio.gather(*(self._stop(partition, release=True) for partition in self.owned[share:]))
+        for partition in range(self.partitions):
+            if len(self._tasks) >= share:
+                break
+            if partition not in self._tasks and await redis_client.set(
+                LEASE_KEY.format(partition), self.name, nx=True, px=lease_ms
+            ):
+                self._stops[partition] = asyncio.Event()
+                self._tasks[partition] = asyncio.create_task(self._consume(partition, self._stops[partition]))
+
+    async def _stop(self, partition: int, release: bool):
+        task = self._tasks.pop(partition)
+        self._stops.pop(partition).set()
+        if not release:
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as exc:
+            logger.error(f"WhatsApp inbound partition {partition} stopped: {exc}")
+        if release:
+            await redis_client.eval(RELEASE_SCRIPT, 1, LEASE_KEY.format(partition), self.name)
+
+    async def _consume(self, partition: int, stop: asyncio.Event):
+        key = INBOUND_KEY.format(partition)
+        try:
+            await redis_client.xgroup_create(key, GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+        # Entries an earlier owner read but never acknowledged come first
+        start = "0-0"
+        while not stop.is_set():
+            claimed = await redis_client.xautoclaim(key, GROUP, self.name, 0, start_id=start, count=self.batch_size)
+            start, entries = claimed[0], claimed[1]
+            await self._process(key, entries)
+            if start == "0-0":
+                break
+
+        while not stop.is_set():
+            response = await redis_client.xreadgroup(GROUP, self.name, {key: ">"}, count=self.batch_size, block=1000)
+            for _, entries in response or []:
+                await self._process(key, entries)
+
+    async def _process(self, key: str, entries: list):
+        conversations: Dict[str, List[dict]] = {}
+        for _, fields in entries:
+            if fields:  # None for entries trimmed from the stream
+                conversations.setdefault(fields["from"], []).append(fields)
+        await asyncio.gather(*(self._converse(messages) for messages in conversations.values()))
+        if entries:
+            await redis_client.xack(key, GROUP, *(entry_id for entry_id, _ in entries))
+
+    async def _converse(self, messages: List[dict]):
+        for message in messages:
+            try:
+                await self.handler(message)
+            except Exception as exc:
+                logger.error(f"WhatsApp message {message['sid']} from {message['from']} failed: {exc}")
+
+
+class WhatsAppChat:
+    """The ordering conversation: category and product menus, cart and checkout."""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def handle(self, message: dict):
+        """InboundConsumer handler: answer one message and queue the reply."""
+        number = message["from"].removeprefix("whatsapp:")
+        state_key = CHAT_KEY.format(number)
+        state = orjson.loads(await redis_client.get(state_key) or "{}")
+        async with self.session_factory() as db:
+            user = await self._user(db, number)
+            reply = await self.respond(db, user, state, message["body"])
+        await redis_client.set(state_key, orjson.dumps(state), ex=settings.whatsapp_chat_state_ttl_seconds)
+        if reply:
+            await enqueue(f"{message['sid']}:reply", number, reply, paced=False)
+
+    async def respond(self, db: AsyncSession, user: User, state: dict, text: str) -> Optional[str]:
+        """The reply to `text`; updates `state` in place."""
+        text = text.strip().lower()
+        if text == "cart":
+            return await self._cart(db, user)
+        if text == "checkout":
+            return await self._checkout(db, user, state)
+        selection = SELECTION.fullmatch(text)
+        if selection and state.get("menu") == "categories":
+            return await self._products(db, state, int(selection[1]))
+        if selection and state.get("menu") == "products":
+            return await self._add(db, user, state, int(selection[1]), int(selection[2] or 1))
+        return await self._categories(db, state)
+
+    @staticmethod
+    async def _user(db: AsyncSession, number: str) -> User:
+        whatsapp_id = number.lstrip("+")
+        user = (await db.execute(
+            select(User).where(or_(User.whatsapp_id == whatsapp_id, User.phone_number == number))
+        )).scalars().first()
+        if user is None:
+            user = User(whatsapp_id=whatsapp_id, phone_number=number, role="user", is_active=True)
+            db.add(user)
+            await db.commit()
+        return user
+
+    @staticmethod
+    def _option(state: dict, choice: int) -> Optional[str]:
+        options = state.get("options", [])
+        return options[choice - 1] if 1 <= choice <= len(options) else None
+
+    async def _categories(self, db: AsyncSession, state: dict) -> str:
+        categories = (await CategoryService.get_categories_dropdown(db))[:MENU_SIZE]
+        if not categories:
+            return "Sorry, nothing is on the menu right now."
+        state.clear()
+        state.update(menu="categories", options=[category.category_id for category in categories])
+        lines = [f"{i}. {category.category_name}" for i, category in enumerate(categories, 1)]
+        return f"Welcome to {settings.restaurant_name}! Reply with a number to see a category:\n" + "\n".join(lines)
+
+    async def _products(self, db: AsyncSession, state: dict, choice: int) -> str:
+        category_id = self._option(state, choice)
+        if category_id is None:
+            return "Please reply with one of the numbers shown."
+        products = await CategoryService.get_category_products(db, category_id, limit=MENU_SIZE)
+        if not products:
+            return "Nothing is available in that category right now. Reply 'menu' to go back."
+        state.update(menu="products", options=[product.product_id for product in products])
+        lines = [f"{i}. {product.product_name} - {product.price}" for i, product in enumerate(products, 1)]
+        return (
+            "Reply with a number to add it to your cart ('2 x 3' adds three), "
+            "'cart' to review your cart or 'menu' to go back:\n" + "\n".join(lines)
+        )
+
+    async def _add(self, db: AsyncSession, user: User, state: dict, choice: int, quantity: int) -> str:
+        product_id = self._option(state, choice)
+        if product_id is None:
+            return "Please reply with one of the numbers shown."
+        if not 1 <= quantity <= 100:
+            return "You can add between 1 and 100 at a time."
+        item = await cart_service.add_item_to_cart(
+            db, user.user_id, CartItemAdd(product_id=product_id, quantity=quantity)
+        )
+        if item is None:
+            return "Sorry, that item is no longer available."
+        return (
+            f"Added {quantity} x {item.product.product_name} (now {item.quantity} in your cart). "
+            "Reply with another number, 'cart' or 'checkout'."
+        )
+
+    async def _cart(self, db: AsyncSession, user: User) -> str:
+        summary = await cart_service.get_cart_summary_rows(db, user.user_id)
+        if not summary["items"]:
+            return "Your cart is empty. Reply 'menu' to browse."
+        lines = [
+            f"{item['quantity']} x {item['product']['product_name']} - {item['subtotal']}"
+            for item in summary["items"]
+        ]
+        return (
+            "Your cart:\n" + "\n".join(lines)
+            + f"\nTotal: {summary['total_amount']}\nReply 'checkout' to place the order."
+        )
+
+    async def _checkout(self, db: AsyncSession, user: User, state: dict) -> Optional[str]:
+        summary = await cart_service.get_cart_summary_rows(db, user.user_id)
+        items = [item for item in summary["items"] if item["product"]["is_active"]]
+        if not items:
+            return "Your cart is empty. Reply 'menu' to browse."
+        address_id = (await db.execute(
+            select(Address.address_id)
+            .where(Address.user_id == user.user_id, Address.is_active == True)
+            .order_by(Address.is_default.desc(), Address.created_at.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+        if address_id is None:
+            return "Please add a delivery address in the app first, then reply 'checkout'."
+
+        order_data = OrderCreate(
+            address_id=address_id,
+            items=[OrderItemCreate(product_id=item["product_id"], quantity=item["quantity"]) for item in items],
+            payment_method=settings.whatsapp_chat_payment_method,
+        )
+        try:
+            await order_service.create_order(db, user.user_id, order_data)
+        except ValueError as exc:
+            await db.rollback()
+            return f"Sorry, we couldn't place your order: {exc}"
+        state.clear()
+        # The order.created notification (sent through the outbox) confirms the order
+        return None
+
+
+whatsapp_chat = WhatsAppChat()
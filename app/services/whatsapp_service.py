@@ -0,0 +1,410 @@
+"""
+WhatsApp order notifications through Twilio.
+
+Order events reach `notify_order` through the outbox (see
+app.services.outbox). It renders the message and queues it in Redis. The
+notification worker (app.workers.whatsapp) sends queued messages in
+batches over one pooled HTTP client.
+
+* `whatsapp:queue` - messages waiting to be sent (LPUSH in, LMOVE out).
+* `whatsapp:processing:{worker}` - the batch a worker is sending. Messages
+  are moved here from the queue and removed once sent, rescheduled or
+  dead-lettered. A transport error counts as a failed send, and a worker
+  whose loop stops requeues what is left, so a batch is never orphaned.
+* `whatsapp:workers` - a sorted set of workers by last heartbeat. The
+  batch of a worker silent for WHATSAPP_WORKER_LEASE_SECONDS is put back
+  on the queue by the others (so a message may be sent twice, never lost).
+* `whatsapp:retry` - a sorted set of messages scored by the time they are
+  due again: failed sends waiting out their backoff, and messages deferred
+  because their recipient was messaged too recently.
+* `whatsapp:dead` - messages that failed for good, with their last error.
+* `whatsapp:seen:{id}` - marks an outbox event as queued, so a redelivered
+  event doesn't notify twice.
+* `whatsapp:pace:{number}` - held for WHATSAPP_PER_NUMBER_INTERVAL_SECONDS
+  after each message to that number.
+"""
+import asyncio
+import datetime
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import httpx
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.core.metrics import WHATSAPP_MESSAGES, WHATSAPP_QUEUE_DEPTH, WHATSAPP_SEND_SECONDS
+from app.core.redis import redis_client
+from app.models.outbox import OutboxEvent
+from app.models.user import User
+from app.schemas.orders import OrderStatus
+from app.services.outbox import (
+    ORDER_CANCELLED, ORDER_CREATED, ORDER_PAID, ORDER_REFUNDED, ORDER_STATUS_CHANGED, handles, retry_delay,
+)
+
+QUEUE_KEY = "whatsapp:queue"
+RETRY_KEY = "whatsapp:retry"
+DEAD_KEY = "whatsapp:dead"
+PROCESSING_KEY = "whatsapp:processing:{}"
+WORKERS_KEY = "whatsapp:workers"
+SEEN_KEY = "whatsapp:seen:{}"
+PACE_KEY = "whatsapp:pace:{}"
+SEEN_TTL_SECONDS = 7 * 24 * 3600
+
+# KEYS[1] seen marker, KEYS[2] queue; ARGV message, marker ttl
+ENQUEUE_SCRIPT = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[2]) then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] pace key; ARGV interval in ms. 0 if the number may be messaged
+# now, else the milliseconds until it may.
+PACE_SCRIPT = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'PX', ARGV[1]) then
+    return 0
+end
+return math.max(redis.call('PTTL', KEYS[1]), 1)
+"""
+
+# KEYS[1] retry set, KEYS[2] queue; ARGV now, limit. Moves due messages to
+# the consuming end of the queue.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+    redis.call('RPUSH', KEYS[2], unpack(due))
+end
+return #due
+"""
+
+# KEYS[1] queue, KEYS[2] processing list; ARGV limit. Moves up to limit
+# messages from the consuming end of the queue and returns them.
+CLAIM_SCRIPT = """
+local claimed = {}
+for i = 1, tonumber(ARGV[1]) do
+    local message = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+    if not message then
+        break
+    end
+    claimed[i] = message
+end
+return claimed
+"""
+
+# KEYS[1] processing list, KEYS[2] queue, KEYS[3] workers; ARGV worker.
+# Puts a dead worker's batch back at the consuming end of the queue, oldest
+# first, and forgets the worker.
+REQUEUE_SCRIPT = """
+local requeued = 0
+while redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT') do
+    requeued = requeued + 1
+end
+redis.call('ZREM', KEYS[3], ARGV[1])
+return requeued
+"""
+
+ORDER_MESSAGES = {
+    ORDER_CREATED: "{restaurant}: we've received your order {ref} for {total}. We'll let you know once it's confirmed.",
+    ORDER_PAID: "{restaurant}: payment received for order {ref}. We're preparing it now.",
+    ORDER_CANCELLED: "{restaurant}: your order {ref} has been cancelled.",
+    ORDER_REFUNDED: "{restaurant}: sorry, an item in order {ref} ran out of stock, so the order was cancelled. "
+                    "Your payment of {total} is being refunded.",
+}
+STATUS_MESSAGES = {
+    OrderStatus.PROCESSING.value: "{restaurant}: order {ref} is being prepared.",
+    OrderStatus.SHIPPED.value: "{restaurant}: order {ref} is on its way.",
+    OrderStatus.DELIVERED.value: "{restaurant}: order {ref} has been delivered. Enjoy!",
+}
+
+
+class WhatsAppSendError(Exception):
+    def __init__(self, message: str, retryable: bool, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def whatsapp_address(number: str) -> str:
+    """Twilio's `whatsapp:+<E.164>` form of a phone number or WhatsApp ID."""
+    number = number.removeprefix("whatsapp:")
+    return f"whatsapp:{number if number.startswith('+') else '+' + number}"
+
+
+def render_order_message(event_type: str, payload: dict) -> Optional[str]:
+    """Notification text for an order event, or None if it doesn't warrant one."""
+    if event_type == ORDER_STATUS_CHANGED:
+        template = STATUS_MESSAGES.get(payload["order_status"])
+    else:
+        template = ORDER_MESSAGES.get(event_type)
+    if template is None:
+        return None
+    return template.format(
+        restaurant=settings.restaurant_name,
+        ref=payload["order_id"][:8].upper(),
+        total=payload["total_amount"],
+    )
+
+
+async def enqueue(message_id: str, to: str, body: str, paced: bool = True) -> bool:
+    """
+    Queue a message once per message_id; returns False for a duplicate.
+    Chat replies pass paced=False: they answer the customer, so they skip
+    the per-number interval.
+    """
+    message = orjson.dumps({
+        "id": message_id, "to": to, "body": body, "attempts": 0, "paced": paced,
+        "queued_at": datetime.datetime.utcnow().isoformat(),
+    })
+    queued = await redis_client.eval(ENQUEUE_SCRIPT, 2, SEEN_KEY.format(message_id), QUEUE_KEY, message, SEEN_TTL_SECONDS)
+    return bool(queued)
+
+
+@handles(ORDER_CREATED, ORDER_PAID, ORDER_STATUS_CHANGED, ORDER_CANCELLED, ORDER_REFUNDED)
+async def notify_order(event: OutboxEvent):
+    """Outbox handler: queue the customer's WhatsApp notification for an order event."""
+    if not settings.twilio_whatsapp_number:
+        return
+    body = render_order_message(event.event_type, event.payload)
+    if body is None:
+        return
+    async with AsyncSessionLocal() as db:
+        to = (await db.execute(
+            select(func.coalesce(User.whatsapp_id, User.phone_number)).where(User.user_id == event.payload["user_id"])
+        )).scalar_one_or_none()
+    if to:
+        await enqueue(event.event_id, to, body)
+
+
+class WhatsAppTransport(ABC):
+    """Sends one message; raises WhatsAppSendError on failure."""
+
+    @abstractmethod
+    async def send(self, to: str, body: str) -> str:
+        """Send `body` to `to`; returns the provider's message id."""
+
+    async def aclose(self):
+        pass
+
+
+class TwilioTransport(WhatsAppTransport):
+    """Twilio Messages API over one keep-alive connection pool."""
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        base_url: str = settings.twilio_api_base_url,
+        max_connections: int = settings.whatsapp_max_concurrency,
+        timeout: float = settings.whatsapp_send_timeout_seconds
+    ):
+        self.from_address = whatsapp_address(from_number)
+        self.path = f"/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(account_sid, auth_token),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @classmethod
+    def from_settings(cls) -> "TwilioTransport":
+        if not (settings.twilio_account_sid and settings.twilio_auth_token and settings.twilio_whatsapp_number):
+            raise RuntimeError("TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_NUMBER must be set")
+        return cls(settings.twilio_account_sid, settings.twilio_auth_token, settings.twilio_whatsapp_number)
+
+    async def send(self, to: str, body: str) -> str:
+        try:
+            response = await self.client.post(
+                self.path, data={"From": self.from_address, "To": whatsapp_address(to), "Body": body}
+            )
+        except httpx.HTTPError as exc:
+            raise WhatsAppSendError(f"{type(exc).__name__}: {exc}", retryable=True)
+
+        if response.status_code < 400:
+            try:
+                return response.json()["sid"]
+            except (ValueError, KeyError, TypeError):
+                # Accepted, so it may well have been sent: dead-letter rather than resend
+                raise WhatsAppSendError(
+                    f"Twilio {response.status_code} without a message sid: {response.text}"[:500], retryable=False
+                )
+        try:
+            detail = response.json().get("message", response.text)
+        except ValueError:
+            detail = response.text
+        retry_after = response.headers.get("Retry-After")
+        raise WhatsAppSendError(
+            f"Twilio {response.status_code}: {detail}"[:500],
+            retryable=response.status_code == 429 or response.status_code >= 500,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class WhatsAppNotifier:
+    """Consumes the notification queue."""
+
+    def __init__(
+        self,
+        transport: WhatsAppTransport,
+        batch_size: int = settings.whatsapp_batch_size,
+        concurrency: int = settings.whatsapp_max_concurrency,
+        messages_per_second: float = settings.whatsapp_messages_per_second,
+        per_number_interval: float = settings.whatsapp_per_number_interval_seconds,
+        max_attempts: int = settings.whatsapp_max_attempts,
+        retry_base: float = settings.whatsapp_retry_base_seconds,
+        retry_max: float = settings.whatsapp_retry_max_seconds,
+        lease_seconds: float = settings.whatsapp_worker_lease_seconds,
+        name: Optional[str] = None
+    ):
+        self.transport = transport
+        self.lease_seconds = lease_seconds
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.processing_key = PROCESSING_KEY.format(self.name)
+        self.batch_size = batch_size
+        self.per_number_interval = per_number_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._interval = 1 / messages_per_second if messages_per_second else 0
+        self._next_slot = 0.0
+
+    async def run(self, stop: asyncio.Event, poll_timeout: float = 1.0):
+        """
+        Send until `stop` is set; the batch in flight is finished first. If
+        the loop dies instead, whatever is left of the batch goes back on
+        the queue: once this worker has left `whatsapp:workers`, no other
+        worker would look at its processing list.
+        """
+        try:
+            await self._run(stop, poll_timeout)
+        finally:
+            try:
+                requeued = await redis_client.eval(
+                    REQUEUE_SCRIPT, 3, self.processing_key, QUEUE_KEY, WORKERS_KEY, self.name
+                )
+                if requeued:
+                    logger.warning(f"Requeued {requeued} WhatsApp messages of the stopped worker {self.name}")
+            except RedisError:
+                pass
+
+    async def _run(self, stop: asyncio.Event, poll_timeout: float):
+        while not stop.is_set():
+            try:
+                if not await self.run_once(poll_timeout):
+                    WHATSAPP_QUEUE_DEPTH.set(await redis_client.llen(QUEUE_KEY) + await redis_client.zcard(RETRY_KEY))
+            except RedisError as exc:
+                logger.error(f"WhatsApp worker can't reach Redis: {exc}")
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self, poll_timeout: float = 0) -> int:
+        """Send one batch, waiting up to poll_timeout for the first message; returns its size."""
+        await redis_client.zadd(WORKERS_KEY, {self.name: time.time()})
+        await self.recover()
+        await redis_client.eval(PROMOTE_SCRIPT, 2, RETRY_KEY, QUEUE_KEY, time.time(), self.batch_size)
+        batch = await self._claim(poll_timeout)
+        await asyncio.gather(*(self._deliver(raw) for raw in batch))
+        return len(batch)
+
+    async def recover(self) -> int:
+        """Requeue the batches of workers whose heartbeat is older than the lease; returns the count."""
+        stale = await redis_client.zrangebyscore(WORKERS_KEY, "-inf", time.time() - self.lease_seconds)
+        requeued = 0
+        for name in stale:
+            if name == self.name:
+                continue
+            count = await redis_client.eval(REQUEUE_SCRIPT, 3, PROCESSING_KEY.format(name), QUEUE_KEY, WORKERS_KEY, name)
+            if count:
+                logger.warning(f"Requeued {count} WhatsApp messages left by worker {name}")
+            requeued += count
+        return requeued
+
+    async def _claim(self, poll_timeout: float) -> List[str]:
+        """Move up to batch_size messages from the queue to this worker's processing list."""
+        batch = await redis_client.eval(CLAIM_SCRIPT, 2, QUEUE_KEY, self.processing_key, self.batch_size)
+        if not batch and poll_timeout:
+            first = await redis_client.blmove(QUEUE_KEY, self.processing_key, poll_timeout, "RIGHT", "LEFT")
+            if first:
+                batch = [first] + await redis_client.eval(
+                    CLAIM_SCRIPT, 2, QUEUE_KEY, self.processing_key, self.batch_size - 1
+                )
+        return batch
+
+    async def dead_letters(self, limit: int = 100) -> List[dict]:
+        return [orjson.loads(raw) for raw in await redis_client.lrange(DEAD_KEY, 0, limit - 1)]
+
+    async def _deliver(self, raw: str):
+        await self._send(orjson.loads(raw))
+        # Only once it was sent, rescheduled or dead-lettered
+        await redis_client.lrem(self.processing_key, 1, raw)
+
+    async def _send(self, message: dict):
+        async with self._semaphore:
+            wait_ms = await self._pace(message["to"]) if message.get("paced", True) else 0
+            if wait_ms:
+                await self._schedule(message, wait_ms / 1000)
+                WHATSAPP_MESSAGES.labels(result="deferred").inc()
+                return
+
+            await self._throttle()
+            started = time.perf_counter()
+            try:
+                await self.transport.send(message["to"], message["body"])
+            except WhatsAppSendError as exc:
+                await self._failed(message, exc)
+                return
+            except Exception as exc:
+                # A transport bug must not take the worker (and its batch) down with it
+                logger.exception(f"WhatsApp transport failed on message {message['id']}")
+                await self._failed(message, WhatsAppSendError(f"{type(exc).__name__}: {exc}"[:500], retryable=True))
+                return
+            finally:
+                WHATSAPP_SEND_SECONDS.observe(time.perf_counter() - started)
+            WHATSAPP_MESSAGES.labels(result="sent").inc()
+
+    async def _pace(self, to: str) -> int:
+        """Claim the recipient's pacing slot; returns the milliseconds to wait if it's taken."""
+        interval_ms = int(self.per_number_interval * 1000)
+        if interval_ms <= 0:
+            return 0
+        return await redis_client.eval(PACE_SCRIPT, 1, PACE_KEY.format(to), interval_ms)
+
+    async def _throttle(self):
+        """Space sends at most messages_per_second apart in this worker."""
+        if not self._interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _failed(self, message: dict, exc: WhatsAppSendError):
+        message = dict(message, attempts=message["attempts"] + 1, last_error=str(exc))
+        if exc.retryable and message["attempts"] < self.max_attempts:
+            delay = max(exc.retry_after or 0, retry_delay(message["attempts"], self.retry_base, self.retry_max))
+            await self._schedule(message, delay)
+            WHATSAPP_MESSAGES.labels(result="retry").inc()
+            return
+        await redis_client.lpush(DEAD_KEY, orjson.dumps(message))
+        WHATSAPP_MESSAGES.labels(result="dead").inc()
+        logger.error(f"WhatsApp message {message['id']} dead-lettered: {exc}")
+
+    async def _schedule(self, message: dict, delay: float):
+        await redis_client.zadd(RETRY_KEY, {orjson.dumps(message): time.time() + delay})
@@ -0,0 +1,60 @@
+"""
+Compare two benchmark result files and fail on regressions.
+
+Usage:
+    python -m app.tests.benchmarks.compare .benchmarks/<base>.json .benchmarks/<head>.json --threshold 0.2
+
+A benchmark regresses when its p50 latency grows by more than `threshold`
+(relative) or when it issues more SQL statements per call than before.
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+
+def compare(base: dict, head: dict, threshold: float) -> List[str]:
+    regressions = []
+    print(f"{'benchmark':<52}{'p50 base':>10}{'p50 head':>10}{'change':>9}{'stmts':>12}")
+    for name, head_stats in head["results"].items():
+        base_stats = base["results"].get(name)
+        if base_stats is None:
+            print(f"{name:<52}{'-':>10}{head_stats['p50_ms']:>10}{'new':>9}")
+            continue
+
+        change = (head_stats["p50_ms"] - base_stats["p50_ms"]) / base_stats["p50_ms"] if base_stats["p50_ms"] else 0.0
+        statements = f"{base_stats['statements_per_call']}->{head_stats['statements_per_call']}"
+        print(f"{name:<52}{base_stats['p50_ms']:>10}{head_stats['p50_ms']:>10}{change:>+9.1%}{statements:>12}")
+
+        if change > threshold:
+            regressions.append(f"{name}: p50 latency {change:+.1%}")
+        if head_stats["statements_per_call"] > base_stats["statements_per_call"]:
+            regressions.append(f"{name}: statements per call {statements}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative p50 latency increase")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.head) as fh:
+        head = json.load(fh)
+
+    print(f"base {base['commit']} vs head {head['commit']}\n")
+    regressions = compare(base, head, args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
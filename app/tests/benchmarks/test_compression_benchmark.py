@@ -0,0 +1,79 @@
+"""
+CPU cost and bytes saved by response compression, per endpoint payload.
+
+Each payload is the body the endpoint would send, built from the benchmark
+database; compression is timed on its own (CPU time) at the levels the
+middleware is configured with.
+"""
+import time
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.core.compression import CompressionMiddleware, brotli
+from app.models.cart import CartItem
+from app.schemas.cart import cart_summary_adapter
+from app.schemas.category import CategoryResponse, category_tree_adapter
+from app.schemas.products import product_list_adapter
+from app.services.cart import cart_service
+from app.services.category import CategoryService
+from app.services.products import ProductService
+from app.tests.benchmarks.conftest import ITERATIONS
+
+ENCODINGS = ["gzip", "br"]
+category_list_field = TypeAdapter(List[CategoryResponse])
+
+
+@pytest.fixture(scope="module")
+def payloads(loop, session_factory):
+    async def build():
+        async with session_factory() as db:
+            products = await ProductService.get_product_rows(db, page=1, page_size=100)
+            categories = await CategoryService.get_all_categories(db)
+            tree = await CategoryService.get_category_tree(db)
+            cart_user = (await db.execute(
+                select(CartItem.user_id)
+                .where(CartItem.is_active == True)
+                .group_by(CartItem.user_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            )).scalar_one()
+            cart = await cart_service.get_cart_summary_rows(db, user_id=cart_user)
+        return {
+            "GET /products/?page_size=100": product_list_adapter.dump_json(products),
+            "GET /category/": category_list_field.dump_json(
+                category_list_field.validate_python(categories, from_attributes=True)
+            ),
+            "GET /category/tree": category_tree_adapter.dump_json(tree),
+            "GET /cart/": cart_summary_adapter.dump_json(cart),
+        }
+
+    return loop.run_until_complete(build())
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_compression_cost_per_endpoint(payloads, results, encoding):
+    if encoding == "br" and brotli is None:
+        pytest.skip("brotli not installed")
+    middleware = CompressionMiddleware(
+        None,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+
+    for endpoint, body in payloads.items():
+        cpu_times = []
+        for _ in range(ITERATIONS):
+            started = time.thread_time()
+            compressed = middleware.stream(encoding).compress(body, final=True)
+            cpu_times.append(time.thread_time() - started)
+        results.add(
+            f"compression[{encoding}] {endpoint}",
+            cpu_times,
+            original_bytes=len(body),
+            compressed_bytes=len(compressed),
+            bytes_saved_pct=round(100 * (1 - len(compressed) / max(len(body), 1)), 1),
+        )
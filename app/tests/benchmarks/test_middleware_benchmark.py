@@ -0,0 +1,80 @@
+"""
+Requests-per-second of the request logging middleware: the previous
+BaseHTTPMiddleware logger versus the pure ASGI RequestLoggingMiddleware.
+"""
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.logger import logger
+from app.core.middleware import RequestLoggingMiddleware
+from app.core.query_stats import start_query_stats
+
+REQUESTS = 3000
+
+
+async def legacy_log_requests(request: Request, call_next):
+    """The BaseHTTPMiddleware logger this benchmark compares against."""
+    stats = start_query_stats()
+    logger.info(f"Request: {request.method} {request.url}")
+    try:
+        response = await call_next(request)
+        response.headers.append("Server-Timing", stats.server_timing())
+        logger.bind(**stats.log_fields()).info(
+            f"Response: {request.method} {request.url} "
+            f"Status: {response.status_code}"
+        )
+        return response
+    except Exception as e:
+        logger.exception(f"Error processing request: {request.method} {request.url}")
+        raise e
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"item_id": item_id, "name": "benchmark"}
+
+    if variant == "legacy":
+        app.add_middleware(BaseHTTPMiddleware, dispatch=legacy_log_requests)
+    elif variant == "asgi":
+        app.add_middleware(RequestLoggingMiddleware)
+    elif variant == "asgi-sampled":
+        app.add_middleware(RequestLoggingMiddleware, sample_rate_2xx=0.1)
+    return app
+
+
+@pytest.fixture
+def null_log_sink():
+    """Serialize records as production does, but discard the output."""
+    logger.remove()
+    handler_id = logger.add(lambda message: None, serialize=True, level="INFO")
+    yield
+    logger.remove(handler_id)
+
+
+@pytest.mark.parametrize("variant", ["none", "legacy", "asgi", "asgi-sampled"])
+def test_request_logging_throughput(loop, results, null_log_sink, variant):
+    app = build_app(variant)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for i in range(100):
+                await client.get(f"/items/{i}")
+            latencies = []
+            started = time.perf_counter()
+            for i in range(REQUESTS):
+                request_started = time.perf_counter()
+                response = await client.get(f"/items/{i}")
+                latencies.append(time.perf_counter() - request_started)
+                assert response.status_code == 200
+            return latencies, time.perf_counter() - started
+
+    latencies, elapsed = loop.run_until_complete(run())
+    results.add(f"middleware.request_logging[{variant}]", latencies, rps=round(REQUESTS / elapsed, 1))
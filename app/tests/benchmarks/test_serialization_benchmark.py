@@ -0,0 +1,56 @@
+"""
+Product listing at 100 and 1000 items per page: the ORM path (hydrate
+Product objects plus their category/subcategory, build ProductBase models,
+then FastAPI's response_model validate/serialize/json.dumps) versus a column
+select serialized by the prebuilt TypeAdapter.
+"""
+import json
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+from app.schemas.products import ProductBase, product_list_adapter
+from app.services.products import ProductService
+
+response_model_field = TypeAdapter(List[ProductBase])
+
+
+def render_response_model(products) -> bytes:
+    """What FastAPI does with a response_model=List[ProductBase] return value."""
+    models = [
+        ProductBase(
+            product_id=p.product_id,
+            product_name=p.product_name,
+            price=float(p.price),
+            description=p.description,
+            image_url=p.image_url,
+            category_id=p.category_id,
+            category_name=p.category.category_name if p.category else None,
+            subcategory_id=p.subcategory_id,
+            subcategory_name=p.subcategory.subcategory_name if p.subcategory else None,
+        )
+        for p in products
+    ]
+    validated = response_model_field.validate_python([m.model_dump() for m in models])
+    content = response_model_field.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.mark.parametrize("page_size", [100, 1000])
+def test_product_page_orm(bench, page_size):
+    async def call(db, _):
+        products = await ProductService.get_all_products(db, page=1, page_size=page_size)
+        render_response_model(products)
+
+    bench(f"products.page[orm,{page_size}]", call, iterations=20)
+
+
+@pytest.mark.parametrize("page_size", [100, 1000])
+def test_product_page_rows(bench, page_size):
+    async def call(db, _):
+        rows = await ProductService.get_product_rows(db, page=1, page_size=page_size)
+        product_list_adapter.dump_json(rows)
+
+    stats = bench(f"products.page[rows,{page_size}]", call, iterations=20)
+    assert stats["statements_per_call"] == 1
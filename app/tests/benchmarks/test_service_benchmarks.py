@@ -0,0 +1,130 @@
+"""
+Latency, statement-count and rows-fetched benchmarks for service-layer hot paths.
+"""
+import random
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.cart import CartItem
+from app.models.product import Product
+from app.models.user import Address
+from app.schemas.orders import OrderCreate, OrderItemCreate
+from app.services.admin import AdminService
+from app.services.cart import cart_service
+from app.services.orders import order_service
+from app.services.products import ProductService
+
+
+@pytest.fixture(scope="module")
+def fixtures_data(loop, session_factory):
+    """IDs the benchmarks draw from: a user with a cart, users with addresses, products."""
+    async def load():
+        async with session_factory() as session:
+            cart_user = (await session.execute(
+                select(CartItem.user_id)
+                .where(CartItem.is_active == True)
+                .group_by(CartItem.user_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            )).scalar_one()
+            addresses = (await session.execute(
+                select(Address.user_id, Address.address_id).where(Address.is_default == True).limit(200)
+            )).all()
+            product_ids = (await session.execute(
+                select(Product.product_id).where(Product.is_active == True).limit(500)
+            )).scalars().all()
+            category_id = (await session.execute(
+                select(Product.category_id).limit(1)
+            )).scalar_one()
+        return {
+            "cart_user": cart_user,
+            "addresses": [tuple(row) for row in addresses],
+            "product_ids": list(product_ids),
+            "category_id": category_id,
+        }
+
+    return loop.run_until_complete(load())
+
+
+def _order_payload(data, rng):
+    user_id, address_id = rng.choice(data["addresses"])
+    items = [
+        OrderItemCreate(product_id=product_id, quantity=rng.randint(1, 3))
+        for product_id in rng.sample(data["product_ids"], 3)
+    ]
+    return user_id, OrderCreate(address_id=address_id, items=items, payment_method="Credit Card")
+
+
+def test_get_all_products(bench):
+    async def call(db, _):
+        await ProductService.get_all_products(db, page=1, page_size=20)
+
+    stats = bench("ProductService.get_all_products", call)
+    assert stats["statements_per_call"] >= 1
+
+
+def test_get_all_products_filtered(bench, fixtures_data):
+    async def call(db, _):
+        await ProductService.get_all_products(
+            db, category=fixtures_data["category_id"], search="Item", page=3, page_size=20
+        )
+
+    bench("ProductService.get_all_products[filtered]", call)
+
+
+def test_get_user_cart_with_summary(bench, fixtures_data):
+    async def call(db, _):
+        items = await cart_service.get_user_cart(db, user_id=fixtures_data["cart_user"])
+        await cart_service.calculate_cart_summary(items)
+
+    bench("CartService.get_user_cart+calculate_cart_summary", call)
+
+
+def test_create_order(bench, fixtures_data):
+    rng = random.Random(1)
+
+    async def setup(db, _):
+        return _order_payload(fixtures_data, rng)
+
+    async def call(db, payload):
+        user_id, order_data = payload
+        await order_service.create_order(db, user_id, order_data)
+
+    bench("OrderService.create_order", call, setup=setup)
+
+
+def test_confirm_order(bench, fixtures_data):
+    rng = random.Random(2)
+
+    async def setup(db, _):
+        user_id, order_data = _order_payload(fixtures_data, rng)
+        order = await order_service.create_order(db, user_id, order_data)
+        return order.order_id
+
+    async def call(db, order_id):
+        result = await order_service.confirm_order(db, order_id)
+        assert result["status"] == "success", result
+
+    bench("OrderService.confirm_order", call, setup=setup)
+
+
+def test_cancel_order(bench, fixtures_data):
+    rng = random.Random(3)
+
+    async def setup(db, _):
+        user_id, order_data = _order_payload(fixtures_data, rng)
+        order = await order_service.create_order(db, user_id, order_data)
+        return order.order_id
+
+    async def call(db, order_id):
+        assert await order_service.cancel_order(db, order_id, is_admin=True)
+
+    bench("OrderService.cancel_order", call, setup=setup)
+
+
+def test_get_dashboard_stats(bench):
+    async def call(db, _):
+        await AdminService.get_dashboard_stats(db)
+
+    bench("AdminService.get_dashboard_stats", call, iterations=20)
@@ -0,0 +1,156 @@
+"""
+Soak test for live order streams: one uvicorn worker holding many idle SSE
+connections.
+
+Opens SSE_SOAK_CONNECTIONS streams on one tracked order, records the
+worker's resident memory per open stream, then publishes a status change
+and measures how long it takes to reach every stream. Needs Redis; the
+order's tracking snapshot is written straight to Redis, so no database is
+involved.
+
+    RUN_BENCHMARKS=1 SSE_SOAK_CONNECTIONS=5000 python -m pytest app/tests/benchmarks/test_sse_soak.py
+"""
+import asyncio
+import datetime
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import orjson
+import pytest
+from redis.exceptions import RedisError
+
+from app.core.redis import redis_client
+from app.services.order_tracking import SNAPSHOT_KEY, order_tracking
+
+CONNECTIONS = int(os.getenv("SSE_SOAK_CONNECTIONS", 2000))
+# Streams opened concurrently while ramping up
+RAMP_BATCH = 200
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+@pytest.fixture(scope="module")
+def server():
+    if not os.path.exists("/proc/self/status"):
+        pytest.skip("needs /proc to read worker memory")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = CONNECTIONS * 2 + 256
+    if hard != resource.RLIM_INFINITY and hard < needed:
+        pytest.skip(f"open file limit {hard} is below {needed}")
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, needed), hard))
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        LOG_SINK="none",
+        TRACKING_RATE_LIMIT=str(CONNECTIONS * 10),
+        SSE_MAX_CONNECTIONS=str(CONNECTIONS * 2),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        process.kill()
+        pytest.fail("uvicorn did not start")
+    yield process, port
+    process.terminate()
+    process.wait(10)
+
+
+async def _open_stream(port: int, token: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /api/v1/orders/track/{token}/events HTTP/1.1\r\nHost: soak\r\n"
+        "Accept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+    received = b""
+    while b"event: status" not in received:
+        chunk = await reader.read(4096)
+        if not chunk:
+            raise ConnectionError(received.decode(errors="replace")[:200])
+        received += chunk
+    return reader, writer
+
+
+async def _next_event(reader) -> float:
+    while b"event: status" not in await reader.read(4096):
+        pass
+    return time.perf_counter()
+
+
+def test_idle_stream_memory_and_fanout(loop, server, results):
+    process, port = server
+    order_id, token = str(uuid.uuid4()), str(uuid.uuid4())
+    placed = datetime.datetime.utcnow()
+
+    async def run():
+        try:
+            await redis_client.ping()
+        except RedisError:
+            pytest.skip("Redis not reachable")
+        snapshot = {
+            "order_id": order_id, "tracking_token": token, "total_amount": "10.00",
+            "created_at": placed.isoformat(), "address": None, "items": [],
+        }
+        await redis_client.set(SNAPSHOT_KEY.format(token), orjson.dumps(snapshot), ex=600)
+        await order_tracking.set_status(order_id, token, "Pending", "Pending", placed)
+
+        # Warm the worker up with one stream so the baseline includes the pub/sub listener.
+        first = await _open_stream(port, token)
+        baseline_kb = _rss_kb(process.pid)
+        streams = [first]
+        for start in range(1, CONNECTIONS, RAMP_BATCH):
+            batch = min(RAMP_BATCH, CONNECTIONS - start)
+            streams += await asyncio.gather(*(_open_stream(port, token) for _ in range(batch)))
+        await asyncio.sleep(1)
+        loaded_kb = _rss_kb(process.pid)
+
+        waiters = [asyncio.create_task(_next_event(reader)) for reader, _ in streams]
+        published = time.perf_counter()
+        await order_tracking.set_status(order_id, token, "Shipped", "Paid", placed + datetime.timedelta(seconds=1))
+        delivered = await asyncio.wait_for(asyncio.gather(*waiters), 60)
+
+        for _, writer in streams:
+            writer.close()
+        await redis_client.connection_pool.disconnect()
+        return baseline_kb, loaded_kb, [at - published for at in delivered]
+
+    # The session loop, which other benchmarks' pooled Redis connections are bound to
+    baseline_kb, loaded_kb, latencies = loop.run_until_complete(run())
+    per_stream_kb = (loaded_kb - baseline_kb) / max(CONNECTIONS - 1, 1)
+    results.add(
+        "sse_soak_fanout",
+        latencies,
+        connections=CONNECTIONS,
+        worker_rss_mb=round(loaded_kb / 1024, 1),
+        rss_per_stream_kb=round(per_stream_kb, 2),
+    )
+    print(f"\n{CONNECTIONS} streams: {per_stream_kb:.1f} KB each, "
+          f"fan-out p95 {results.results['sse_soak_fanout']['p95_ms']} ms")
+    assert len(latencies) == CONNECTIONS
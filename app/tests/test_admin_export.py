@@ -0,0 +1,116 @@
+"""
+GET /admin/orders/export: both formats, the date filters and the admin guard.
+
+Uses the database harness (and `api` fixture) of test_query_counts.py:
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test \
+    python -m pytest app/tests/test_admin_export.py
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from app.tests.test_query_counts import api  # noqa: F401  (shared fixture)
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+
+if os.getenv("TEST_DATABASE_URL"):
+    from app.api.v1.endpoints import admin as admin_endpoints
+    from app.api.v1.endpoints.admin import EXPORT_COLUMNS
+    from app.core.dependencies import get_current_admin_user, get_current_user
+    from app.main import app
+    from app.models.order import Order
+
+URL = "/api/v1/admin/orders/export"
+# Far enough in the past that no order placed by the other tests falls in the range
+JANUARY = datetime.datetime(2001, 1, 10, 12, 0)
+FEBRUARY = datetime.datetime(2001, 2, 10, 12, 0)
+
+
+@pytest.fixture(scope="module")
+def orders(api):  # noqa: F811
+    placed = [
+        Order(
+            user_id=api.data["user"].user_id, address_id=api.data["address_id"], total_amount=Decimal(amount),
+            order_status="delivered", payment_status="paid", payment_method="Card",
+            tracking_token=uuid.uuid4().hex, created_at=created_at, updated_at=created_at,
+        )
+        for amount, created_at in (("10.50", JANUARY), ("20.00", FEBRUARY))
+    ]
+    api.add(*placed)
+    return placed
+
+
+@pytest.fixture
+def export(api, monkeypatch):  # noqa: F811
+    monkeypatch.setattr(admin_endpoints, "AnalyticsSessionLocal", api.session_factory)
+
+    def get(**params):
+        return api.loop.run_until_complete(api.client.get(URL, params=params))
+
+    return get
+
+
+def test_export_csv(api, export, orders):  # noqa: F811
+    response = export(start_date="2001-01-01T00:00:00", end_date="2001-03-01T00:00:00")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"].endswith('.csv"')
+
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == EXPORT_COLUMNS
+    exported = [dict(zip(EXPORT_COLUMNS, row)) for row in rows[1:]]
+    assert [row["order_id"] for row in exported] == [order.order_id for order in orders]
+    assert exported[0]["total_amount"] == "10.50"
+    assert exported[0]["created_at"] == JANUARY.isoformat()
+    assert exported[0]["phone_number"] == api.data["user"].phone_number
+    assert exported[0]["email"] == ""
+
+
+def test_export_ndjson(export, orders):
+    response = export(format="ndjson", start_date="2001-01-01T00:00:00", end_date="2001-03-01T00:00:00")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [list(row) for row in exported] == [EXPORT_COLUMNS] * 2
+    assert [row["order_id"] for row in exported] == [order.order_id for order in orders]
+    assert [row["total_amount"] for row in exported] == ["10.50", "20.00"]
+
+
+def test_export_date_filters(export, orders):
+    def exported_ids(**params):
+        response = export(format="ndjson", **params)
+        assert response.status_code == 200
+        return [json.loads(line)["order_id"] for line in response.text.splitlines()]
+
+    january, february = (order.order_id for order in orders)
+    # start_date is inclusive, end_date exclusive
+    assert exported_ids(start_date=JANUARY.isoformat(), end_date="2001-02-01T00:00:00") == [january]
+    assert exported_ids(start_date=FEBRUARY.isoformat(), end_date="2001-03-01T00:00:00") == [february]
+    assert exported_ids(start_date="2001-01-01T00:00:00", end_date=FEBRUARY.isoformat()) == [january]
+    assert february not in exported_ids(end_date="2001-02-01T00:00:00")
+    assert january not in exported_ids(start_date="2001-02-01T00:00:00")
+    assert exported_ids(start_date="2001-03-01T00:00:00", end_date="2001-04-01T00:00:00") == []
+
+
+def test_export_rejects_unknown_format(export):
+    assert export(format="xml").status_code == 422
+
+
+def test_export_requires_an_admin(api, export, orders):  # noqa: F811
+    admin_override = app.dependency_overrides.pop(get_current_admin_user)
+    app.dependency_overrides[get_current_user] = lambda: api.data["user"]
+    try:
+        response = export(start_date="2001-01-01T00:00:00", end_date="2001-03-01T00:00:00")
+        assert response.status_code == 403
+        assert orders[0].order_id not in response.text
+    finally:
+        del app.dependency_overrides[get_current_user]
+        app.dependency_overrides[get_current_admin_user] = admin_override
@@ -0,0 +1,38 @@
+import gzip
+import json
+
+import pytest
+
+from app.core.responses import accepted_encodings
+from app.services.category_tree import build_snapshot
+
+TREE = [
+    {
+        "category_id": "c1", "category_name": "Drinks", "image_url": None, "sort_order": 0, "product_count": 3,
+        "subcategories": [{"subcategory_id": "s1", "subcategory_name": "Tea", "product_count": 2}],
+    },
+]
+
+
+def test_accepted_encodings_honours_q_values():
+    assert accepted_encodings("gzip, deflate, br;q=0") == {"gzip", "deflate"}
+    assert accepted_encodings("br;q=0.5, gzip;q=1.0") == {"br", "gzip"}
+    assert accepted_encodings(None) == set()
+
+
+def test_snapshot_variants_decode_to_the_same_tree():
+    snapshot = build_snapshot("1:1", TREE)
+    assert json.loads(snapshot.bodies["identity"]) == TREE
+    assert json.loads(gzip.decompress(snapshot.bodies["gzip"])) == TREE
+    if "br" in snapshot.bodies:
+        brotli = pytest.importorskip("brotli")
+        assert json.loads(brotli.decompress(snapshot.bodies["br"])) == TREE
+
+
+def test_snapshot_negotiation_and_etags():
+    snapshot = build_snapshot("1:1", TREE)
+    assert snapshot.negotiate("gzip") == "gzip"
+    assert snapshot.negotiate("identity") == "identity"
+    assert snapshot.negotiate(None) == "identity"
+    assert snapshot.etag("identity") != snapshot.etag("gzip")
+    assert build_snapshot(None, TREE).etag("gzip") is None
@@ -0,0 +1,146 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.compression import CompressionMiddleware
+
+PAYLOAD = [{"product_id": str(i), "product_name": f"Product {i}", "price": 9.99} for i in range(200)]
+ETAG = '"catalog-1"'
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/large")
+    async def large():
+        return PAYLOAD
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/etag")
+    async def etag():
+        return Response(json.dumps(PAYLOAD), media_type="application/json", headers={"ETag": ETAG})
+
+    @app.get("/etag/{price}")
+    async def etag_price(price: str):
+        # Same ETag and length, different bytes (a body read from a lagging replica)
+        body = json.dumps([dict(item, price=float(price)) for item in PAYLOAD])
+        return Response(body, media_type="application/json", headers={"ETag": ETAG})
+
+    @app.get("/encoded")
+    async def encoded():
+        body = gzip.compress(json.dumps(PAYLOAD).encode())
+        return Response(body, media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for item in PAYLOAD:
+                yield json.dumps(item).encode() + b"\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson; charset=utf-8")
+
+    @app.get("/events")
+    async def events():
+        async def chunks():
+            yield b"data: " + b"x" * 2000 + b"\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return app
+
+
+@pytest.fixture(scope="module")
+def get():
+    app = build_app()
+
+    def request(path, accept_encoding="gzip"):
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+        return asyncio.run(run())
+
+    return request
+
+
+def test_large_json_is_gzipped(get):
+    response = get("/large")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(json.dumps(PAYLOAD))
+    assert response.json() == PAYLOAD
+
+
+def test_brotli_preferred_when_available(get):
+    pytest.importorskip("brotli")
+    response = get("/large", accept_encoding="gzip, br")
+    assert response.headers["content-encoding"] == "br"
+
+
+def test_small_and_unaccepted_responses_pass_through(get):
+    response = get("/small")
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+    response = get("/large", accept_encoding="identity")
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" in response.headers["vary"].lower()
+
+
+def test_already_encoded_and_event_streams_pass_through(get):
+    response = get("/encoded")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == PAYLOAD
+
+    response = get("/events")
+    assert "content-encoding" not in response.headers
+
+
+def test_streaming_body_is_compressed_incrementally(get):
+    response = get("/stream")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert [json.loads(line) for line in response.text.splitlines()] == PAYLOAD
+
+
+def test_etagged_body_is_compressed_once():
+    app = build_app()
+    middleware = CompressionMiddleware(app.router, minimum_size=500)
+
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/etag", headers={"Accept-Encoding": "gzip"})
+            second = await client.get("/etag", headers={"Accept-Encoding": "gzip"})
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.headers["etag"] == f"W/{ETAG}"
+    assert first.content == second.content
+    assert len(middleware.cache._entries) == 1
+
+
+def test_compressed_body_cache_is_keyed_on_the_body():
+    app = build_app()
+    middleware = CompressionMiddleware(app.router, minimum_size=500)
+
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            stale = await client.get("/etag/9.99", headers={"Accept-Encoding": "gzip"})
+            fresh = await client.get("/etag/8.99", headers={"Accept-Encoding": "gzip"})
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert {item["price"] for item in fresh.json()} == {8.99}
+    assert {item["price"] for item in stale.json()} == {9.99}
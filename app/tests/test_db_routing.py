@@ -0,0 +1,182 @@
+"""
+Read-replica routing.
+
+The routing policy tests need no database. The end-to-end test runs when
+two databases are available, a second local Postgres (or a second database
+on the same server) standing in for the replica:
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/primary \
+    TEST_REPLICA_DATABASE_URL=postgresql+asyncpg://postgres@localhost/replica \
+    python -m pytest app/tests/test_db_routing.py
+"""
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from redis.exceptions import RedisError
+
+from app.core.database import RECENT_WRITE_KEY, ReadRouter
+
+PRIMARY = object()
+REPLICA_A = object()
+REPLICA_B = object()
+
+
+def test_reads_use_primary_without_replicas():
+    router = ReadRouter(PRIMARY, [], max_staleness=2.0)
+    assert router.engine_for_read() is PRIMARY
+
+
+def test_reads_round_robin_across_replicas():
+    router = ReadRouter(PRIMARY, [REPLICA_A, REPLICA_B], max_staleness=2.0)
+    assert [router.engine_for_read() for _ in range(4)] == [REPLICA_A, REPLICA_B, REPLICA_A, REPLICA_B]
+
+
+def test_reads_stay_on_primary_within_staleness_window():
+    router = ReadRouter(PRIMARY, [REPLICA_A], max_staleness=2.0)
+    router.record_write()
+    assert router.engine_for_read() is PRIMARY
+
+    router.last_write -= 2.5
+    assert router.engine_for_read() is REPLICA_A
+
+
+def test_write_on_one_worker_pins_reads_on_another():
+    from app.core.redis import redis_client
+
+    async def run():
+        try:
+            await redis_client.ping()
+        except (RedisError, OSError):
+            return None
+        writer = ReadRouter(PRIMARY, [REPLICA_A], max_staleness=2.0, redis=redis_client)
+        reader = ReadRouter(PRIMARY, [REPLICA_A], max_staleness=2.0, redis=redis_client)
+        try:
+            await redis_client.delete(RECENT_WRITE_KEY)
+            before = await reader.engine_for_request()
+
+            writer.record_write()
+            await writer.publish_write()
+            after = await reader.engine_for_request()
+            ttl = await redis_client.pttl(RECENT_WRITE_KEY)
+
+            await redis_client.delete(RECENT_WRITE_KEY)
+            await writer.publish_write()  # already published: no new marker
+            return before, after, ttl, await reader.engine_for_request()
+        finally:
+            await redis_client.delete(RECENT_WRITE_KEY)
+            await redis_client.connection_pool.disconnect()
+
+    result = asyncio.run(run())
+    if result is None:
+        pytest.skip("Redis not reachable")
+    before, after, ttl, later = result
+    assert before is REPLICA_A
+    assert after is PRIMARY
+    assert 0 < ttl <= 2000
+    assert later is REPLICA_A
+
+
+def test_catalog_cache_resolves_before_the_read_session():
+    from fastapi.routing import APIRoute
+
+    from app.core.database import get_read_db
+    from app.main import app
+
+    def calls(dependant):
+        for dependency in dependant.dependencies:
+            yield dependency.call
+            yield from calls(dependency)
+
+    catalog_routes = {
+        route.path: list(calls(route.dependant)) for route in app.routes
+        if isinstance(route, APIRoute)
+        and any(getattr(call, "__qualname__", "").startswith("catalog_cache.") for call in calls(route.dependant))
+    }
+    assert get_read_db in catalog_routes["/api/v1/products/{product_id}"]
+    # The versions behind the ETag must be read before the engine is picked
+    for path, route_calls in catalog_routes.items():
+        if get_read_db in route_calls:
+            first_cache = next(i for i, call in enumerate(route_calls) if call.__qualname__.startswith("catalog_cache."))
+            assert first_cache < route_calls.index(get_read_db), path
+
+
+def test_catalog_version_bump_pins_reads_to_primary():
+    from app.core.http_cache import PRODUCTS, VERSION_KEY, bump_catalog_version
+    from app.core.redis import redis_client
+
+    async def run():
+        try:
+            await redis_client.ping()
+        except (RedisError, OSError):
+            return None
+        router = ReadRouter(PRIMARY, [REPLICA_A], max_staleness=2.0, redis=redis_client)
+        try:
+            await redis_client.delete(RECENT_WRITE_KEY)
+            before = await router.engine_for_request()
+            version = int(await redis_client.get(VERSION_KEY.format(PRODUCTS)) or 0)
+            await bump_catalog_version(PRODUCTS)
+            bumped = int(await redis_client.get(VERSION_KEY.format(PRODUCTS)))
+            return before, bumped - version, await router.engine_for_request()
+        finally:
+            await redis_client.delete(RECENT_WRITE_KEY)
+            await redis_client.connection_pool.disconnect()
+
+    result = asyncio.run(run())
+    if result is None:
+        pytest.skip("Redis not reachable")
+    assert result == (REPLICA_A, 1, PRIMARY)
+
+
+@pytest.mark.skipif(
+    not (os.getenv("TEST_DATABASE_URL") and os.getenv("TEST_REPLICA_DATABASE_URL")),
+    reason="set TEST_DATABASE_URL and TEST_REPLICA_DATABASE_URL",
+)
+def test_committed_write_pins_reads_to_primary():
+    async def run():
+        primary = create_async_engine(os.environ["TEST_DATABASE_URL"])
+        replica = create_async_engine(os.environ["TEST_REPLICA_DATABASE_URL"])
+        router = ReadRouter(primary, [replica], max_staleness=60.0)
+        router.install()
+
+        async def read_database_name():
+            async with AsyncSession(bind=router.engine_for_read()) as session:
+                return (await session.execute(text("SELECT current_database()"))).scalar_one()
+
+        async def database_name(engine):
+            async with engine.connect() as conn:
+                return (await conn.execute(text("SELECT current_database()"))).scalar_one()
+
+        try:
+            primary_name = await database_name(primary)
+            replica_name = await database_name(replica)
+            assert primary_name != replica_name
+
+            assert await read_database_name() == replica_name
+
+            # A read-only transaction on the primary does not count as a write.
+            async with AsyncSession(bind=primary) as session:
+                await session.execute(text("SELECT 1"))
+                await session.commit()
+            assert await read_database_name() == replica_name
+
+            # A rolled-back write does not either.
+            async with AsyncSession(bind=primary) as session:
+                await session.execute(text("CREATE TEMPORARY TABLE routing_probe (id int)"))
+                await session.execute(text("INSERT INTO routing_probe VALUES (1)"))
+                await session.rollback()
+            assert await read_database_name() == replica_name
+
+            async with AsyncSession(bind=primary) as session:
+                await session.execute(text("CREATE TEMPORARY TABLE routing_probe (id int)"))
+                await session.execute(text("INSERT INTO routing_probe VALUES (1)"))
+                await session.commit()
+            assert await read_database_name() == primary_name
+        finally:
+            await primary.dispose()
+            await replica.dispose()
+
+    asyncio.run(run())
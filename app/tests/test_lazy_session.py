@@ -0,0 +1,68 @@
+"""
+LazySession connection release. Needs a Postgres database:
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test \
+    python -m pytest app/tests/test_lazy_session.py
+"""
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import LazySession, track_writes
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+
+
+def run_with_sessions(check):
+    async def run():
+        engine = create_async_engine(os.environ["TEST_DATABASE_URL"], pool_size=2, max_overflow=0)
+        track_writes(engine)
+        factory = sessionmaker(engine, class_=LazySession, expire_on_commit=False)
+        try:
+            await check(engine.sync_engine.pool, factory)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_connection_checked_out_on_first_statement_only():
+    async def check(pool, factory):
+        async with factory() as session:
+            assert pool.checkedout() == 0
+            await session.execute(text("SELECT 1"))
+            assert pool.checkedout() == 1
+
+    run_with_sessions(check)
+
+
+def test_release_returns_connection_after_reads():
+    async def check(pool, factory):
+        async with factory() as session:
+            await session.execute(text("SELECT 1"))
+            await session.release()
+            assert pool.checkedout() == 0
+            assert not session.in_transaction()
+
+            # The session stays usable and checks out again on demand.
+            assert (await session.execute(text("SELECT 2"))).scalar_one() == 2
+            assert pool.checkedout() == 1
+
+    run_with_sessions(check)
+
+
+def test_release_keeps_uncommitted_writes():
+    async def check(pool, factory):
+        async with factory() as session:
+            await session.execute(text("CREATE TEMPORARY TABLE lazy_probe (id int)"))
+            await session.execute(text("INSERT INTO lazy_probe VALUES (1)"))
+            await session.release()
+            assert pool.checkedout() == 1
+            assert session.in_transaction()
+            await session.rollback()
+
+    run_with_sessions(check)
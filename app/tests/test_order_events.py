@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+import uuid
+
+import orjson
+import pytest
+from redis.exceptions import RedisError
+
+from app.core.redis import redis_client
+from app.services.order_events import OrderEventHub, Subscription
+from app.services.order_tracking import order_tracking
+
+
+def test_full_queue_keeps_newest_events():
+    async def run():
+        subscription = Subscription(("order",), size=2)
+        for status in ["Processing", "Shipped", "Delivered"]:
+            subscription.push({"order_status": status})
+        return [subscription.queue.get_nowait()["order_status"] for _ in range(2)]
+
+    assert asyncio.run(run()) == ["Shipped", "Delivered"]
+
+
+def test_dispatch_routes_by_order_id():
+    hub = OrderEventHub()
+
+    async def run():
+        mine, other = Subscription(("a",), size=4), Subscription(("b",), size=4)
+        hub._subscribers = {"a": {mine}, "b": {other}}
+        hub.dispatch(orjson.dumps({
+            "order_id": "a", "tracking_token": "t", "order_status": "Shipped",
+            "payment_status": "Paid", "updated_at": "2026-01-01T00:00:00.000000",
+        }))
+        return mine.queue.qsize(), other.queue.qsize(), mine.queue.get_nowait()
+
+    mine, other, event = asyncio.run(run())
+    assert (mine, other) == (1, 0)
+    assert "tracking_token" not in event
+
+
+def test_stream_receives_published_status():
+    hub = OrderEventHub()
+    order_id, token = str(uuid.uuid4()), str(uuid.uuid4())
+    placed = datetime.datetime.utcnow()
+
+    async def run():
+        try:
+            await redis_client.ping()
+        except RedisError:
+            return None
+        try:
+            await order_tracking.set_status(order_id, token, "Pending", "Pending", placed)
+            current = {
+                "order_id": order_id, "order_status": "Pending", "payment_status": "Pending",
+                "updated_at": placed.isoformat(timespec="microseconds"),
+            }
+            stream = hub.stream(current, token)
+            frames = [await stream.__anext__(), await stream.__anext__()]
+            await order_tracking.set_status(
+                order_id, token, "Processing", "Paid", placed + datetime.timedelta(seconds=1)
+            )
+            frames.append(await asyncio.wait_for(stream.__anext__(), 5))
+            await stream.aclose()
+            return frames, hub._count
+        finally:
+            await redis_client.connection_pool.disconnect()
+
+    result = asyncio.run(run())
+    if result is None:
+        pytest.skip("Redis not reachable")
+    frames, open_streams = result
+    assert frames[0].startswith(b"retry:")
+    assert b'"order_status":"Pending"' in frames[1]
+    assert b'"order_status":"Processing"' in frames[2]
+    assert open_streams == 0
@@ -0,0 +1,146 @@
+"""
+Outbox relay: delivery, retry with backoff, giving up, and disjoint claims
+between concurrent workers.
+
+Needs a Postgres database it may drop and recreate tables in:
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test \
+    python -m pytest app/tests/test_outbox.py
+"""
+import asyncio
+import datetime
+import os
+import uuid
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.orm import sessionmaker
+
+from app.services.outbox import retry_delay
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+
+if os.getenv("TEST_DATABASE_URL"):
+    from app.core.database import Base, LazySession, create_engine
+    from app.models.outbox import OutboxEvent
+    from app.services.outbox import OutboxRelay, handles
+
+
+@pytest.fixture(scope="module")
+def db():
+    loop = asyncio.new_event_loop()
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_size=5, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=LazySession, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    loop.run_until_complete(setup())
+    yield loop, session_factory
+    loop.run_until_complete(engine.dispose())
+    loop.close()
+
+
+def _add_events(loop, session_factory, event_type: str, count: int):
+    async def run():
+        async with session_factory() as session:
+            await session.execute(delete(OutboxEvent))
+            session.add_all(
+                OutboxEvent(event_type=event_type, aggregate_id=str(uuid.uuid4()), payload={"n": i})
+                for i in range(count)
+            )
+            await session.commit()
+
+    loop.run_until_complete(run())
+
+
+def _events(loop, session_factory):
+    async def run():
+        async with session_factory() as session:
+            return (await session.execute(select(OutboxEvent))).scalars().all()
+
+    return loop.run_until_complete(run())
+
+
+def test_retry_delay_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr("app.services.outbox.random.uniform", lambda low, high: high)
+    assert [retry_delay(attempts) for attempts in (1, 2, 3)] == [2.0, 4.0, 8.0]
+    assert retry_delay(50) == 600.0
+
+
+def test_delivers_in_order_and_marks_done(db):
+    loop, session_factory = db
+    seen = []
+
+    @handles("test.delivered")
+    async def record(event):
+        seen.append(event.payload["n"])
+
+    _add_events(loop, session_factory, "test.delivered", 5)
+
+    async def run():
+        relay = OutboxRelay(batch_size=3)
+        async with session_factory() as session:
+            return await relay.run_once(session), await relay.run_once(session)
+
+    assert loop.run_until_complete(run()) == (3, 2)
+    assert sorted(seen) == [0, 1, 2, 3, 4]
+    events = _events(loop, session_factory)
+    assert {event.status for event in events} == {"done"}
+    assert all(event.processed_at and event.attempts == 1 for event in events)
+
+
+def test_failures_back_off_then_fail(db):
+    loop, session_factory = db
+
+    @handles("test.broken")
+    async def broken(event):
+        raise RuntimeError("downstream unavailable")
+
+    _add_events(loop, session_factory, "test.broken", 1)
+    relay = OutboxRelay(max_attempts=2)
+
+    async def attempt():
+        async with session_factory() as session:
+            return await relay.run_once(session)
+
+    async def make_due():
+        async with session_factory() as session:
+            event = (await session.execute(select(OutboxEvent))).scalar_one()
+            event.available_at = datetime.datetime.utcnow()
+            await session.commit()
+
+    before = datetime.datetime.utcnow()
+    assert loop.run_until_complete(attempt()) == 1
+    [event] = _events(loop, session_factory)
+    assert (event.status, event.attempts) == ("pending", 1)
+    assert event.available_at > before
+    assert event.last_error == "RuntimeError: downstream unavailable"
+    # Not due again until the backoff has passed
+    assert loop.run_until_complete(attempt()) == 0
+
+    loop.run_until_complete(make_due())
+    assert loop.run_until_complete(attempt()) == 1
+    [event] = _events(loop, session_factory)
+    assert (event.status, event.attempts) == ("failed", 2)
+
+
+def test_concurrent_workers_claim_disjoint_batches(db):
+    loop, session_factory = db
+    _add_events(loop, session_factory, "test.claimed", 10)
+
+    async def run():
+        async with session_factory() as holder, session_factory() as worker:
+            # Another worker is mid-batch: it holds row locks on six events
+            held = (await holder.execute(
+                select(OutboxEvent.event_id).limit(6).with_for_update()
+            )).scalars().all()
+            claimed = await asyncio.wait_for(OutboxRelay(batch_size=10).claim(worker), 5)
+            await holder.rollback()
+            return set(held), {event.event_id for event in claimed}
+
+    held, claimed = loop.run_until_complete(run())
+    assert len(held) == 6 and len(claimed) == 4
+    assert not held & claimed
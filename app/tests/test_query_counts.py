@@ -0,0 +1,682 @@
+"""
+Statements issued per mutation endpoint, read from the Server-Timing header
+the request logging middleware adds. Guards the write paths against
+refresh-after-commit and re-select round trips creeping back in.
+
+Needs a Postgres database it may drop and recreate tables in:
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test \
+    python -m pytest app/tests/test_query_counts.py
+"""
+import asyncio
+import datetime
+import os
+import re
+import uuid
+from decimal import Decimal
+
+import httpx
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+
+if os.getenv("TEST_DATABASE_URL"):
+    from app.core.database import Base, LazySession, create_engine, get_db, get_read_db
+    from app.core.dependencies import get_current_active_user, get_current_admin_user, get_current_user_optional
+    from app.core.redis import redis_client
+    from app.main import app
+    from app.models.cart import CartItem
+    from app.models.order import Order, OrderItem
+    from app.models.outbox import OutboxEvent
+    from app.models.product import Category, Product, Subcategory
+    from app.models.user import Address, User
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Api:
+    def __init__(self, loop, client, session_factory, data):
+        self.loop = loop
+        self.client = client
+        self.session_factory = session_factory
+        self.data = data
+
+    def call(self, method: str, url: str, **kwargs):
+        """Send a request; return the response and the number of SQL statements it ran."""
+        response = self.loop.run_until_complete(self.client.request(method, url, **kwargs))
+        return response, int(QUERIES.search(response.headers["server-timing"]).group(1))
+
+    def add(self, *objects):
+        async def run():
+            async with self.session_factory() as session:
+                session.add_all(objects)
+                await session.commit()
+
+        self.loop.run_until_complete(run())
+
+    def get(self, model, key):
+        async def run():
+            async with self.session_factory() as session:
+                return await session.get(model, key)
+
+        return self.loop.run_until_complete(run())
+
+    def outbox(self, order_id: str):
+        """Types of the outbox events written for an order, oldest first."""
+        async def run():
+            async with self.session_factory() as session:
+                return list((await session.execute(
+                    select(OutboxEvent.event_type)
+                    .where(OutboxEvent.aggregate_id == order_id)
+                    .order_by(OutboxEvent.created_at)
+                )).scalars())
+
+        return self.loop.run_until_complete(run())
+
+
+@pytest.fixture(scope="module")
+def api():
+    loop = asyncio.new_event_loop()
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_size=5, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=LazySession, expire_on_commit=False)
+
+    user = User(phone_number=f"+1{uuid.uuid4().int % 10**10:010d}", role="user", is_active=True)
+    admin = User(username=f"admin-{uuid.uuid4().hex[:8]}", role="admin", is_active=True)
+    category = Category(category_name="Counts", is_active=True)
+    subcategory = Subcategory(subcategory_name="Counts", category=category)
+    products = [
+        Product(
+            product_name=f"Product {i}", description="", price=Decimal("9.99"), stock_quantity=1000,
+            category=category, subcategory=subcategory, is_active=True,
+        )
+        for i in range(2)
+    ]
+    address = Address(user=user, street_address="1 Main St", city="City", state="State",
+                      postal_code="00000", country="Country")
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add_all([user, admin, category, subcategory, address, *products])
+            await session.commit()
+
+    loop.run_until_complete(setup())
+
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides.update({
+        get_db: override_db,
+        get_read_db: override_db,
+        get_current_user_optional: lambda: user,
+        get_current_active_user: lambda: user,
+        get_current_admin_user: lambda: admin,
+    })
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    data = {
+        "user": user,
+        "category_id": category.category_id,
+        "subcategory_id": subcategory.subcategory_id,
+        "product_ids": [product.product_id for product in products],
+        "address_id": address.address_id,
+    }
+    yield Api(loop, client, session_factory, data)
+
+    app.dependency_overrides.clear()
+    loop.run_until_complete(client.aclose())
+    loop.run_until_complete(engine.dispose())
+    # Pooled Redis connections are bound to this loop; don't hand them to the next module.
+    loop.run_until_complete(redis_client.connection_pool.disconnect())
+    loop.close()
+
+
+def test_cart_add_new_and_existing_item(api):
+    guest = uuid.uuid4().hex
+    body = {"product_id": api.data["product_ids"][0], "quantity": 1}
+    app.dependency_overrides[get_current_user_optional] = lambda: None
+    try:
+        response, queries = api.call("POST", f"/api/v1/cart/add?guest_id={guest}", json=body)
+        assert response.status_code == 201
+        assert queries == 1
+
+        response, queries = api.call("POST", f"/api/v1/cart/add?guest_id={guest}", json=body)
+        assert response.status_code == 201
+        assert response.json()["quantity"] == 2
+        assert queries == 1
+
+        response, queries = api.call(
+            "POST", f"/api/v1/cart/add?guest_id={guest}", json={"product_id": "missing", "quantity": 1}
+        )
+        assert response.status_code == 400
+    finally:
+        app.dependency_overrides[get_current_user_optional] = lambda: api.data["user"]
+
+
+def test_cart_update_and_remove(api):
+    item = CartItem(user_id=api.data["user"].user_id, product_id=api.data["product_ids"][1], quantity=1)
+    api.add(item)
+
+    response, queries = api.call("PUT", f"/api/v1/cart/{item.cart_item_id}", json={"quantity": 3})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 3
+    assert response.json()["product"]["product_name"] == "Product 1"
+    assert queries == 1
+
+    response, queries = api.call("DELETE", f"/api/v1/cart/{item.cart_item_id}")
+    assert response.status_code == 204
+    assert queries == 1
+
+    response, _ = api.call("DELETE", f"/api/v1/cart/{item.cart_item_id}")
+    assert response.status_code == 404
+
+
+def test_address_create_update_delete(api):
+    user_id = api.data["user"].user_id
+    body = {"street_address": "2 Side St", "city": "City", "state": "State", "postal_code": "11111", "country": "Country"}
+
+    response, queries = api.call("POST", f"/api/v1/address/?user_id={user_id}", json=body)
+    assert response.status_code == 201
+    assert queries == 1
+    address_id = response.json()["address_id"]
+
+    response, queries = api.call("PUT", f"/api/v1/address/{address_id}?user_id={user_id}", json={"city": "Town"})
+    assert response.status_code == 200
+    assert response.json()["city"] == "Town"
+    assert queries == 1
+
+    response, queries = api.call("DELETE", f"/api/v1/address/{address_id}?user_id={user_id}")
+    assert response.status_code == 204
+    assert queries == 1
+
+
+def test_category_and_subcategory_writes(api):
+    response, queries = api.call("POST", "/api/v1/category/", json={"category_name": "New"})
+    assert response.status_code == 201
+    assert queries == 1
+    category_id = response.json()["category_id"]
+
+    response, queries = api.call(
+        "POST", f"/api/v1/category/{category_id}/subcategories",
+        json={"subcategory_name": "Sub", "category_id": category_id},
+    )
+    assert response.status_code == 201
+    assert queries == 1
+    subcategory_id = response.json()["subcategory_id"]
+
+    response, queries = api.call("PUT", f"/api/v1/category/subcategories/{subcategory_id}", json={"subcategory_name": "Renamed"})
+    assert response.status_code == 200
+    assert response.json()["subcategory_name"] == "Renamed"
+    assert queries == 1
+
+    # The response embeds subcategories and products: UPDATE plus one load for each.
+    response, queries = api.call("PUT", f"/api/v1/category/{category_id}", json={"description": "Updated"})
+    assert response.status_code == 200
+    assert [s["subcategory_name"] for s in response.json()["subcategories"]] == ["Renamed"]
+    assert queries == 3
+
+    response, queries = api.call("DELETE", f"/api/v1/category/subcategories/{subcategory_id}")
+    assert response.status_code == 204
+    assert queries == 1
+
+
+def test_delete_category_and_subcategory_with_products(api):
+    category = Category(category_name="Doomed", is_active=True)
+    subcategory = Subcategory(subcategory_name="Doomed", category=category)
+    product = Product(
+        product_name="Orphan", description="", price=Decimal("1.00"), stock_quantity=1,
+        category=category, subcategory=subcategory, is_active=False,
+    )
+    api.add(category, subcategory, product)
+
+    # The products are detached in the same statement instead of failing the delete
+    response, queries = api.call("DELETE", f"/api/v1/category/subcategories/{subcategory.subcategory_id}")
+    assert response.status_code == 204
+    assert queries == 1
+    assert api.get(Product, product.product_id).subcategory_id is None
+
+    other = Subcategory(subcategory_name="Other", category_id=category.category_id)
+    api.add(other)
+    response, queries = api.call("DELETE", f"/api/v1/category/{category.category_id}")
+    assert response.status_code == 204
+    assert queries == 1
+    assert api.get(Category, category.category_id) is None
+    assert api.get(Subcategory, other.subcategory_id).category_id is None
+    assert api.get(Product, product.product_id).category_id is None
+
+    response, _ = api.call("DELETE", f"/api/v1/category/{category.category_id}")
+    assert response.status_code == 404
+
+
+def test_product_update(api):
+    product_id = api.data["product_ids"][1]
+    response, queries = api.call("PUT", f"/api/v1/products/{product_id}", data={"price": "12.50"})
+    assert response.status_code == 200
+    assert response.json()["price"] == 12.5
+    assert response.json()["product_name"] == "Product 1"
+    assert queries == 1
+
+
+def test_order_create_confirm_cancel(api):
+    product_ids = api.data["product_ids"]
+    body = {
+        "address_id": api.data["address_id"],
+        "payment_method": "Cash on Delivery",
+        "items": [{"product_id": product_ids[0], "quantity": 2}, {"product_id": product_ids[1], "quantity": 1}],
+    }
+
+    # Lock products, insert the order, its items and its outbox event, clear the cart.
+    response, queries = api.call("POST", "/api/v1/orders/", json=body)
+    assert response.status_code == 201
+    assert len(response.json()["items"]) == 2
+    assert queries == 5
+    order_id = response.json()["order_id"]
+    stock_before = api.get(Product, product_ids[0]).stock_quantity
+
+    response, queries = api.call("POST", f"/api/v1/orders/{order_id}/confirm")
+    assert response.json()["status"] == "confirmed"
+    assert queries == 1
+    assert api.get(Product, product_ids[0]).stock_quantity == stock_before - 2
+
+    response, queries = api.call("POST", f"/api/v1/orders/{order_id}/confirm")
+    assert response.json()["message"] == "Order already paid"
+
+    response, queries = api.call("DELETE", f"/api/v1/orders/{order_id}")
+    assert response.status_code == 204
+    assert queries == 1
+    assert api.get(Product, product_ids[0]).stock_quantity == stock_before
+    assert api.get(Order, order_id).order_status == "Cancelled"
+    assert api.outbox(order_id) == ["order.created", "order.paid", "order.cancelled"]
+
+    response, _ = api.call("DELETE", f"/api/v1/orders/{order_id}")
+    assert response.status_code == 400
+    assert len(api.outbox(order_id)) == 3
+
+
+def test_order_confirm_with_insufficient_stock_refunds(api):
+    product_id = api.data["product_ids"][0]
+    order = Order(
+        user_id=api.data["user"].user_id, address_id=api.data["address_id"], total_amount=Decimal("1"),
+        order_status="Pending", payment_status="Pending", payment_method="Card",
+        items=[OrderItem(product_id=product_id, quantity=10**6, price_at_purchase=Decimal("1"))],
+    )
+    api.add(order)
+    stock_before = api.get(Product, product_id).stock_quantity
+
+    response, _ = api.call("POST", f"/api/v1/orders/{order.order_id}/confirm")
+    assert response.json()["status"] == "refund_initiated"
+    assert api.get(Product, product_id).stock_quantity == stock_before
+    assert api.get(Order, order.order_id).payment_status == "Refunded"
+    # The paid event was rolled back with the claim
+    assert api.outbox(order.order_id) == ["order.refunded"]
+
+
+def test_order_status_update(api):
+    order = Order(
+        user_id=api.data["user"].user_id, address_id=api.data["address_id"], total_amount=Decimal("1"),
+        order_status="Processing", payment_status="Paid", payment_method="Card",
+        items=[OrderItem(product_id=api.data["product_ids"][1], quantity=1, price_at_purchase=Decimal("1"))],
+    )
+    api.add(order)
+
+    # UPDATE ... RETURNING, the items the response includes and the outbox event.
+    response, queries = api.call("PATCH", f"/api/v1/orders/{order.order_id}/status", json={"order_status": "Shipped"})
+    assert response.status_code == 200
+    assert response.json()["order_status"] == "Shipped"
+    assert len(response.json()["items"]) == 1
+    assert queries == 3
+    assert api.outbox(order.order_id) == ["order.status_changed"]
+
+
+def test_product_list_and_cart_reads(api):
+    # Category and subcategory names come from joins, not per-relationship loads.
+    response, queries = api.call("GET", f"/api/v1/products/?category_id={api.data['category_id']}&page_size=100")
+    assert response.status_code == 200
+    assert {p["category_name"] for p in response.json()} == {"Counts"}
+    assert queries == 1
+
+    guest = uuid.uuid4().hex
+    api.add(CartItem(guest_id=guest, product_id=api.data["product_ids"][0], quantity=2))
+    app.dependency_overrides[get_current_user_optional] = lambda: None
+    try:
+        response, queries = api.call("GET", f"/api/v1/cart/?guest_id={guest}")
+    finally:
+        app.dependency_overrides[get_current_user_optional] = lambda: api.data["user"]
+    assert response.status_code == 200
+    assert response.json()["total_items"] == 2
+    assert response.json()["total_amount"] == "19.98"
+    assert response.json()["items"][0]["product"]["product_name"] == "Product 0"
+    assert queries == 1
+
+
+def test_conditional_get_skips_database(api):
+    from redis.exceptions import RedisError
+
+    from app.core.http_cache import PRODUCTS, bump_catalog_version
+    from app.core.redis import redis_client
+
+    try:
+        api.loop.run_until_complete(redis_client.ping())
+    except RedisError:
+        pytest.skip("Redis not reachable")
+
+    url = f"/api/v1/products/{api.data['product_ids'][0]}"
+    response, queries = api.call("GET", url)
+    assert response.status_code == 200
+    assert "stale-while-revalidate" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+    assert queries > 0
+
+    response, queries = api.call("GET", url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert queries == 0
+
+    # A catalog write changes the ETag.
+    api.loop.run_until_complete(bump_catalog_version(PRODUCTS))
+    response, _ = api.call("GET", url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    response, _ = api.call("GET", "/api/v1/products/?page_size=5")
+    assert response.headers["etag"]
+
+
+def test_category_tree_snapshot(api):
+    import gzip
+
+    from redis.exceptions import RedisError
+
+    from app.core.redis import redis_client
+
+    try:
+        api.loop.run_until_complete(redis_client.ping())
+    except RedisError:
+        pytest.skip("Redis not reachable")
+
+    response, _ = api.call("POST", "/api/v1/category/", json={"category_name": "Tree"})
+    category_id = response.json()["category_id"]
+
+    # Built once (categories, then subcategories) ...
+    response, queries = api.call("GET", "/api/v1/category/tree", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert queries == 2
+    tree = response.json()
+    assert category_id in [node["category_id"] for node in tree]
+    counts = next(node for node in tree if node["category_name"] == "Counts")
+    assert counts["product_count"] == 2
+    assert counts["subcategories"][0]["product_count"] == 2
+
+    # ... then served from the snapshot, precompressed.
+    response, queries = api.call("GET", "/api/v1/category/tree", headers={"Accept-Encoding": "gzip"})
+    assert queries == 0
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == tree
+
+    response, queries = api.call(
+        "GET", "/api/v1/category/tree",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+    assert queries == 0
+
+    # A category write invalidates it.
+    api.call("PUT", f"/api/v1/category/{category_id}", json={"category_name": "Renamed tree"})
+    response, queries = api.call("GET", "/api/v1/category/tree", headers={"Accept-Encoding": "identity"})
+    assert queries == 2
+    assert "Renamed tree" in [node["category_name"] for node in response.json()]
+
+
+def test_order_history_pages(api):
+    user_id = api.data["user"].user_id
+    product_ids = api.data["product_ids"]
+    now = datetime.datetime.utcnow()
+    orders = [
+        Order(
+            user_id=user_id, address_id=api.data["address_id"], total_amount=Decimal("1"),
+            order_status="Pending", payment_status="Pending", payment_method="Card",
+            created_at=now + datetime.timedelta(days=365, minutes=i),
+            items=[OrderItem(product_id=product_id, quantity=1, price_at_purchase=Decimal("1"))
+                   for product_id in product_ids[:1 + i % 2]],
+        )
+        for i in range(5)
+    ]
+    api.add(*orders)
+    newest_first = [order.order_id for order in reversed(orders)]
+
+    # The page of orders, then every item of the page in one IN query.
+    response, queries = api.call("GET", "/api/v1/orders/?limit=3")
+    assert response.status_code == 200
+    assert [o["order_id"] for o in response.json()] == newest_first[:3]
+    assert [len(o["items"]) for o in response.json()] == [1, 2, 1]
+    assert queries == 2
+
+    cursor = response.headers["x-next-cursor"]
+    response, queries = api.call("GET", f"/api/v1/orders/?limit=3&cursor={cursor}")
+    assert [o["order_id"] for o in response.json()][:2] == newest_first[3:]
+    assert queries == 2
+
+    # Item counts come from an aggregate in the same query.
+    response, queries = api.call("GET", "/api/v1/orders/summary?limit=2")
+    assert [(o["order_id"], o["items_count"]) for o in response.json()] == [
+        (newest_first[0], 1), (newest_first[1], 2)
+    ]
+    assert queries == 1
+
+    cursor = response.headers["x-next-cursor"]
+    response, _ = api.call("GET", f"/api/v1/orders/summary?limit=2&cursor={cursor}")
+    assert [o["order_id"] for o in response.json()] == newest_first[2:4]
+
+    response, _ = api.call("GET", "/api/v1/orders/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+    response, queries = api.call("GET", f"/api/v1/orders/{newest_first[0]}")
+    assert response.status_code == 200
+    assert queries == 2
+
+
+def test_order_tracking_from_cache(api, monkeypatch):
+    from redis.exceptions import RedisError
+
+    from app.config import settings
+
+    try:
+        api.loop.run_until_complete(redis_client.ping())
+    except RedisError:
+        pytest.skip("Redis not reachable")
+
+    body = {
+        "address_id": api.data["address_id"],
+        "payment_method": "Card",
+        "items": [{"product_id": api.data["product_ids"][0], "quantity": 1}],
+    }
+    response, _ = api.call("POST", "/api/v1/orders/", json=body)
+    order_id = response.json()["order_id"]
+    token = api.get(Order, order_id).tracking_token
+    url = f"/api/v1/orders/track/{token}"
+
+    # The first poll builds the snapshot; later ones never touch the database.
+    response, queries = api.call("GET", url)
+    assert response.status_code == 200
+    assert response.json()["order_status"] == "Pending"
+    assert len(response.json()["items"]) == 1
+    assert response.json()["address"]["city"] == "City"
+    assert queries > 0
+
+    response, queries = api.call("GET", url)
+    assert response.json()["order_status"] == "Pending"
+    assert queries == 0
+
+    # Status changes are published by the write paths.
+    api.call("POST", f"/api/v1/orders/{order_id}/confirm")
+    response, queries = api.call("GET", url)
+    assert (response.json()["order_status"], response.json()["payment_status"]) == ("Processing", "Paid")
+    assert queries == 0
+
+    api.call("PATCH", f"/api/v1/orders/{order_id}/status", json={"order_status": "Shipped"})
+    response, queries = api.call("GET", url)
+    assert response.json()["order_status"] == "Shipped"
+    assert [step["completed"] for step in response.json()["delivery_steps"]] == [True, True, True, False]
+    assert queries == 0
+
+    # Unknown tokens are remembered too.
+    missing = f"/api/v1/orders/track/{uuid.uuid4()}"
+    response, _ = api.call("GET", missing)
+    assert response.status_code == 404
+    response, queries = api.call("GET", missing)
+    assert response.status_code == 404
+    assert queries == 0
+
+    monkeypatch.setattr(settings, "tracking_rate_limit", 3)
+    statuses = [api.call("GET", url)[0] for _ in range(3)]
+    assert statuses[-1].status_code == 429
+    assert int(statuses[-1].headers["retry-after"]) > 0
+
+
+def test_idempotent_create_and_confirm(api, monkeypatch):
+    from redis.exceptions import RedisError
+
+    from app.core import idempotency
+
+    try:
+        api.loop.run_until_complete(redis_client.ping())
+    except RedisError:
+        pytest.skip("Redis not reachable")
+
+    body = {
+        "address_id": api.data["address_id"],
+        "payment_method": "Card",
+        "items": [{"product_id": api.data["product_ids"][1], "quantity": 1}],
+    }
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    # Concurrent duplicates: one creates the order, the other waits and replays it.
+    async def post_twice():
+        return await asyncio.gather(*(
+            api.client.post("/api/v1/orders/", json=body, headers=headers) for _ in range(2)
+        ))
+
+    responses = api.loop.run_until_complete(post_twice())
+    assert [r.status_code for r in responses] == [201, 201]
+    assert responses[0].json() == responses[1].json()
+    assert sorted(r.headers.get("idempotent-replayed", "") for r in responses) == ["", "true"]
+    order_id = responses[0].json()["order_id"]
+
+    response, queries = api.call("POST", "/api/v1/orders/", json=body, headers=headers)
+    assert response.json()["order_id"] == order_id
+    assert queries == 0
+
+    response, _ = api.call("POST", "/api/v1/orders/", json=dict(body, payment_method="Cash"), headers=headers)
+    assert response.status_code == 422
+
+    # A redelivered payment webhook doesn't reach confirm_order again.
+    webhook = {"Idempotency-Key": f"evt-{uuid.uuid4().hex}"}
+    response, queries = api.call("POST", f"/api/v1/orders/{order_id}/confirm", headers=webhook)
+    assert response.json()["status"] == "confirmed"
+    assert queries == 1
+    response, queries = api.call("POST", f"/api/v1/orders/{order_id}/confirm", headers=webhook)
+    assert response.json()["status"] == "confirmed"
+    assert response.headers["idempotent-replayed"] == "true"
+    assert queries == 0
+
+    # Without Redis the idempotency_keys table takes over.
+    async def redis_down(*args):
+        raise RedisError("down")
+
+    monkeypatch.setattr(idempotency.redis_store, "begin", redis_down)
+    monkeypatch.setattr(idempotency.database_store, "session_factory", api.session_factory)
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    first, _ = api.call("POST", "/api/v1/orders/", json=body, headers=headers)
+    second, _ = api.call("POST", "/api/v1/orders/", json=body, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.json()["order_id"] == first.json()["order_id"]
+    assert second.headers["idempotent-replayed"] == "true"
+
+
+def test_database_idempotency_lock_is_released_only_by_its_holder(api, monkeypatch):
+    from app.config import settings
+    from app.core import idempotency
+
+    store = idempotency.DatabaseIdempotencyStore(api.session_factory)
+    key = f"test:owner:{uuid.uuid4().hex}"
+
+    def begin(token):
+        return api.loop.run_until_complete(store.begin(key, "fingerprint", token))
+
+    # The first request's lock expires and a retry takes the key over
+    monkeypatch.setattr(settings, "idempotency_lock_seconds", -1)
+    assert begin("first") is True
+    monkeypatch.setattr(settings, "idempotency_lock_seconds", 60)
+    assert begin("retry") is True
+
+    # The first request failing late must not free the retry's lock
+    api.loop.run_until_complete(store.release(key, "first"))
+    assert begin("third") is False
+    api.loop.run_until_complete(store.release(key, "retry"))
+    assert begin("third") is True
+
+
+def test_expired_idempotency_keys_are_purged(api):
+    from app.core import idempotency
+    from app.models.idempotency import IdempotencyKey
+
+    now = datetime.datetime.utcnow()
+    prefix = f"purge:{uuid.uuid4().hex}"
+
+    def record(name, expires_in):
+        return IdempotencyKey(
+            key=f"{prefix}:{name}", fingerprint="fingerprint", status_code=201, body=b"{}",
+            content_type="application/json", locked_until=now, created_at=now,
+            expires_at=now + datetime.timedelta(seconds=expires_in),
+        )
+
+    api.add(*(record(f"expired-{i}", -60) for i in range(3)), record("live", 3600))
+    store = idempotency.DatabaseIdempotencyStore(api.session_factory)
+    assert api.loop.run_until_complete(store.purge_expired(batch_size=2)) >= 3
+    assert api.get(IdempotencyKey, f"{prefix}:live") is not None
+    assert api.get(IdempotencyKey, f"{prefix}:expired-0") is None
+
+
+def test_guest_checkout_refuses_idempotency_key(api):
+    body = {
+        "address_id": api.data["address_id"],
+        "payment_method": "Card",
+        "phone_number": f"+1{uuid.uuid4().int % 10**10:010d}",
+        "items": [{"product_id": api.data["product_ids"][1], "quantity": 1}],
+    }
+    app.dependency_overrides[get_current_user_optional] = lambda: None
+    try:
+        # Guests share no owner to scope a key to: a replay could leak another guest's order.
+        response, queries = api.call("POST", "/api/v1/orders/", json=body, headers={"Idempotency-Key": "checkout-1"})
+        assert response.status_code == 400
+        assert queries == 0
+
+        response, _ = api.call("POST", "/api/v1/orders/", json=body)
+        assert response.status_code == 201
+    finally:
+        app.dependency_overrides[get_current_user_optional] = lambda: api.data["user"]
+
+
+def test_admin_overview_loads_panels_concurrently_then_from_cache(api, monkeypatch):
+    from app.services import admin as admin_service
+
+    monkeypatch.setattr(admin_service, "AnalyticsSessionLocal", api.session_factory)
+    monkeypatch.setattr(admin_service, "AsyncSessionLocal", api.session_factory)
+    panels = ["dashboard", "activity", "system_health", "revenue", "top_products"]
+    api.loop.run_until_complete(redis_client.delete(*(admin_service.OVERVIEW_CACHE_KEY.format(name) for name in panels)))
+
+    # One statement per panel, two for the health check
+    response, queries = api.call("GET", "/api/v1/admin/overview")
+    assert response.status_code == 200
+    assert list(response.json()) == panels
+    assert response.json()["dashboard"]["total_products"] == 2
+    assert queries == 6
+
+    cached, queries = api.call("GET", "/api/v1/admin/overview")
+    assert cached.json() == response.json()
+    assert queries == 0
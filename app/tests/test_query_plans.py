@@ -0,0 +1,232 @@
+"""
+Query-plan check for the service layer.
+
+Seeds a disposable Postgres database with synthetic data, runs every service
+call below, captures each statement it sends and EXPLAINs it with the same
+parameters. A sequential scan over a table with at least LARGE_TABLE_ROWS
+rows fails the test unless the scenario lists that table as an expected
+full scan (whole-table aggregates, for instance).
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test \
+    python -m pytest app/tests/test_query_plans.py
+"""
+import asyncio
+import json
+import os
+
+import pytest
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import sessionmaker
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+
+if os.getenv("TEST_DATABASE_URL"):
+    from app.core.database import Base, LazySession, create_engine
+    from app.core.redis import redis_client
+    from app.models.cart import CartItem
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.models.user import Address, User
+    from app.schemas.address import AddressCreate, AddressUpdate
+    from app.schemas.cart import CartItemAdd, CartItemUpdate
+    from app.schemas.orders import OrderCreate, OrderItemCreate, OrderStatus, OrderStatusUpdate
+    from app.schemas.products import ProductUpdate
+    from app.seeder.generator import GeneratorConfig, generate_synthetic_data
+    from app.services.address import address_service
+    from app.services.admin import AdminService
+    from app.services.cart import cart_service
+    from app.services.category import CategoryService, SubcategoryService
+    from app.services.orders import order_service
+    from app.services.products import ProductService
+
+LARGE_TABLE_ROWS = 2000
+
+
+class StatementCapture:
+    """Records the statements an engine sends while `active`."""
+
+    def __init__(self, engine):
+        self.active = False
+        self.statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany:
+            self.statements.append((statement, tuple(parameters or ())))
+
+
+def seq_scans(plan: dict):
+    """Relation names of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+@pytest.fixture(scope="module")
+def env():
+    loop = asyncio.new_event_loop()
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_size=2, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=LazySession, expire_on_commit=False)
+    capture = StatementCapture(engine)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        config = GeneratorConfig(
+            categories=50, subcategories_per_category=5, products=5000, users=5000,
+            orders=20000, offers=10,
+        )
+        async with session_factory() as session:
+            await generate_synthetic_data(session, config)
+            await session.execute(update(Product).values(stock_quantity=1_000_000, is_active=True))
+            await session.commit()
+        async with engine.begin() as conn:
+            # Committed, or the collected statistics are rolled back with the transaction.
+            await conn.exec_driver_sql("ANALYZE")
+            large = (await conn.exec_driver_sql(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %d" % LARGE_TABLE_ROWS
+            )).scalars().all()
+
+        async with session_factory() as session:
+            cart_user = (await session.execute(
+                select(CartItem.user_id).where(CartItem.is_active == True).limit(1)
+            )).scalar_one()
+            user_id, address_id = (await session.execute(
+                select(Address.user_id, Address.address_id).where(Address.is_default == True).limit(1)
+            )).one()
+            products = (await session.execute(
+                select(Product.product_id, Product.category_id, Product.subcategory_id).limit(5)
+            )).all()
+            order = (await session.execute(
+                select(Order.order_id, Order.tracking_token).where(Order.tracking_token.isnot(None)).limit(1)
+            )).one_or_none()
+        return set(large), {
+            "cart_user": cart_user,
+            "user_id": user_id,
+            "address_id": address_id,
+            "product_ids": [p.product_id for p in products],
+            "category_id": products[0].category_id,
+            "subcategory_id": products[0].subcategory_id,
+            "tracking_token": order.tracking_token if order else "missing",
+        }
+
+    large_tables, data = loop.run_until_complete(setup())
+    yield loop, session_factory, capture, large_tables, data
+    loop.run_until_complete(engine.dispose())
+    # Pooled Redis connections are bound to this loop; don't hand them to the next module.
+    loop.run_until_complete(redis_client.connection_pool.disconnect())
+    loop.close()
+
+
+def _order(data):
+    items = [OrderItemCreate(product_id=product_id, quantity=1) for product_id in data["product_ids"][:3]]
+    return OrderCreate(address_id=data["address_id"], items=items, payment_method="Credit Card")
+
+
+async def _created_order(db, data):
+    return await order_service.create_order(db, data["user_id"], _order(data))
+
+
+# (name, call(db, data), tables a full scan is expected on)
+SCENARIOS = [
+    ("products.list", lambda db, d: ProductService.get_product_rows(db, page=3, page_size=20), {"products"}),
+    ("products.list_by_category", lambda db, d: ProductService.get_product_rows(db, category=d["category_id"]), set()),
+    ("products.list_by_subcategory", lambda db, d: ProductService.get_product_rows(db, subcategory=d["subcategory_id"]), set()),
+    ("products.orm_list_by_category", lambda db, d: ProductService.get_all_products(db, category=d["category_id"]), set()),
+    ("products.search", lambda db, d: ProductService.get_product_rows(db, search="Pro"), {"products"}),
+    ("products.get", lambda db, d: ProductService.get_product_by_id(db, d["product_ids"][0]), set()),
+    ("products.get_row", lambda db, d: ProductService.get_product_row(db, d["product_ids"][0]), set()),
+    ("products.update", lambda db, d: ProductService.update_product(db, d["product_ids"][0], ProductUpdate(price=10)), set()),
+    # The response embeds every product of every listed category.
+    ("categories.list", lambda db, d: CategoryService.get_all_categories(db), {"products"}),
+    ("categories.get", lambda db, d: CategoryService.get_category_by_id(db, d["category_id"]), set()),
+    ("categories.products", lambda db, d: CategoryService.get_category_products(db, d["category_id"]), set()),
+    # Counts every active product; rebuilt only when the catalog changes.
+    ("categories.tree", lambda db, d: CategoryService.get_category_tree(db), {"products"}),
+    ("subcategories.list", lambda db, d: SubcategoryService.get_all_subcategories(db, category_id=d["category_id"]), set()),
+    ("cart.get", lambda db, d: cart_service.get_cart_summary_rows(db, user_id=d["cart_user"]), set()),
+    ("cart.add", lambda db, d: cart_service.add_item_to_cart(
+        db, d["cart_user"], CartItemAdd(product_id=d["product_ids"][1], quantity=1)
+    ), set()),
+    ("cart.update", lambda db, d: cart_service.update_cart_item(
+        db, "missing", CartItemUpdate(quantity=2), d["cart_user"]
+    ), set()),
+    ("cart.remove", lambda db, d: cart_service.remove_cart_item(db, "missing", d["cart_user"]), set()),
+    ("addresses.list", lambda db, d: address_service.get_multi_by_user(db, d["user_id"]), set()),
+    ("addresses.create", lambda db, d: address_service.create(
+        db, obj_in=AddressCreate(
+            street_address="1 Main St", city="City", state="State", postal_code="00000", country="Country", is_default=True
+        ),
+        user_id=d["user_id"],
+    ), set()),
+    ("addresses.update", lambda db, d: address_service.update(
+        db, id=d["address_id"], obj_in=AddressUpdate(is_default=True), user_id=d["user_id"]
+    ), set()),
+    ("orders.create", lambda db, d: _created_order(db, d), set()),
+    ("orders.confirm", lambda db, d: _confirm(db, d), set()),
+    ("orders.cancel", lambda db, d: _cancel(db, d), set()),
+    ("orders.status", lambda db, d: _status(db, d), set()),
+    ("orders.history", lambda db, d: order_service.get_multi_by_user(db, d["user_id"], limit=20), set()),
+    ("orders.summaries", lambda db, d: order_service.get_order_summaries(db, d["user_id"], limit=20), set()),
+    ("orders.admin_list", lambda db, d: order_service.get_multi_by_user(db, is_admin=True, limit=20), set()),
+    ("orders.track", lambda db, d: order_service.get_by_tracking_token(db, d["tracking_token"]), set()),
+    # Whole-table totals for the dashboard.
+    ("admin.dashboard", lambda db, d: AdminService.get_dashboard_stats(db), {"users", "products", "orders"}),
+    ("admin.recent_activity", lambda db, d: AdminService.get_recent_activity(db), {"users"}),
+    ("admin.orders_summary", lambda db, d: AdminService.get_orders_summary(db), set()),
+    # Ranks every customer by spend.
+    ("admin.users_summary", lambda db, d: AdminService.get_users_summary(db), {"users", "orders"}),
+    ("admin.revenue", lambda db, d: AdminService.get_revenue_analytics(db), set()),
+    # Totals every order line ever sold, per product.
+    ("admin.top_products", lambda db, d: AdminService.get_top_products(db), {"order_items", "products"}),
+]
+
+
+async def _confirm(db, data):
+    order = await _created_order(db, data)
+    return await order_service.confirm_order(db, order.order_id)
+
+
+async def _cancel(db, data):
+    order = await _created_order(db, data)
+    return await order_service.cancel_order(db, order.order_id, is_admin=True)
+
+
+async def _status(db, data):
+    order = await _created_order(db, data)
+    return await order_service.update_order_status(
+        db, order.order_id, OrderStatusUpdate(order_status=OrderStatus.SHIPPED)
+    )
+
+
+@pytest.mark.parametrize("name, call, expected_full_scans", SCENARIOS, ids=[s[0] for s in SCENARIOS])
+def test_no_unexpected_sequential_scans(env, name, call, expected_full_scans):
+    loop, session_factory, capture, large_tables, data = env
+
+    async def run():
+        async with session_factory() as db:
+            capture.statements = []
+            capture.active = True
+            try:
+                await call(db, data)
+            finally:
+                capture.active = False
+            await db.rollback()
+
+        problems = []
+        async with session_factory() as db:
+            conn = await db.connection()
+            for statement, parameters in capture.statements:
+                if not statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+                    continue
+                plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar_one()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                for relation in seq_scans(plan[0]["Plan"]):
+                    if relation in large_tables and relation not in expected_full_scans:
+                        problems.append(f"Seq Scan on {relation}: {' '.join(statement.split())[:300]}")
+        return problems
+
+    problems = loop.run_until_complete(run())
+    assert not problems, "\n".join(problems)
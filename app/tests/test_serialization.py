@@ -0,0 +1,48 @@
+"""
+The list endpoints serialize plain row dicts with prebuilt TypeAdapters
+instead of going through their response_model. These check the JSON is
+the same as the response_model would have produced.
+"""
+import datetime
+import json
+from decimal import Decimal
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.schemas.cart import CartSummary, cart_summary_adapter
+from app.schemas.products import ProductBase, product_list_adapter
+
+NOW = datetime.datetime(2025, 1, 2, 3, 4, 5, 678901)
+
+
+def test_product_rows_match_response_model():
+    rows = [
+        {
+            "product_id": "p1", "product_name": "Tea", "price": 9.99, "description": "Green",
+            "image_url": None, "category_id": "c1", "category_name": "Drinks",
+            "subcategory_id": None, "subcategory_name": None,
+        },
+    ]
+    expected = TypeAdapter(List[ProductBase]).dump_json([ProductBase(**row) for row in rows])
+    assert json.loads(product_list_adapter.dump_json(rows)) == json.loads(expected)
+
+
+def test_cart_summary_rows_match_response_model():
+    summary = {
+        "items": [
+            {
+                "cart_item_id": "i1", "user_id": "u1", "guest_id": None, "product_id": "p1",
+                "quantity": 2, "added_at": NOW, "updated_at": NOW,
+                "product": {
+                    "product_id": "p1", "product_name": "Tea", "price": Decimal("9.99"),
+                    "image_url": None, "is_active": True,
+                },
+                "subtotal": Decimal("19.98"),
+            },
+        ],
+        "total_items": 2,
+        "total_amount": Decimal("19.98"),
+    }
+    expected = CartSummary(**summary).model_dump_json()
+    assert json.loads(cart_summary_adapter.dump_json(summary)) == json.loads(expected)
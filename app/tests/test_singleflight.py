@@ -0,0 +1,151 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+from app.core.singleflight import flights, single_flight
+
+# Never connected to: only the engine a session is bound to matters here
+primary = create_async_engine("postgresql+asyncpg://localhost/primary")
+replica = create_async_engine("postgresql+asyncpg://localhost/replica")
+
+
+class Catalog:
+    def __init__(self):
+        self.calls = []
+        self.release = None
+
+    @single_flight(name="test.lookup")
+    async def lookup(self, db, product_id: str, fields=("name",)):
+        self.calls.append(product_id)
+        await self.release.wait()
+        if product_id == "missing":
+            raise LookupError(product_id)
+        return {"product_id": product_id, "fields": list(fields)}
+
+
+def _count(result: str) -> float:
+    return SINGLEFLIGHT_CALLS.labels(call="test.lookup", result=result)._value.get()
+
+
+def _run(scenario):
+    async def run():
+        catalog = Catalog()
+        catalog.release = asyncio.Event()
+        return await scenario(catalog)
+
+    return asyncio.run(run())
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    executed, coalesced = _count("executed"), _count("coalesced")
+
+    async def scenario(catalog):
+        calls = [
+            asyncio.ensure_future(catalog.lookup(SimpleNamespace(bind=primary), "p1", fields=["name"]))
+            for _ in range(5)
+        ]
+        other = asyncio.ensure_future(catalog.lookup(SimpleNamespace(bind=primary), "p2"))
+        await asyncio.sleep(0)
+        catalog.release.set()
+        results = await asyncio.gather(*calls, other)
+        return catalog.calls, results, len(flights)
+
+    calls, results, in_flight = _run(scenario)
+    assert sorted(calls) == ["p1", "p2"]
+    assert all(result is results[0] for result in results[:5])
+    assert results[5]["product_id"] == "p2"
+    assert in_flight == 0
+    assert _count("executed") - executed == 2
+    assert _count("coalesced") - coalesced == 4
+
+
+def test_calls_on_different_engines_are_not_shared():
+    async def scenario(catalog):
+        calls = [
+            asyncio.ensure_future(catalog.lookup(SimpleNamespace(bind=engine), "p1"))
+            for engine in (primary, replica, primary)
+        ]
+        await asyncio.sleep(0)
+        catalog.release.set()
+        await asyncio.gather(*calls)
+        return catalog.calls
+
+    assert _run(scenario) == ["p1", "p1"]
+
+
+def test_errors_are_shared_and_not_remembered():
+    async def scenario(catalog):
+        calls = [asyncio.ensure_future(catalog.lookup(None, "missing")) for _ in range(3)]
+        await asyncio.sleep(0)
+        catalog.release.set()
+        errors = await asyncio.gather(*calls, return_exceptions=True)
+        with pytest.raises(LookupError):
+            await catalog.lookup(None, "missing")
+        return errors, catalog.calls
+
+    errors, calls = _run(scenario)
+    assert all(isinstance(error, LookupError) for error in errors)
+    assert calls == ["missing", "missing"]
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def scenario(catalog):
+        first = asyncio.ensure_future(catalog.lookup(None, "p1"))
+        second = asyncio.ensure_future(catalog.lookup(None, "p1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        catalog.release.set()
+        return first.cancelled(), await second, catalog.calls
+
+    cancelled, result, calls = _run(scenario)
+    assert cancelled
+    assert result["product_id"] == "p1"
+    assert calls == ["p1"]
+
+
+def test_unhashable_arguments_skip_coalescing():
+    async def scenario(catalog):
+        calls = [asyncio.ensure_future(catalog.lookup(None, "p1", fields=[{"a"}, bytearray()])) for _ in range(2)]
+        await asyncio.sleep(0)
+        catalog.release.set()
+        await asyncio.gather(*calls)
+        return catalog.calls
+
+    assert _run(scenario) == ["p1", "p1"]
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+def test_shared_call_survives_the_first_caller_closing_its_session():
+    from app.core.database import LazySession, create_engine
+
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_size=3, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=LazySession, expire_on_commit=False)
+
+    @single_flight(name="test.sleep")
+    async def slow_value(db, value: int):
+        return (await db.execute(text("SELECT CAST(:value AS integer) FROM pg_sleep(0.2)"), {"value": value})).scalar_one()
+
+    async def request(value):
+        async with session_factory() as db:
+            return await slow_value(db, value)
+
+    async def scenario():
+        try:
+            owner = asyncio.ensure_future(request(1))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(request(1))
+            await asyncio.sleep(0.05)
+            owner.cancel()  # a client disconnect: its session closes mid-query
+            await asyncio.gather(owner, return_exceptions=True)
+            return await follower, engine.sync_engine.pool.checkedout()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == (1, 0)
@@ -0,0 +1,267 @@
+"""
+WhatsApp notifications against a local fake of the Twilio Messages API.
+Needs Redis; skipped when it isn't reachable.
+"""
+import asyncio
+import base64
+import uuid
+from typing import Callable, List
+from urllib.parse import parse_qs
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.core.redis import redis_client
+from app.services.whatsapp_service import (
+    DEAD_KEY, PROCESSING_KEY, QUEUE_KEY, RETRY_KEY, WORKERS_KEY, TwilioTransport, WhatsAppNotifier, WhatsAppTransport,
+    enqueue, render_order_message,
+)
+
+KEYS = [QUEUE_KEY, RETRY_KEY, DEAD_KEY, WORKERS_KEY, PROCESSING_KEY.format("test"), PROCESSING_KEY.format("test-crashed")]
+
+
+class FakeTwilio:
+    """Minimal keep-alive HTTP/1.1 server; `reply` maps a request number to (status, body)."""
+
+    def __init__(self, reply: Callable[[int], tuple]):
+        self.reply = reply
+        self.requests: List[dict] = []
+        self.connections = 0
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                headers = dict(line.split(": ", 1) for line in lines[1:] if line)
+                body = await reader.readexactly(int(headers.get("Content-Length", 0)))
+                self.requests.append({
+                    "path": lines[0].split()[1],
+                    "auth": headers.get("Authorization"),
+                    "form": {key: values[0] for key, values in parse_qs(body.decode()).items()},
+                })
+                status, payload = self.reply(len(self.requests))
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n{payload}".encode()
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+
+def _run(scenario):
+    async def run():
+        try:
+            await redis_client.ping()
+        except RedisError:
+            return None
+        try:
+            await redis_client.delete(*KEYS)
+            return await scenario()
+        finally:
+            await redis_client.delete(*KEYS)
+            await redis_client.connection_pool.disconnect()
+
+    result = asyncio.run(run())
+    if result is None:
+        pytest.skip("Redis not reachable")
+    return result
+
+
+async def _notifier(fake: FakeTwilio, **options) -> WhatsAppNotifier:
+    transport = TwilioTransport("AC123", "secret", "+15550000000", base_url=await fake.start(), max_connections=4)
+    options.setdefault("per_number_interval", 0.001)
+    options.setdefault("name", "test")
+    return WhatsAppNotifier(transport, concurrency=4, messages_per_second=0, **options)
+
+
+def _number() -> str:
+    return f"+1555{uuid.uuid4().int % 10**7:07d}"
+
+
+def test_render_order_message():
+    payload = {"order_id": "abcdef12-0000", "total_amount": "12.50", "order_status": "Shipped"}
+    assert "ABCDEF12" in render_order_message("order.created", payload)
+    assert "12.50" in render_order_message("order.refunded", payload)
+    assert "on its way" in render_order_message("order.status_changed", payload)
+    assert render_order_message("order.status_changed", dict(payload, order_status="Pending")) is None
+
+
+def test_batch_is_sent_over_reused_connections():
+    fake = FakeTwilio(lambda n: (201, f'{{"sid": "SM{n}"}}'))
+    numbers = [_number() for _ in range(20)]
+
+    async def scenario():
+        notifier = await _notifier(fake)
+        for number in numbers:
+            assert await enqueue(str(uuid.uuid4()), number.lstrip("+"), "Hello")
+        sent = await notifier.run_once()
+        await notifier.transport.aclose()
+        await fake.stop()
+        return sent, await redis_client.llen(QUEUE_KEY)
+
+    sent, left = _run(scenario)
+    assert (sent, left) == (20, 0)
+    assert fake.connections <= 4
+    request = fake.requests[0]
+    assert request["path"] == "/2010-04-01/Accounts/AC123/Messages.json"
+    assert request["auth"] == "Basic " + base64.b64encode(b"AC123:secret").decode()
+    assert request["form"]["From"] == "whatsapp:+15550000000"
+    assert sorted(r["form"]["To"] for r in fake.requests) == sorted(f"whatsapp:{n}" for n in numbers)
+
+
+def test_duplicate_event_is_queued_once():
+    async def scenario():
+        message_id = str(uuid.uuid4())
+        first = await enqueue(message_id, _number(), "Hello")
+        second = await enqueue(message_id, _number(), "Hello")
+        return first, second, await redis_client.llen(QUEUE_KEY)
+
+    assert _run(scenario) == (True, False, 1)
+
+
+def test_server_errors_are_retried_then_sent():
+    fake = FakeTwilio(lambda n: (503, '{"message": "busy"}') if n == 1 else (201, '{"sid": "SM1"}'))
+
+    async def scenario():
+        notifier = await _notifier(fake, retry_base=0.05, retry_max=0.05)
+        await enqueue(str(uuid.uuid4()), _number(), "Hello")
+        await notifier.run_once()
+        waiting = await redis_client.zcard(RETRY_KEY)
+        await asyncio.sleep(0.1)
+        resent = await notifier.run_once()
+        await notifier.transport.aclose()
+        await fake.stop()
+        return waiting, resent, await redis_client.zcard(RETRY_KEY)
+
+    assert _run(scenario) == (1, 1, 0)
+    assert len(fake.requests) == 2
+
+
+def test_rejected_and_exhausted_messages_are_dead_lettered():
+    fake = FakeTwilio(lambda n: (400, '{"message": "invalid To"}') if n == 1 else (500, "oops"))
+
+    async def scenario():
+        notifier = await _notifier(fake, max_attempts=1)
+        await enqueue("rejected", _number(), "Hello")
+        await notifier.run_once()
+        await enqueue("exhausted", _number(), "Hello")
+        await notifier.run_once()
+        await notifier.transport.aclose()
+        await fake.stop()
+        await redis_client.delete("whatsapp:seen:rejected", "whatsapp:seen:exhausted")
+        return await notifier.dead_letters()
+
+    dead = _run(scenario)
+    assert [message["id"] for message in dead] == ["exhausted", "rejected"]
+    assert dead[1]["last_error"] == "Twilio 400: invalid To"
+    assert dead[0]["attempts"] == 1
+
+
+def test_same_number_is_paced():
+    fake = FakeTwilio(lambda n: (201, '{"sid": "SM1"}'))
+    number = _number()
+
+    async def scenario():
+        notifier = await _notifier(fake, per_number_interval=60)
+        await enqueue(str(uuid.uuid4()), number, "First")
+        await enqueue(str(uuid.uuid4()), number, "Second")
+        await notifier.run_once()
+        await notifier.transport.aclose()
+        await fake.stop()
+        await redis_client.delete(f"whatsapp:pace:{number}")
+        return await redis_client.zrange(RETRY_KEY, 0, -1, withscores=True)
+
+    deferred = _run(scenario)
+    assert len(fake.requests) == 1
+    assert fake.requests[0]["form"]["Body"] == "First"
+    assert len(deferred) == 1 and '"Second"' in deferred[0][0]
+
+
+def test_transport_must_implement_send():
+    with pytest.raises(TypeError):
+        WhatsAppTransport()
+
+
+def test_batch_of_a_dead_worker_is_requeued():
+    fake = FakeTwilio(lambda n: (201, f'{{"sid": "SM{n}"}}'))
+
+    async def scenario():
+        crashed = await _notifier(fake, name="test-crashed")
+        survivor = await _notifier(fake, lease_seconds=30)
+        for _ in range(3):
+            await enqueue(str(uuid.uuid4()), _number(), "Hello")
+        # Claimed, then the worker died before sending anything
+        await redis_client.zadd(WORKERS_KEY, {crashed.name: 0})
+        claimed = await crashed._claim(0)
+        await crashed.transport.aclose()
+
+        sent = await survivor.run_once()
+        await survivor.transport.aclose()
+        await fake.stop()
+        return (
+            len(claimed), sent, await redis_client.llen(crashed.processing_key),
+            await redis_client.llen(survivor.processing_key), await redis_client.zrange(WORKERS_KEY, 0, -1),
+        )
+
+    assert _run(scenario) == (3, 3, 0, 0, ["test"])
+    assert len(fake.requests) == 3
+
+
+def test_transport_errors_are_retried_and_a_crashed_loop_requeues_its_batch():
+    fake = FakeTwilio(lambda n: (201, '{"status": "queued"}'))
+
+    class BrokenTransport(WhatsAppTransport):
+        async def send(self, to: str, body: str) -> str:
+            raise KeyError("sid")
+
+    async def scenario():
+        # A 2xx without a sid may have been delivered: dead-lettered, not resent
+        twilio = await _notifier(fake)
+        await enqueue("no-sid", _number(), "Hello")
+        await twilio.run_once()
+        await twilio.transport.aclose()
+        await fake.stop()
+        dead = await twilio.dead_letters()
+
+        # Any other transport error is a retryable failure
+        broken = WhatsAppNotifier(BrokenTransport(), name="test", per_number_interval=0, messages_per_second=0)
+        await enqueue("broken", _number(), "Hello")
+        await broken.run_once()
+        retrying = await redis_client.zrange(RETRY_KEY, 0, -1)
+
+        # A loop that dies mid-batch puts the rest back before leaving the workers set
+        crashed = WhatsAppNotifier(BrokenTransport(), name="test-crashed")
+        await enqueue("orphan", _number(), "Hello")
+
+        async def crash(poll_timeout):
+            await crashed._claim(0)
+            raise RuntimeError("worker bug")
+
+        crashed.run_once = crash
+        with pytest.raises(RuntimeError):
+            await crashed.run(asyncio.Event())
+        await redis_client.delete("whatsapp:seen:no-sid", "whatsapp:seen:broken", "whatsapp:seen:orphan")
+        return (
+            dead, retrying, await redis_client.llen(crashed.processing_key),
+            await redis_client.lrange(QUEUE_KEY, 0, -1), await redis_client.zscore(WORKERS_KEY, crashed.name),
+        )
+
+    dead, retrying, processing, queue, worker = _run(scenario)
+    assert [(message["id"], message["last_error"][:32]) for message in dead] == [
+        ("no-sid", "Twilio 201 without a message sid")
+    ]
+    assert len(retrying) == 1 and '"broken"' in retrying[0] and "KeyError" in retrying[0]
+    assert processing == 0
+    assert len(queue) == 1 and '"orphan"' in queue[0]
+    assert worker is None
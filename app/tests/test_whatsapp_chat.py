@@ -0,0 +1,224 @@
+"""
+WhatsApp chat ordering: the inbound webhook, partition leasing and
+per-conversation ordering need Redis; the conversation itself needs a
+Postgres database it may drop and recreate tables in:
+
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test \
+    python -m pytest app/tests/test_whatsapp_chat.py
+"""
+import asyncio
+import os
+import random
+import uuid
+from decimal import Decimal
+
+import httpx
+import pytest
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from twilio.request_validator import RequestValidator
+
+from app.config import settings
+from app.core.redis import redis_client
+from app.services.whatsapp_chat import (
+    INBOUND_KEY, LEASE_KEY, WORKERS_KEY, InboundConsumer, WhatsAppChat, partition_for, push_inbound,
+)
+
+PARTITIONS = 4
+WEBHOOK_URL = "https://shop.example/api/v1/whatsapp/webhook"
+
+
+def _run(scenario):
+    async def run():
+        try:
+            await redis_client.ping()
+        except RedisError:
+            return None
+        keys = [INBOUND_KEY.format(n) for n in range(PARTITIONS)] + [LEASE_KEY.format(n) for n in range(PARTITIONS)]
+        try:
+            await redis_client.delete(WORKERS_KEY, *keys)
+            return await scenario()
+        finally:
+            await redis_client.delete(WORKERS_KEY, *keys)
+            await redis_client.connection_pool.disconnect()
+
+    result = asyncio.run(run())
+    if result is None:
+        pytest.skip("Redis not reachable")
+    return result
+
+
+@pytest.fixture
+def partitions(monkeypatch):
+    monkeypatch.setattr(settings, "whatsapp_inbound_partitions", PARTITIONS)
+
+
+def test_webhook_checks_signature_and_queues_once(partitions, monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(settings, "twilio_auth_token", "token")
+    monkeypatch.setattr(settings, "whatsapp_webhook_url", WEBHOOK_URL)
+    sender = f"whatsapp:+1555{uuid.uuid4().int % 10**7:07d}"
+    params = {"MessageSid": f"SM{uuid.uuid4().hex}", "From": sender, "Body": "hi", "ProfileName": "Ann"}
+    signature = RequestValidator("token").compute_signature(WEBHOOK_URL, params)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            post = lambda signature: client.post(
+                "/api/v1/whatsapp/webhook", data=params, headers={"X-Twilio-Signature": signature}
+            )
+            forged, first, retried = await post("forged"), await post(signature), await post(signature)
+        entries = await redis_client.xrange(INBOUND_KEY.format(partition_for(sender)))
+        return forged, first, retried, entries
+
+    forged, first, retried, entries = _run(scenario)
+    assert forged.status_code == 403
+    assert first.status_code == retried.status_code == 200
+    assert first.headers["content-type"] == "application/xml"
+    assert [fields for _, fields in entries] == [
+        {"sid": params["MessageSid"], "from": sender, "body": "hi", "profile_name": "Ann"}
+    ]
+
+
+def test_webhook_refuses_unsigned_messages_without_a_token(partitions, monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(settings, "twilio_auth_token", None)
+    params = {"MessageSid": f"SM{uuid.uuid4().hex}", "From": "whatsapp:+15550000000", "Body": "checkout"}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            refused = await client.post("/api/v1/whatsapp/webhook", data=params)
+            monkeypatch.setattr(settings, "whatsapp_webhook_verify", False)
+            unverified = await client.post("/api/v1/whatsapp/webhook", data=params)
+        return refused, unverified
+
+    refused, unverified = _run(scenario)
+    assert refused.status_code == 503
+    assert unverified.status_code == 200
+
+
+def test_messages_stay_in_order_per_conversation(partitions):
+    senders = [f"whatsapp:+1555000000{i}" for i in range(6)]
+    expected = {sender: [str(n) for n in range(15)] for sender in senders}
+    seen = {sender: [] for sender in senders}
+    done = asyncio.Event()
+
+    async def handler(message):
+        await asyncio.sleep(random.random() / 500)
+        seen[message["from"]].append(message["body"])
+        if seen == expected:
+            done.set()
+
+    async def scenario():
+        for n in range(15):
+            for sender in senders:
+                await push_inbound(uuid.uuid4().hex, sender, str(n))
+        consumer = InboundConsumer(handler, partitions=PARTITIONS, batch_size=7, name="test-order")
+        await consumer.rebalance()
+        try:
+            await asyncio.wait_for(done.wait(), 10)
+        finally:
+            await consumer.close()
+        return consumer.owned
+
+    assert _run(scenario) == []
+    assert seen == expected
+
+
+def test_workers_share_partitions(partitions):
+    async def handler(message):
+        pass
+
+    async def scenario():
+        first = InboundConsumer(handler, partitions=PARTITIONS, name="test-first")
+        second = InboundConsumer(handler, partitions=PARTITIONS, name="test-second")
+        try:
+            await first.rebalance()
+            alone = first.owned
+            await second.rebalance()  # everything is leased to the first worker
+            await first.rebalance()   # hands back the second worker's share
+            await second.rebalance()
+            return alone, first.owned, second.owned
+        finally:
+            await first.close()
+            await second.close()
+
+    alone, first, second = _run(scenario)
+    assert alone == list(range(PARTITIONS))
+    assert len(first) == len(second) == PARTITIONS // 2
+    assert not set(first) & set(second)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="set TEST_DATABASE_URL")
+def test_conversation_orders_from_cart():
+    from app.core.database import Base, LazySession, create_engine
+    from app.models.order import Order
+    from app.models.outbox import OutboxEvent
+    from app.models.product import Category, Product, Subcategory
+    from app.models.user import Address, User
+
+    loop = asyncio.new_event_loop()
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_size=2, max_overflow=0)
+    session_factory = sessionmaker(engine, class_=LazySession, expire_on_commit=False)
+    chat = WhatsAppChat(session_factory)
+    number = f"+1555{uuid.uuid4().int % 10**7:07d}"
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        category = Category(category_name="Pizza", is_active=True)
+        async with session_factory() as db:
+            db.add_all([
+                category,
+                Product(
+                    product_name="Margherita", description="", price=Decimal("8.50"), stock_quantity=10,
+                    category=category, subcategory=Subcategory(subcategory_name="Classic", category=category),
+                    is_active=True,
+                ),
+            ])
+            await db.commit()
+
+    async def say(state, text):
+        async with session_factory() as db:
+            user = await chat._user(db, number)
+            return await chat.respond(db, user, state, text)
+
+    async def add_address():
+        async with session_factory() as db:
+            user = (await db.execute(select(User).where(User.phone_number == number))).scalar_one()
+            db.add(Address(user_id=user.user_id, street_address="1 Main St", city="City", state="State",
+                           postal_code="00000", country="Country", is_default=True))
+            await db.commit()
+            return user.user_id
+
+    async def orders(user_id):
+        async with session_factory() as db:
+            order = (await db.execute(select(Order).where(Order.user_id == user_id))).scalar_one()
+            events = (await db.execute(
+                select(OutboxEvent.event_type).where(OutboxEvent.aggregate_id == order.order_id)
+            )).scalars().all()
+            return order, events
+
+    try:
+        loop.run_until_complete(setup())
+        state = {}
+        assert "1. Pizza" in loop.run_until_complete(say(state, "Hi"))
+        assert "1. Margherita - 8.50" in loop.run_until_complete(say(state, "1"))
+        assert "Added 2 x Margherita" in loop.run_until_complete(say(state, "1 x 2"))
+        assert "Total: 17.00" in loop.run_until_complete(say(state, "cart"))
+        assert "delivery address" in loop.run_until_complete(say(state, "checkout"))
+
+        user_id = loop.run_until_complete(add_address())
+        assert loop.run_until_complete(say(state, "checkout")) is None
+        order, events = loop.run_until_complete(orders(user_id))
+        assert order.total_amount == Decimal("17.00")
+        assert events == ["order.created"]
+        assert state == {}
+        assert "empty" in loop.run_until_complete(say(state, "cart"))
+    finally:
+        loop.run_until_complete(engine.dispose())
+        loop.run_until_complete(redis_client.connection_pool.disconnect())
+        loop.close()
@@ -0,0 +1,76 @@
+"""
+Outbox worker: delivers the order side-effect events the API writes to
+`outbox_events`. Run one or more next to the web process:
+
+    python -m app.workers.outbox
+
+Workers claim disjoint batches, so scaling out needs no coordination.
+They also delete expired rows of the idempotency_keys fallback table.
+SIGTERM/SIGINT finish the current batch and exit.
+"""
+import asyncio
+import signal
+import time
+
+from prometheus_client import start_http_server
+
+from app.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.core.idempotency import database_store
+from app.core.logger import logger, setup_logging
+from app.core.metrics import MULTIPROCESS
+from app.core.redis import redis_client
+from app.services.outbox import OutboxRelay
+# Modules whose handlers the worker delivers to
+import app.services.whatsapp_service  # noqa: F401
+
+
+async def run(stop: asyncio.Event, relay: OutboxRelay = None):
+    """
+    Drain the outbox until `stop` is set; sleeps only when a batch comes back
+    short. Also purges expired idempotency records now and then.
+    """
+    relay = relay or OutboxRelay()
+    next_purge = 0.0
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + settings.idempotency_purge_interval_seconds
+                purged = await database_store.purge_expired()
+                if purged:
+                    logger.info(f"Purged {purged} expired idempotency keys")
+            async with AsyncSessionLocal() as db:
+                claimed = await relay.run_once(db)
+                if claimed == relay.batch_size:
+                    continue
+                await relay.record_lag(db)
+        except Exception as exc:
+            # Database unavailable or similar: back off and try again
+            logger.error(f"Outbox worker loop failed: {exc}")
+        try:
+            await asyncio.wait_for(stop.wait(), settings.outbox_poll_interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Outbox worker started")
+    try:
+        await run(stop)
+    finally:
+        await engine.dispose()
+        await redis_client.aclose()
+    logger.info("Outbox worker stopped")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    if not MULTIPROCESS:
+        # Otherwise the API's /metrics already aggregates this process's samples
+        start_http_server(settings.outbox_metrics_port)
+    asyncio.run(_main())
@@ -0,0 +1,43 @@
+"""
+WhatsApp notification worker: sends the order notifications queued in
+Redis by the outbox handlers (see app.services.whatsapp_service).
+
+    python -m app.workers.whatsapp
+
+Each worker sends at most WHATSAPP_MAX_CONCURRENCY messages at a time and
+WHATSAPP_MESSAGES_PER_SECOND overall. SIGTERM/SIGINT finish the current
+batch and exit.
+"""
+import asyncio
+import signal
+
+from prometheus_client import start_http_server
+
+from app.config import settings
+from app.core.logger import logger, setup_logging
+from app.core.metrics import MULTIPROCESS
+from app.core.redis import redis_client
+from app.services.whatsapp_service import TwilioTransport, WhatsAppNotifier
+
+
+async def _main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    transport = TwilioTransport.from_settings()
+    logger.info("WhatsApp worker started")
+    try:
+        await WhatsAppNotifier(transport).run(stop)
+    finally:
+        await transport.aclose()
+        await redis_client.aclose()
+    logger.info("WhatsApp worker stopped")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    if not MULTIPROCESS:
+        start_http_server(settings.whatsapp_metrics_port)
+    asyncio.run(_main())
@@ -0,0 +1,37 @@
+"""
+WhatsApp chat worker: answers the inbound messages the webhook queues in
+Redis (see app.services.whatsapp_chat).
+
+    python -m app.workers.whatsapp_chat
+
+Workers share the inbound partitions between them, so more can be started
+at any time. SIGTERM/SIGINT finish the batches in flight, hand the
+partitions back and exit.
+"""
+import asyncio
+import signal
+
+from app.core.database import engine
+from app.core.logger import logger, setup_logging
+from app.core.redis import redis_client
+from app.services.whatsapp_chat import InboundConsumer, whatsapp_chat
+
+
+async def _main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("WhatsApp chat worker started")
+    try:
+        await InboundConsumer(whatsapp_chat.handle).run(stop)
+    finally:
+        await engine.dispose()
+        await redis_client.aclose()
+    logger.info("WhatsApp chat worker stopped")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(_main())
@@ -19,6 +19,8 @@ from app.models.user import User, Address
 from app.models.product import Category, Subcategory, Product
 from app.models.offers import Offer
 from app.models.order import Order, OrderItem
+from app.models.outbox import OutboxEvent
+from app.models.idempotency import IdempotencyKey
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,69 @@
+"""Add indexes for service-layer query paths
+
+Revision ID: 5e7a2d9c4b1f
+Revises: 1cbb55d33211
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a2d9c4b1f'
+down_revision: Union[str, Sequence[str], None] = '1cbb55d33211'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Foreign keys the services filter and join on
+    op.create_index('ix_subcategories_category_id', 'subcategories', ['category_id'], unique=False)
+    op.create_index('ix_products_category_id', 'products', ['category_id'], unique=False)
+    op.create_index('ix_products_subcategory_id', 'products', ['subcategory_id'], unique=False)
+    op.create_index('ix_addresses_user_id', 'addresses', ['user_id'], unique=False)
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+    op.create_index('ix_order_items_product_id', 'order_items', ['product_id'], unique=False)
+
+    # Order history and admin listings, newest first
+    op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_orders_created_at', 'orders', ['created_at'], unique=False)
+    op.create_index('ix_orders_payment_status_created_at', 'orders', ['payment_status', 'created_at'], unique=False)
+    op.create_index(
+        'ix_orders_status_created_at_active', 'orders', ['order_status', 'created_at'],
+        unique=False, postgresql_where=sa.text('is_active'),
+    )
+
+    # Declared on CartItem but never migrated; databases built with
+    # create_all already have them.
+    op.add_column('cart_items', sa.Column('guest_id', sa.String(), nullable=True), if_not_exists=True)
+    op.create_index('ix_cart_user_product', 'cart_items', ['user_id', 'product_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_cart_guest_product', 'cart_items', ['guest_id', 'product_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_cart_items_guest_id'), 'cart_items', ['guest_id'], unique=False, if_not_exists=True)
+    op.add_column('orders', sa.Column('tracking_token', sa.String(length=100), nullable=True), if_not_exists=True)
+    op.create_index(op.f('ix_orders_tracking_token'), 'orders', ['tracking_token'], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_orders_tracking_token'), table_name='orders', if_exists=True)
+    op.drop_column('orders', 'tracking_token', if_exists=True)
+    op.drop_index(op.f('ix_cart_items_guest_id'), table_name='cart_items', if_exists=True)
+    op.drop_index('ix_cart_guest_product', table_name='cart_items', if_exists=True)
+    op.drop_index('ix_cart_user_product', table_name='cart_items', if_exists=True)
+    op.drop_column('cart_items', 'guest_id', if_exists=True)
+
+    op.drop_index('ix_orders_status_created_at_active', table_name='orders', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_orders_payment_status_created_at', table_name='orders')
+    op.drop_index('ix_orders_created_at', table_name='orders')
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
+
+    op.drop_index('ix_order_items_product_id', table_name='order_items')
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
+    op.drop_index('ix_addresses_user_id', table_name='addresses')
+    op.drop_index('ix_products_subcategory_id', table_name='products')
+    op.drop_index('ix_products_category_id', table_name='products')
+    op.drop_index('ix_subcategories_category_id', table_name='subcategories')
@@ -0,0 +1,249 @@
+"""
+Scripted load test for a locally running Tap2Cart API.
+
+Virtual users repeatedly run weighted scenarios (browse, cart, checkout, admin)
+against the API with a shared httpx.AsyncClient. Latencies are grouped by
+endpoint template and reported as throughput and percentiles.
+
+Usage:
+    python scripts/load_test.py --base-url http://127.0.0.1:8000 --users 50 --duration 60
+    python scripts/load_test.py --admin-username admin --admin-password secret --json results.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+
+API = "/api/v1"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, elapsed: float, ok: bool):
+        self.latencies[name].append(elapsed)
+        if not ok:
+            self.errors[name] += 1
+
+    def report(self, duration: float) -> List[dict]:
+        rows = []
+        for name in sorted(self.latencies):
+            values = self.latencies[name]
+            rows.append({
+                "endpoint": name,
+                "requests": len(values),
+                "errors": self.errors[name],
+                "rps": round(len(values) / duration, 2),
+                "mean_ms": round(statistics.fmean(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p90_ms": round(percentile(values, 90) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            })
+        return rows
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.stats = Stats()
+        self.product_ids: List[str] = []
+        self.category_ids: List[str] = []
+        self.admin_token: Optional[str] = None
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(name, time.perf_counter() - started, ok=False)
+            return None
+        self.stats.record(name, time.perf_counter() - started, ok=response.status_code < 400)
+        return response
+
+    async def discover(self):
+        """Collect product and category IDs for the scenarios to use."""
+        response = await self.client.get(f"{API}/category/", params={"limit": 100})
+        response.raise_for_status()
+        self.category_ids = [c["category_id"] for c in response.json()]
+
+        for page in range(1, 11):
+            response = await self.client.get(f"{API}/products/", params={"page": page, "page_size": 100})
+            response.raise_for_status()
+            batch = response.json()
+            self.product_ids.extend(p["product_id"] for p in batch)
+            if len(batch) < 100:
+                break
+
+        if not self.product_ids:
+            raise SystemExit("No products found; run `python -m app.seeder.generator` first.")
+
+        if self.args.admin_username and self.args.admin_password:
+            response = await self.client.post(f"{API}/admin/login", json={
+                "username": self.args.admin_username,
+                "password": self.args.admin_password,
+            })
+            response.raise_for_status()
+            self.admin_token = response.json()["access_token"]
+
+    async def login(self) -> Optional[dict]:
+        """Log a fresh customer in via OTP and return auth headers plus user ID."""
+        phone = f"+1555{random.randint(0, 9999999):07d}"
+        await self.call("POST /auth/send-otp", "POST", f"{API}/auth/send-otp", json={"phone_number": phone})
+        response = await self.call(
+            "POST /auth/login-otp", "POST", f"{API}/auth/login-otp",
+            json={"phone_number": phone, "otp": "123456"}
+        )
+        if response is None or response.status_code != 200:
+            return None
+        token = response.json()["access_token"]
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        user_id = json.loads(base64.urlsafe_b64decode(payload))["sub"]
+        return {"headers": {"Authorization": f"Bearer {token}"}, "user_id": user_id}
+
+    async def browse(self):
+        await self.call("GET /category/", "GET", f"{API}/category/")
+        if self.category_ids:
+            category_id = random.choice(self.category_ids)
+            await self.call(
+                "GET /products/?category_id", "GET", f"{API}/products/",
+                params={"category_id": category_id, "page_size": 20}
+            )
+        await self.call(
+            "GET /products/", "GET", f"{API}/products/",
+            params={"page": random.randint(1, 20), "page_size": 20}
+        )
+        await self.call("GET /products/{id}", "GET", f"{API}/products/{random.choice(self.product_ids)}")
+
+    async def cart(self, session: Optional[dict] = None):
+        session = session or await self.login()
+        if not session:
+            return None
+        headers = session["headers"]
+        for product_id in random.sample(self.product_ids, min(3, len(self.product_ids))):
+            await self.call(
+                "POST /cart/add", "POST", f"{API}/cart/add", headers=headers,
+                json={"product_id": product_id, "quantity": random.randint(1, 3)}
+            )
+        await self.call("GET /cart/", "GET", f"{API}/cart/", headers=headers)
+        return session
+
+    async def checkout(self):
+        session = await self.cart()
+        if not session:
+            return
+        headers = session["headers"]
+        response = await self.call(
+            "POST /address/", "POST", f"{API}/address/", params={"user_id": session["user_id"]},
+            json={
+                "street_address": "1 Load Test Road", "city": "Kochi", "state": "Kerala",
+                "postal_code": "682001", "country": "India", "is_default": True,
+            }
+        )
+        if response is None or response.status_code >= 400:
+            return
+        address_id = response.json()["address_id"]
+
+        items = [
+            {"product_id": product_id, "quantity": 1}
+            for product_id in random.sample(self.product_ids, min(2, len(self.product_ids)))
+        ]
+        response = await self.call(
+            "POST /orders/", "POST", f"{API}/orders/", headers=headers,
+            json={"address_id": address_id, "items": items, "payment_method": "Credit Card"}
+        )
+        if response is None or response.status_code >= 400:
+            return
+        order_id = response.json()["order_id"]
+        await self.call(
+            "POST /orders/{id}/confirm", "POST", f"{API}/orders/{order_id}/confirm",
+            params={"transaction_id": str(uuid.uuid4())}
+        )
+
+    async def admin(self):
+        if not self.admin_token:
+            return
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        await self.call("GET /admin/dashboard", "GET", f"{API}/admin/dashboard", headers=headers)
+        await self.call("GET /admin/activity", "GET", f"{API}/admin/activity", headers=headers)
+        await self.call("GET /admin/orders", "GET", f"{API}/admin/orders", headers=headers)
+
+    async def virtual_user(self, deadline: float):
+        scenarios = [self.browse, self.cart, self.checkout, self.admin]
+        weights = [self.args.browse_weight, self.args.cart_weight, self.args.checkout_weight, self.args.admin_weight]
+        while time.perf_counter() < deadline:
+            await random.choice([s for s, w in zip(scenarios, weights) for _ in range(w)])()
+            if self.args.think_time:
+                await asyncio.sleep(random.uniform(0, self.args.think_time))
+
+    async def run(self) -> float:
+        await self.discover()
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        await asyncio.gather(*(self.virtual_user(deadline) for _ in range(self.args.users)))
+        return time.perf_counter() - started
+
+
+def print_report(rows: List[dict], duration: float):
+    header = f"{'endpoint':<32}{'reqs':>8}{'errs':>7}{'rps':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['endpoint']:<32}{row['requests']:>8}{row['errors']:>7}{row['rps']:>9}"
+            f"{row['p50_ms']:>9}{row['p90_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}"
+        )
+    total = sum(row["requests"] for row in rows)
+    print(f"\n{total} requests in {duration:.1f}s ({total / duration:.1f} req/s), latencies in ms")
+
+
+async def main(args: argparse.Namespace):
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        load_test = LoadTest(client, args)
+        duration = await load_test.run()
+
+    rows = load_test.stats.report(duration)
+    print_report(rows, duration)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"duration": duration, "users": args.users, "endpoints": rows}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a running Tap2Cart API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Test duration in seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between scenarios")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--browse-weight", type=int, default=6)
+    parser.add_argument("--cart-weight", type=int, default=2)
+    parser.add_argument("--checkout-weight", type=int, default=1)
+    parser.add_argument("--admin-weight", type=int, default=1)
+    parser.add_argument("--admin-username", default=None)
+    parser.add_argument("--admin-password", default=None)
+    parser.add_argument("--json", default=None, help="Write the report to this JSON file")
+    asyncio.run(main(parser.parse_args()))